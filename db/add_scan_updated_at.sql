@@ -0,0 +1,53 @@
+--------------------------------------------------------------------------------
+--
+-- Adds the scan.updated_at column (and the triggers that maintain it) to
+-- databases created before the front end kept a local snapshot of the scans
+-- and the scan_features.updated_at column used by the local features cache.
+--
+-- Safe to run more than once:
+--
+--   psql scans -f add_scan_updated_at.sql
+--
+--------------------------------------------------------------------------------
+
+BEGIN;
+
+ALTER TABLE scan
+    ADD COLUMN IF NOT EXISTS updated_at timestamptz default now() NOT NULL;
+
+CREATE OR REPLACE FUNCTION touch_scan() RETURNS trigger AS $$
+BEGIN
+    NEW.updated_at = now();
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS scan_updated_at ON scan;
+CREATE TRIGGER scan_updated_at BEFORE UPDATE ON scan
+    FOR EACH ROW EXECUTE PROCEDURE touch_scan();
+
+CREATE OR REPLACE FUNCTION touch_patient_scans() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        UPDATE scan SET updated_at = now() WHERE patient_id = OLD.patient_id;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        UPDATE scan SET updated_at = now() WHERE patient_id = NEW.patient_id;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS diagnosis_touches_scans ON diagnosis;
+CREATE TRIGGER diagnosis_touches_scans
+    AFTER INSERT OR UPDATE OR DELETE ON diagnosis
+    FOR EACH ROW EXECUTE PROCEDURE touch_patient_scans();
+
+ALTER TABLE scan_features
+    ADD COLUMN IF NOT EXISTS updated_at timestamptz default now() NOT NULL;
+
+DROP TRIGGER IF EXISTS scan_features_updated_at ON scan_features;
+CREATE TRIGGER scan_features_updated_at BEFORE UPDATE ON scan_features
+    FOR EACH ROW EXECUTE PROCEDURE touch_scan();
+
+COMMIT;
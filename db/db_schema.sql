@@ -12,6 +12,7 @@ CREATE TABLE scan
     sd1           FLOAT default 0.2,     -- Slice Distance for middle axis.
     sd2           FLOAT default 0.2,     -- Slice Distance for third axis.
     validation_status  int   default 0,       -- 0: undefined, 1: invalid,  2: valid
+    updated_at    timestamptz default now() NOT NULL, -- Used by the snapshots.
     UNIQUE (fullpath)
 );
 
@@ -38,7 +39,40 @@ CREATE TABLE diagnosis
 
 \COPY diagnosis (patient_id, days, origin, health_status) FROM '/home/john/repos/cogni_scan/db/oasis3_diagnosis.csv' DELIMITER ',' CSV HEADER;
 
+-- Keeps scan.updated_at current so the local snapshots of the front end only
+-- fetch the changed scans; changing the diagnosis of a patient touches all
+-- the scans of the patient (since it changes their label).  Created after
+-- loading the data so the bulk copies do not fire them.
+CREATE OR REPLACE FUNCTION touch_scan() RETURNS trigger AS $$
+BEGIN
+    NEW.updated_at = now();
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER scan_updated_at BEFORE UPDATE ON scan
+    FOR EACH ROW EXECUTE PROCEDURE touch_scan();
+
+CREATE OR REPLACE FUNCTION touch_patient_scans() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        UPDATE scan SET updated_at = now() WHERE patient_id = OLD.patient_id;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        UPDATE scan SET updated_at = now() WHERE patient_id = NEW.patient_id;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER diagnosis_touches_scans
+    AFTER INSERT OR UPDATE OR DELETE ON diagnosis
+    FOR EACH ROW EXECUTE PROCEDURE touch_patient_scans();
+
 -- stores VGG16 generated feautures
+-- Each features_sliceXY holds 512 little-endian float32 values (2048 bytes).
+-- Databases created with the older jsonb columns can be converted using the
+-- migrate_features_to_bytea.py script.
 CREATE TABLE scan_features
 (
     feature_id       SERIAL PRIMARY KEY,
@@ -46,20 +80,26 @@ CREATE TABLE scan_features
     distance_0 FLOAT,
     distance_1 FLOAT,
     distance_2 FLOAT,
-    features_slice01 jsonb,
-    features_slice02 jsonb,
-    features_slice03 jsonb,
-    features_slice11 jsonb,
-    features_slice12 jsonb,
-    features_slice13 jsonb,
-    features_slice21 jsonb,
-    features_slice22 jsonb,
-    features_slice23 jsonb,
+    features_slice01 bytea,
+    features_slice02 bytea,
+    features_slice03 bytea,
+    features_slice11 bytea,
+    features_slice12 bytea,
+    features_slice13 bytea,
+    features_slice21 bytea,
+    features_slice22 bytea,
+    features_slice23 bytea,
     patient_id VARCHAR(512),
     label VARCHAR(2),
+    updated_at timestamptz default now() NOT NULL, -- Used by the features cache.
     UNIQUE (scan_id)
 );
 
+-- Keeps updated_at current so the local features cache detects features
+-- that are updated in place (touch_scan is defined above).
+CREATE TRIGGER scan_features_updated_at BEFORE UPDATE ON scan_features
+    FOR EACH ROW EXECUTE PROCEDURE touch_scan();
+
 create table datasets
 (
     dataset_id uuid primary key,
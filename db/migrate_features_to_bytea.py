@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""Converts the scan_features from jsonb to packed float32 (bytea) columns.
+
+Older databases store each feature vector as a jsonb array of doubles (in the
+form [[f1, f2, ... f512]]); this script rewrites every features_sliceXY
+column as a bytea holding 512 little-endian float32 values, which is the
+format expected by the application (see src/feature_codec.py).
+
+The whole conversion runs in a single transaction and columns that are
+already bytea are skipped, so it is safe to run the script more than once.
+"""
+
+import numpy as np
+
+import cogni_scan.src.dbutil as dbutil
+import cogni_scan.src.feature_codec as feature_codec
+
+_SLICES = ["01", "02", "03", "11", "12", "13", "21", "22", "23"]
+_BATCH_SIZE = 500
+
+_SQL_SELECT_COLUMN_TYPE = """
+select data_type from information_schema.columns
+where table_name = 'scan_features' and column_name = %s
+"""
+
+_SQL_SELECT_BATCH = """
+select feature_id, {columns} from scan_features
+where feature_id > %s order by feature_id limit %s
+""".format
+
+
+def _getColumnsToMigrate(db):
+    """Returns the feature columns that are still stored as jsonb."""
+    columns = []
+    for slice in _SLICES:
+        column = f"features_slice{slice}"
+        for row in db.execute_query(_SQL_SELECT_COLUMN_TYPE, (column,)):
+            if row[0] == "jsonb":
+                columns.append(column)
+    return columns
+
+
+def _toBinary(value):
+    """Converts a jsonb feature vector to its binary representation."""
+    if value is None:
+        return None
+    return feature_codec.encode(np.asarray(value).reshape(-1))
+
+
+def migrate(db):
+    columns = _getColumnsToMigrate(db)
+    if not columns:
+        print("Nothing to migrate; all the feature columns are bytea.")
+        return
+
+    for column in columns:
+        db.execute_non_query(
+            f"alter table scan_features add column {column}_bin bytea"
+        )
+
+    sql_select = _SQL_SELECT_BATCH(columns=','.join(columns))
+    sql_update = "update scan_features set " + \
+                 ','.join(f"{column}_bin = %s" for column in columns) + \
+                 " where feature_id = %s"
+
+    last_feature_id = 0
+    converted = 0
+    while True:
+        rows = list(
+            db.execute_query(sql_select, (last_feature_id, _BATCH_SIZE))
+        )
+        if not rows:
+            break
+        for row in rows:
+            values = [_toBinary(value) for value in row[1:]]
+            db.execute_non_query(sql_update, (*values, row[0]))
+        last_feature_id = rows[-1][0]
+        converted += len(rows)
+        print(f"Converted {converted} rows.")
+
+    for column in columns:
+        db.execute_non_query(f"alter table scan_features drop column {column}")
+        db.execute_non_query(
+            f"alter table scan_features rename column {column}_bin to {column}"
+        )
+
+
+def main():
+    with dbutil.SimpleSQL() as db:
+        with db.transaction():
+            migrate(db)
+    print("Done.")
+
+
+if __name__ == '__main__':
+    main()
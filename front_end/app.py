@@ -2,6 +2,7 @@ import functools
 import os
 
 from tkinter import *
+from tkinter import filedialog as fd
 import tkinter as tk
 import tkinter.simpledialog
 import tkinter.ttk as ttk
@@ -22,6 +23,7 @@ SEPARATOR = "Separator"
 EVENT_ABOUT = "About"
 EVENT_SAVE_VGG16_FEATURES = "SAVE_VGG16_FEATURES"
 EVENT_MAKE_MOVIE = "MAKE_MOVIE"
+EVENT_EXPORT_MOVIE = "EXPORT_MOVIE"
 
 MENU = {
     "File": [
@@ -31,6 +33,7 @@ MENU = {
         ("Update Patient Labels", EVENT_UPDATE_LABELS),
         ("Save VGG16 Features", EVENT_SAVE_VGG16_FEATURES),
         ("Make Movie", EVENT_MAKE_MOVIE),
+        ("Export Movie", EVENT_EXPORT_MOVIE),
         ("Filter", EVENT_FILTER),
         (SEPARATOR, None),
         ("Filter", EVENT_FILTER),
@@ -97,6 +100,12 @@ class MainFrame(view.View):
             self.getDocument().saveVGG16Features()
         elif event == EVENT_MAKE_MOVIE:
             self.getDocument().makeMovie()
+        elif event == EVENT_EXPORT_MOVIE:
+            filename = fd.asksaveasfilename(
+                defaultextension=".avi", filetypes=[("AVI files", "*.avi")]
+            )
+            if filename:
+                self.getDocument().makeMovie(export_path=filename)
 
         ("Make Movie", EVENT_MAKE_MOVIE),
 
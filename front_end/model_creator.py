@@ -1,6 +1,8 @@
 from itertools import chain, combinations
 import functools
 import os
+import queue
+import threading
 
 from tkinter import *
 from tkinter.messagebox import askyesno
@@ -12,6 +14,9 @@ import cogni_scan.front_end.settings as settings
 import cogni_scan.src.dbutil as dbutil
 import cogni_scan.src.modeler.model as model
 
+# How often (in milliseconds) the tk thread checks for trained models.
+_POLL_INTERVAL = 200
+
 
 def powerset(collection):
     """Returns all possible subsets for the passed in collection."""
@@ -102,13 +107,43 @@ class ModelCreator:
                         title='Build All the models.',
                         message='Build models for all possible combos of slices?'):
                     return
+                slice_sets = powerset(getSelectedSlices())
                 self._root.config(cursor="watch")
-                self._root.update()
-                for slices in powerset(getSelectedSlices()):
-                    new_model = model.makeNewModel()
-                    new_model.trainAndSave(ds, slices)
-                self._root.config(cursor="")
-                print("done")
+                create_model_button["state"] = "disabled"
+                create_model_button_1["state"] = "disabled"
+
+                # Trained on a background thread so the UI stays responsive;
+                # the result is passed back to the tk thread by polling.
+                results = queue.Queue()
+
+                def train():
+                    try:
+                        models = model.trainPowerModels(
+                            ds, slice_sets, workers=None
+                        )
+                        results.put((models, None))
+                    except Exception as ex:
+                        results.put((None, ex))
+
+                def poll():
+                    try:
+                        models, error = results.get_nowait()
+                    except queue.Empty:
+                        self._root.after(_POLL_INTERVAL, poll)
+                        return
+                    self._root.config(cursor="")
+                    # The buttons are gone if another dataset was selected.
+                    if create_model_button.winfo_exists():
+                        updateButtonState()
+                    if error is not None:
+                        print(f"Failed to train the models: {error}")
+                    else:
+                        print(f"done ({len(models)} models)")
+
+                threading.Thread(
+                    target=train, name="power-models", daemon=True
+                ).start()
+                self._root.after(_POLL_INTERVAL, poll)
 
             def updateButtonState():
                 if len(getSelectedSlices()) > 0:
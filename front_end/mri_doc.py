@@ -1,6 +1,3 @@
-import os
-import tempfile
-
 import cv2
 from tkinter.messagebox import askyesno
 
@@ -54,63 +51,35 @@ class MRIDocument(document.Document):
         if self._patients:
             self._patients.saveVGG16Features()
 
-    def makeMovie(self, axis=1):
-        """Plays a video using the current MRI and the passed in axis."""
+    def makeMovie(self, axis=1, export_path=None):
+        """Plays a video using the current MRI and the passed in axis.
+
+        The frames are rendered in memory and played from there (press q to
+        stop); if export_path is passed they are also saved as a video.
+        """
         mri = self.getActiveMri()
         if not mri:
             return
 
-        base_dir = tempfile.gettempdir()
-
-        # Delete old movie files.
-        for item in os.listdir(base_dir):
-            if item.startswith("movie"):
-                os.remove(os.path.join(base_dir, item))
-
-        # Create the slices.
-        distance = -0.9
-        index = 0
-        step = 0.02
-
-        while distance < 1.0:
-            index += 1
-            filename = f"movie_slice_{index:02}.jpg"
-            filename = os.path.join(base_dir, filename)
-            img = mri.get_slice(
-                distance_from_center=distance,
-                axis=axis,
-                bounding_square=200
-            )
-            cv2.imwrite(filename, img)
-            distance += step
-
-        # Create the movie.
-        video_name =  os.path.join(base_dir, 'movie.avi')
-
-        images = [img for img in os.listdir(base_dir) if
-                  img.endswith(".jpg") and img.startswith("movie_slice")]
-        images.sort()
-        frame = cv2.imread(os.path.join(base_dir, images[0]))
-        height, width, layers = frame.shape
-        video = cv2.VideoWriter(video_name, 0, 5, (width, height))
-        for image in images:
-            video.write(cv2.imread(os.path.join(base_dir, image)))
-        cv2.destroyAllWindows()
-        video.release()
+        frames = mri.getMovieFrames(axis=axis, bounding_square=200)
+        if not len(frames):
+            return
+
+        if export_path:
+            height, width = frames.shape[1:]
+            video = cv2.VideoWriter(export_path, 0, 5, (width, height))
+            for frame in frames:
+                video.write(cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR))
+            video.release()
 
         # Play the video.
-        cap = cv2.VideoCapture(video_name)
-        while True:
-            ret, frame = cap.read()
-            if not ret:
-                break
-            cv2.imshow(video_name, frame)
+        title = f"Scan {mri.getScanID()}"
+        for frame in frames:
+            cv2.imshow(title, frame)
             if cv2.waitKey(150) == ord('q'):
                 break
-        cap.release()
         cv2.destroyAllWindows()
 
-
     def load(self, **kwargs):
         """Loads the documentDelete the document's data without destroying the object.."""
         show_labels = "ALL"
@@ -134,7 +103,8 @@ class MRIDocument(document.Document):
         self._patients.loadFromDb(
             show_labels,
             show_only_healthy,
-            validation_status
+            validation_status,
+            use_snapshot=True
         )
         self._show_only_healthy = 1 if show_only_healthy else 0
         self._show_labels = show_labels
@@ -183,6 +153,21 @@ class MRIDocument(document.Document):
         if self._active_mri_id:
             return self._patients.getMriByMriID(self._active_mri_id)
 
+    def getAdjacentMris(self):
+        """Returns the next and previous scans of the active one.
+
+        Only the scans of the active patient are considered (in the order
+        they are shown).
+        """
+        mri = self.getActiveMri()
+        if not mri:
+            return []
+        scans = list(self.getMRIs(mri.getPatientID()))
+        if mri not in scans:
+            return []
+        index = scans.index(mri)
+        return scans[index + 1:index + 2] + scans[max(0, index - 1):index]
+
     def setActiveMri(self, mri_id, sender=None):
         self.checkToSave()
         self._active_mri_id = mri_id
@@ -3,18 +3,12 @@
 import functools
 import os
 import sys
-import tempfile
-import uuid
 
-import PIL
 import pathlib
 import psycopg2
 
-from PIL import ImageTk
 from tkinter import *
 from tkinter import filedialog as fd
-import PIL.Image
-import cv2
 import tkinter as tk
 import tkinter.simpledialog
 import tkinter.ttk as ttk
@@ -22,6 +16,7 @@ import tkinter.ttk as ttk
 sys.path.insert(0, "/home/john/repos")
 
 import cogni_scan.front_end.settings as settings
+import cogni_scan.front_end.tk_images as tk_images
 import cogni_scan.src.dbutil as dbutil
 import cogni_scan.src.modeler.model as model
 import cogni_scan.src.nifti_mri as nifti_mri
@@ -44,33 +39,19 @@ MENU = {
 }
 
 
-def saveSlicesToDisk(scan):
-    """Saves the slices for the passed in scan to disk."""
-    prefix = str(uuid.uuid4())[:8]
-    filenames = {}
-    for index in [0, 1, 2]:
-        if index == 0:
-            distances = scan.getSliceDistances()
-            distances = [-x for x in distances]
-        elif index == 1:
-            distances = 0, 0, 0
-        elif index == 2:
-            distances = scan.getSliceDistances()
-            distances = [x for x in distances]
+def renderSlices(scan):
+    """Renders the slices for the passed in scan.
 
-        base_dir = tempfile.gettempdir()
-
-        for axis in [0, 1, 2]:
-            filename = f"slice_{prefix}_{axis}_{index}.jpg"
-            filename = os.path.join(base_dir, filename)
-            filenames[(index, axis)] = filename
-            img = scan.get_slice(
-                distance_from_center=distances[axis],
-                axis=axis,
-                bounding_square=240
-            )
-            cv2.imwrite(filename, img)
-    return filenames
+    :return: A dict mapping (index, axis) to the slice image where index 0,
+    1 and 2 stand for the negative, zero and positive slice distance.
+    """
+    # The standard slices are ordered by axis and then by distance (-d, 0, d).
+    images = scan.get_slices(scan.getStandardSlices(), bounding_square=240)
+    return {
+        (index, axis): images[axis * 3 + index]
+        for axis in [0, 1, 2]
+        for index in [0, 1, 2]
+    }
 
 
 class MainFrame:
@@ -103,8 +84,10 @@ class MainFrame:
         self._root.config(cursor="watch")
         self._root.update()
         predictions = []
-        for m in all_models:
-            prediction = m.predictFromScan(self._scan)
+        all_predictions = model.predictFromScanWithModels(
+            self._scan, all_models
+        )
+        for m, prediction in zip(all_models, all_predictions):
             self._updateTreeViewWithPrediction(m.getModelID(), prediction)
             print(prediction)
             predictions.append(int(prediction * 100))
@@ -146,9 +129,9 @@ class MainFrame:
 
     def updateImages(self):
         self._imgs_cache = []
-        filenames = saveSlicesToDisk(self._scan)
-        for k, filename in filenames.items():
-            img = ImageTk.PhotoImage(PIL.Image.open(filename))
+        images = renderSlices(self._scan)
+        for k, image in images.items():
+            img = tk_images.toPhotoImage(image)
             x, y = 0, 90
             canvas = self._slice_canvas[k]
             canvas.create_image(x, y, anchor=W, image=img)
@@ -0,0 +1,116 @@
+"""Renders the slices of the scans without blocking the tk thread.
+
+The slices are rendered by a background thread; only the most recently
+requested scan is delivered (older requests are dropped even if they were
+already rendered) and the results are passed back to the tk thread by
+polling a queue with after().
+
+After rendering the requested scan the thread prefetches the slices of the
+neighbouring scans (loading their volumes and thumbnails) so browsing to them
+is instant.
+"""
+
+import queue
+import threading
+
+import cogni_scan.src.thumbnail_store as thumbnail_store
+
+# How often (in milliseconds) the tk thread checks for rendered slices.
+_POLL_INTERVAL = 30
+
+
+class RenderService:
+    """Renders the standard slices of scans on a background thread."""
+
+    def __init__(self, widget, on_rendered):
+        """Initializer.
+
+        :param widget: A tk widget used to schedule the polling (after()).
+        :param on_rendered: Called on the tk thread as
+        on_rendered(scan, images) where images is a uint8 array holding the
+        nine standard slices.
+        """
+        self.__widget = widget
+        self.__on_rendered = on_rendered
+        self.__condition = threading.Condition()
+        self.__generation = 0
+        self.__request = None
+        self.__results = queue.Queue()
+        self.__stopped = False
+        self.__thread = threading.Thread(
+            target=self.__run, name="render-service", daemon=True
+        )
+        self.__thread.start()
+        self.__widget.after(_POLL_INTERVAL, self.__poll)
+
+    def request(self, scan, size, prefetch=()):
+        """Requests the slices of a scan replacing any previous request.
+
+        :param scan: The scan to render.
+        :param int size: The side of the rendered slices.
+        :param prefetch: Scans to prepare after the requested one.
+        """
+        with self.__condition:
+            self.__generation += 1
+            self.__request = (self.__generation, scan, size, list(prefetch))
+            self.__condition.notify()
+
+    def cancel(self):
+        """Drops any pending request (its slices will not be delivered)."""
+        with self.__condition:
+            self.__generation += 1
+            self.__request = None
+
+    def stop(self):
+        """Stops the background thread."""
+        with self.__condition:
+            self.__stopped = True
+            self.__generation += 1
+            self.__request = None
+            self.__condition.notify()
+
+    def __isCurrent(self, generation):
+        with self.__condition:
+            return generation == self.__generation
+
+    def __run(self):
+        while True:
+            with self.__condition:
+                while self.__request is None and not self.__stopped:
+                    self.__condition.wait()
+                if self.__stopped:
+                    return
+                generation, scan, size, prefetch = self.__request
+                self.__request = None
+
+            try:
+                images = thumbnail_store.getStandardSlices(scan, size)
+            except Exception as ex:
+                print(f"Failed to render {scan}: {ex}")
+                continue
+            if not self.__isCurrent(generation):
+                continue
+            self.__results.put((generation, scan, images))
+
+            for other in prefetch:
+                if not self.__isCurrent(generation):
+                    break
+                try:
+                    thumbnail_store.getStandardSlices(other, size)
+                except Exception as ex:
+                    print(f"Failed to prefetch {other}: {ex}")
+
+    def __poll(self):
+        if self.__stopped:
+            return
+        latest = None
+        while True:
+            try:
+                latest = self.__results.get_nowait()
+            except queue.Empty:
+                break
+        if latest is not None:
+            generation, scan, images = latest
+            if self.__isCurrent(generation):
+                self.__on_rendered(scan, images)
+        self.__widget.after(_POLL_INTERVAL, self.__poll)
@@ -1,20 +1,16 @@
 import functools
-import os
-import tempfile
-
-from PIL import ImageTk
-import PIL.Image
 
 from tkinter import *
 from tkinter.constants import *
 
-import cv2
 import tkinter as tk
 import tkinter.ttk as ttk
 
 import cogni_scan.src.utils as cs
 import cogni_scan.front_end.cfc.view as view
+import cogni_scan.front_end.render_service as render_service
 import cogni_scan.front_end.settings as settings
+import cogni_scan.front_end.tk_images as tk_images
 import cogni_scan.src.utils as utils
 
 
@@ -22,6 +18,16 @@ class RightView(view.View):
 
     def __init__(self, parent_frame):
         self.__parent_frame = parent_frame
+        self.__render_service = None
+        self.__canvases = []
+
+    def getRenderService(self):
+        """Returns the service that renders the slices in the background."""
+        if self.__render_service is None:
+            self.__render_service = render_service.RenderService(
+                self.__parent_frame, self.onSlicesRendered
+            )
+        return self.__render_service
 
     def eventHandler(self, item_selected):
         print("here", item_selected)
@@ -46,8 +52,10 @@ class RightView(view.View):
         Needs to be implemented by the client code.
         """
         self.remove_images()
-        mri = self.getDocument().getActiveMri()
+        doc = self.getDocument()
+        mri = doc.getActiveMri()
         if not mri:
+            self.getRenderService().cancel()
             return
         # Add the canvas where the slices are drawn.
         self.imgs = []
@@ -75,18 +83,30 @@ class RightView(view.View):
         for i, c in enumerate(canvases):
             c.grid(row=i, column=0)
 
-        index = 0
-        for canvas in canvases:
-            self.update_scan(mri, canvas, index)
-            index += 1
+        # The slices are drawn when rendered (see onSlicesRendered).
+        self.__canvases = canvases
+        self.getRenderService().request(
+            mri, doc.getSliceSquareLength(), prefetch=doc.getAdjacentMris()
+        )
 
         # tk.Misc.lift(canvas)
 
-    def update_scan(self, mri, canvas, index):
-        imgs = [
-            ImageTk.PhotoImage(PIL.Image.open(file))
-            for file in self.saveSlicesToDisk(mri, index)
-        ]
+    def onSlicesRendered(self, mri, images):
+        """Draws the rendered standard slices (called on the tk thread).
+
+        Slices of a scan that is not the active one anymore (like the scans
+        of a document that was reloaded) are ignored.
+        """
+        doc = self.getDocument()
+        if doc is None or mri is not doc.getActiveMri():
+            return
+        for index, canvas in enumerate(self.__canvases):
+            # The standard slices are ordered by axis and then by distance
+            # (-d, 0, d) so each row shows one distance for all the axes.
+            self.update_scan(images[index::3], canvas)
+
+    def update_scan(self, images, canvas):
+        imgs = [tk_images.toPhotoImage(image) for image in images]
         x, y = 0, 190
         n = len(imgs)
         for img in imgs:
@@ -94,35 +114,6 @@ class RightView(view.View):
             x += self.img_canvas_width / n
         self.imgs.extend(imgs)
 
-    def saveSlicesToDisk(self, scan, index):
-        """Saves the slices for the passed in scan to disk."""
-        doc = self.getDocument()
-        mri = doc.getActiveMri()
-
-        if index == 0:
-            distances = mri.getSliceDistances()
-            distances = [-x for x in distances]
-        elif index == 1:
-            distances = 0, 0, 0
-        elif index == 2:
-            distances = mri.getSliceDistances()
-            distances = [x for x in distances]
-
-        filenames = []
-        base_dir = tempfile.gettempdir()
-
-        for axis in [0, 1, 2]:
-            filename = f"slice_{axis}_{index}.jpg"
-            filename = os.path.join(base_dir, filename)
-            filenames.append(filename)
-            img = scan.get_slice(
-                distance_from_center=distances[axis],
-                axis=axis,
-                bounding_square=doc.getSliceSquareLength(),
-            )
-            cv2.imwrite(filename, img)
-        return filenames
-
 
 if __name__ == '__main__':
     v = RightView(None)
@@ -0,0 +1,125 @@
+import threading
+import time
+import unittest
+
+import cogni_scan.front_end.render_service as render_service
+
+
+class _FakeWidget:
+    """Runs the after() callbacks when poll is called."""
+
+    def __init__(self):
+        self.__callbacks = []
+
+    def after(self, ms, callback):
+        self.__callbacks.append(callback)
+
+    def poll(self):
+        callbacks, self.__callbacks = self.__callbacks, []
+        for callback in callbacks:
+            callback()
+
+
+class _FakeRenderer:
+    """Replaces thumbnail_store.getStandardSlices; blocks until released."""
+
+    def __init__(self):
+        self.started = []
+        self.__events = {}
+        self.__lock = threading.Lock()
+
+    def __call__(self, scan, size):
+        with self.__lock:
+            self.started.append(scan)
+            event = self.__events.setdefault(scan, threading.Event())
+        event.wait(timeout=10)
+        return f"images of {scan}"
+
+    def release(self, scan):
+        with self.__lock:
+            self.__events.setdefault(scan, threading.Event()).set()
+
+    def waitForStart(self, scan):
+        deadline = time.monotonic() + 10
+        while scan not in self.started and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert scan in self.started
+
+
+class RenderServiceTest(unittest.TestCase):
+    def setUp(self):
+        self.renderer = _FakeRenderer()
+        self._original = render_service.thumbnail_store.getStandardSlices
+        render_service.thumbnail_store.getStandardSlices = self.renderer
+        self.widget = _FakeWidget()
+        self.delivered = []
+        self.service = render_service.RenderService(
+            self.widget, lambda scan, images: self.delivered.append(scan)
+        )
+
+    def tearDown(self):
+        self.service.stop()
+        render_service.thumbnail_store.getStandardSlices = self._original
+
+    def _pollFor(self, seconds):
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            self.widget.poll()
+            time.sleep(0.01)
+
+    def _pollUntilDelivered(self):
+        deadline = time.monotonic() + 10
+        while not self.delivered and time.monotonic() < deadline:
+            self.widget.poll()
+            time.sleep(0.01)
+
+    def test_delivers_the_request(self):
+        self.renderer.release("a")
+        self.service.request("a", 100)
+        self._pollUntilDelivered()
+        self.assertEqual(self.delivered, ["a"])
+
+    def test_only_the_latest_request_is_delivered(self):
+        self.service.request("a", 100)
+        self.renderer.waitForStart("a")
+        self.service.request("b", 100)
+        self.service.request("c", 100)
+        for scan in ("a", "b", "c"):
+            self.renderer.release(scan)
+        self._pollUntilDelivered()
+        self._pollFor(0.2)
+        self.assertEqual(self.delivered, ["c"])
+        # The replaced request was never rendered.
+        self.assertNotIn("b", self.renderer.started)
+
+    def test_cancel(self):
+        self.service.request("a", 100)
+        self.renderer.waitForStart("a")
+        self.service.cancel()
+        self.renderer.release("a")
+        self._pollFor(0.3)
+        self.assertEqual(self.delivered, [])
+
+    def test_queued_result_of_an_old_request_is_dropped(self):
+        self.renderer.release("a")
+        self.service.request("a", 100)
+        # Wait until the result of "a" is queued without polling it.
+        self.renderer.waitForStart("a")
+        time.sleep(0.2)
+        self.service.request("b", 100)
+        self.renderer.waitForStart("b")
+        self._pollFor(0.2)
+        self.assertEqual(self.delivered, [])
+        self.renderer.release("b")
+        self._pollUntilDelivered()
+        self.assertEqual(self.delivered, ["b"])
+
+    def test_prefetch_after_the_request(self):
+        for scan in ("a", "b", "c"):
+            self.renderer.release(scan)
+        self.service.request("a", 100, prefetch=["b", "c"])
+        self._pollUntilDelivered()
+        self.renderer.waitForStart("c")
+        self.assertEqual(self.renderer.started, ["a", "b", "c"])
+        self._pollFor(0.1)
+        self.assertEqual(self.delivered, ["a"])
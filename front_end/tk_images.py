@@ -0,0 +1,19 @@
+"""Converts rendered slices to images that can be drawn on tk canvases."""
+
+from PIL import ImageTk
+import PIL.Image
+import numpy as np
+
+import cogni_scan.src.thumbnail_store as thumbnail_store
+
+
+def toPhotoImage(image):
+    """Returns a tk PhotoImage for a gray scale slice.
+
+    :param image: A 2D numpy array; uint8 arrays are used as they are, other
+    types are rounded and clipped to 0..255.
+    """
+    if image.dtype != np.uint8:
+        image = thumbnail_store.toUint8(image)
+    # Pillow uses the "L" (gray scale) mode for 2D uint8 arrays.
+    return ImageTk.PhotoImage(PIL.Image.fromarray(image))
@@ -13,6 +13,7 @@ import numpy as np
 import tensorflow as tf
 
 import cogni_scan.src.dbutil as dbutil
+import cogni_scan.src.feature_codec as feature_codec
 
 _SQL_SELECT_DEMENTED = """
 select 
@@ -57,10 +58,9 @@ def _getFeaturesForScan(scan_id, slices, db):
           f" from scan_features where scan_id={scan_id}"
     features = []
     for row in db.execute_query(sql):
-        for i in range(n):
-            features.extend(row[i][0])
+        features = [feature_codec.decode(row[i]) for i in range(n)]
     assert features, f"Could not find features for {scan_id}."
-    return features
+    return np.concatenate(features)
 
 
 def _trainModel(number_of_slices,
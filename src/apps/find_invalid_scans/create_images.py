@@ -4,10 +4,11 @@ import csv
 import os
 
 import cv2
-import nibabel as nib
 import numpy as np
 import tensorflow as tf
 
+import cogni_scan.src.nifti_reader as nifti_reader
+
 _CURRENT_DIR = os.path.dirname(os.path.realpath(__file__))
 
 
@@ -17,17 +18,7 @@ def saveImage(fullpath, destination, distance_from_center=0, axis=0,
     assert 0 <= axis <= 2
     assert -1. <= distance_from_center <= 1.
 
-    img = nib.load(fullpath).get_fdata()
-    n = int(int(img.shape[axis] / 2) * (1 + distance_from_center))
-
-    if axis == 0:
-        img = img[n, :, :]
-    elif axis == 1:
-        img = img[:, n, :]
-    elif axis == 2:
-        img = img[:, :, n]
-    else:
-        raise ValueError
+    img = nifti_reader.readPlane(fullpath, axis, distance_from_center)
 
     x, y = img.shape
 
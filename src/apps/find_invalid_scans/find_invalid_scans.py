@@ -30,11 +30,11 @@ from sklearn.metrics import roc_curve
 from tensorflow import keras
 from tensorflow.keras.applications.vgg16 import VGG16
 import cv2
-import nibabel as nib
 import numpy as np
 import tensorflow as tf
 
 import cogni_scan.src.dbutil as dbutil
+import cogni_scan.src.nifti_reader as nifti_reader
 
 _SQL_SELECT_INVALID = """
 select fullpath from scan where 
@@ -45,6 +45,12 @@ _SQL_SELECT_VALID = "select fullpath from scan where validation_status = 2"
 
 _SQL_SELECT_UNDEFINED = "select fullpath, scan_id, patient_id from scan where validation_status=0"
 
+_SQL_UPDATE_VALIDATION_STATUS = """
+update scan a set validation_status = b.validation_status
+from (values %s) as b (scan_id, validation_status)
+where a.scan_id = b.scan_id
+"""
+
 _CURRENT_DIR = os.path.dirname(os.path.realpath(__file__))
 
 
@@ -97,17 +103,7 @@ def loadFeatures(fullpath, distance_from_center=0, axis=0, bounding_square=200):
     assert 0 <= axis <= 2
     assert -1. <= distance_from_center <= 1.
 
-    img = nib.load(fullpath).get_fdata()
-    n = int(int(img.shape[axis] / 2) * (1 + distance_from_center))
-
-    if axis == 0:
-        img = img[n, :, :]
-    elif axis == 1:
-        img = img[:, n, :]
-    elif axis == 2:
-        img = img[:, :, n]
-    else:
-        raise ValueError
+    img = nifti_reader.readPlane(fullpath, axis, distance_from_center)
 
     x, y = img.shape
 
@@ -262,25 +258,28 @@ def updateDb(filepath):
     update the validation_status in the database.
     """
 
+    rows = []
+    with open(filepath) as fin:
+        for tokens in csv.reader(fin):
+            scan_id = tokens[0]
+            path = tokens[1]
+            status = tokens[3]
+            status = status.strip().lower()
+
+            if status == 'valid':
+                validation_status = 2
+            elif status == 'invalid':
+                validation_status = 1
+            else:
+                assert False, "Invalid validation status."
+            rows.append((int(scan_id), validation_status))
+
     with dbutil.SimpleSQL() as db:
-        with open(filepath) as fin:
-            for tokens in csv.reader(fin):
-                scan_id = tokens[0]
-                path = tokens[1]
-                status = tokens[3]
-                status = status.strip().lower()
-
-                if status == 'valid':
-                    validation_status = 2
-                elif status == 'invalid':
-                    validation_status = 1
-                else:
-                    assert False, "Invalid validation status."
-
-                sql = f"update scan set validation_status={validation_status} " \
-                      f"where scan_id={scan_id}"
-                print(sql)
-                db.execute_non_query(sql)
+        with db.transaction():
+            db.execute_values(
+                _SQL_UPDATE_VALIDATION_STATUS, rows, template="(%s, %s)"
+            )
+    print(f"Updated the validation status of {len(rows)} scans.")
 
 
 if __name__ == '__main__':
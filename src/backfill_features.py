@@ -0,0 +1,133 @@
+"""Calculates the missing VGG16 features from the command line.
+
+Selects the valid scans that do not have a row in scan_features yet and
+processes them in chunks; the features of each chunk are committed in a
+single transaction so the job can be interrupted (Ctrl-C or a crash) at any
+point and it will resume from the first scan that is still missing its
+features when it runs again.
+
+Example:
+
+    python -m cogni_scan.src.backfill_features --workers 16 --batch-size 256
+"""
+
+import argparse
+import sys
+import time
+
+import cogni_scan.constants as constants
+import cogni_scan.src.dbutil as dbutil
+import cogni_scan.src.feature_pipeline as feature_pipeline
+import cogni_scan.src.nifti_mri as nifti_mri
+import cogni_scan.src.vgg16 as vgg16
+
+DEFAULT_CHUNK_SIZE = 256
+
+_SQL_SELECT_MISSING_FEATURES = """
+select
+    a.fullpath, a.scan_id, a.days, a.patient_id, a.origin, a.health_status,
+    a.axis, a.rotation, a.sd0, a.sd1, a.sd2, a.validation_status
+from
+    scan a left join scan_features b on a.scan_id = b.scan_id
+where
+    b.scan_id is null and a.validation_status = {validation_status}
+    and a.scan_id > {after_scan_id}
+order by a.scan_id
+limit {limit}
+""".format
+
+
+def _loadChunk(db, after_scan_id, limit):
+    """Returns the next scans (by scan_id) that are missing features."""
+    sql = _SQL_SELECT_MISSING_FEATURES(
+        validation_status=constants.VALID_SCAN,
+        after_scan_id=after_scan_id,
+        limit=limit
+    )
+    return [nifti_mri.Scan(*row) for row in db.execute_query(sql)]
+
+
+def backfill(workers=None, batch_size=vgg16.DEFAULT_BATCH_SIZE,
+             limit=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Saves the VGG16 features for the valid scans that are missing them.
+
+    :param int workers: The number of rendering processes.
+    :param int batch_size: The minimum number of images per VGG16 call.
+    :param int limit: The maximum number of scans to process (all if None).
+    :param int chunk_size: The number of scans committed together.
+
+    :return: The number of the scans that were processed.
+    """
+    processed = 0
+    # Scans that fail to render keep missing their features; we move past
+    # them (by scan_id) so they are only retried in the next run.
+    after_scan_id = 0
+    # The rendering processes (and their imports) are reused by all the
+    # chunks; each chunk writes to the inserter of its own transaction.
+    pipeline = feature_pipeline.FeaturePipeline(None, workers, batch_size)
+    with dbutil.SimpleSQL() as db, pipeline:
+        while limit is None or processed < limit:
+            size = chunk_size
+            if limit is not None:
+                size = min(size, limit - processed)
+            scans = _loadChunk(db, after_scan_id, size)
+            if not scans:
+                break
+
+            t1 = time.monotonic()
+            with db.transaction():
+                with nifti_mri.FeatureInserter(db) as inserter:
+                    pipeline.run(scans, inserter.add)
+                nifti_mri.updateFeatureLabels(
+                    db, [scan.getScanID() for scan in scans]
+                )
+
+            processed += len(scans)
+            after_scan_id = scans[-1].getScanID()
+            duration = time.monotonic() - t1
+            print(f"Committed {len(scans)} scans (up to scan_id "
+                  f"{after_scan_id}) in {duration:.1f}s; "
+                  f"{processed} scans so far.")
+        pipeline.printStats()
+    return processed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Calculates the missing VGG16 features of the valid scans."
+    )
+    parser.add_argument(
+        "--workers", type=int, default=None,
+        help="Number of processes rendering slices (default: cpu count)."
+    )
+    parser.add_argument(
+        "--batch-size", type=int, default=vgg16.DEFAULT_BATCH_SIZE,
+        help="Minimum number of images passed to VGG16 in one call."
+    )
+    parser.add_argument(
+        "--limit", type=int, default=None,
+        help="Maximum number of scans to process (default: all)."
+    )
+    parser.add_argument(
+        "--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE,
+        help="Number of scans committed in each transaction."
+    )
+    args = parser.parse_args(argv)
+
+    try:
+        processed = backfill(
+            workers=args.workers,
+            batch_size=args.batch_size,
+            limit=args.limit,
+            chunk_size=args.chunk_size
+        )
+    except KeyboardInterrupt:
+        print("Interrupted; the current chunk was rolled back. "
+              "Run again to resume.")
+        return 130
+    print(f"Done; processed {processed} scans.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,109 @@
+"""Pre-renders the slice thumbnails of the scans from the command line.
+
+Renders the nine standard slices of each scan (for its current orientation)
+at all the thumbnail sizes and saves them to the thumbnail store so the
+front end can show them without decoding the nifti files.  Scans that
+already have thumbnails for their current orientation are skipped so the job
+can be stopped and restarted at any time.
+
+Example:
+
+    python -m cogni_scan.src.build_thumbnails --workers 8
+"""
+
+import argparse
+import concurrent.futures
+import multiprocessing
+import sys
+
+import cogni_scan.src.dbutil as dbutil
+import cogni_scan.src.nifti_mri as nifti_mri
+import cogni_scan.src.thumbnail_store as thumbnail_store
+
+_SQL_SELECT_SCANS = """
+select
+    fullpath, scan_id, days, patient_id, origin, health_status,
+    axis, rotation, sd0, sd1, sd2, validation_status
+from scan
+order by scan_id
+"""
+
+
+def _initWorker(store_dir):
+    """Initializes a worker process."""
+    thumbnail_store.setStoreDir(store_dir)
+
+
+def _buildThumbnails(scan):
+    """Renders and saves the thumbnails of a scan (runs in a worker)."""
+    try:
+        thumbnail_store.save(scan, thumbnail_store.renderThumbnails(scan))
+    finally:
+        scan.unloadImage()
+    return scan.getScanID()
+
+
+def build(workers=None, limit=None):
+    """Saves the thumbnails of the scans that are missing them.
+
+    :param int workers: The number of rendering processes.
+    :param int limit: The maximum number of scans to process (all if None).
+
+    :return: The number of the scans that were processed.
+    """
+    with dbutil.SimpleSQL() as db:
+        scans = [
+            nifti_mri.Scan(*row) for row in db.execute_query(_SQL_SELECT_SCANS)
+        ]
+    scans = [s for s in scans if not thumbnail_store.hasThumbnails(s)]
+    if limit is not None:
+        scans = scans[:limit]
+    print(f"Building the thumbnails of {len(scans)} scans.")
+
+    processed = 0
+    # Spawn (instead of fork) so the workers do not inherit the db
+    # connections or any tensorflow state of the parent.
+    context = multiprocessing.get_context("spawn")
+    with concurrent.futures.ProcessPoolExecutor(
+            max_workers=workers, mp_context=context,
+            initializer=_initWorker,
+            initargs=(thumbnail_store.getStoreDir(),)) as pool:
+        futures = {pool.submit(_buildThumbnails, s): s for s in scans}
+        for future in concurrent.futures.as_completed(futures):
+            scan = futures[future]
+            try:
+                future.result()
+            except Exception as ex:
+                print(f"Failed to render scan {scan.getScanID()}: {ex}")
+                continue
+            processed += 1
+            if processed % 100 == 0:
+                print(f"Rendered {processed} of {len(scans)} scans.")
+    return processed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Pre-renders the slice thumbnails of the scans."
+    )
+    parser.add_argument(
+        "--workers", type=int, default=None,
+        help="Number of rendering processes (default: cpu count)."
+    )
+    parser.add_argument(
+        "--limit", type=int, default=None,
+        help="Maximum number of scans to process (default: all)."
+    )
+    args = parser.parse_args(argv)
+
+    try:
+        processed = build(workers=args.workers, limit=args.limit)
+    except KeyboardInterrupt:
+        print("Interrupted; run again to resume.")
+        return 130
+    print(f"Done; rendered {processed} scans.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,108 @@
+"""Keeps a local snapshot of the scans of the patient collection.
+
+Loading all the scans from a remote database is slow so the columns of the
+loaded scans (see nifti_mri.PatientCollection) are saved in a compressed
+archive under:
+
+    ~/.cogni_scan/snapshots/<database_key>.npz
+
+along with the state of the database when they were loaded (the max
+scan.updated_at and the max scan_features.feature_id); later loads read the
+snapshot and fetch only the scans that changed after it.
+
+The database key is a hash of the connection string so the snapshots of
+different databases never mix.
+"""
+
+import hashlib
+import io
+import json
+import os
+import pathlib
+
+import numpy as np
+
+# Bumped when the stored columns change; older snapshots are ignored.
+SNAPSHOT_VERSION = 1
+
+# The name of the archive member holding the (json encoded) state.
+_STATE = "__state__"
+
+_snapshot_dir = None
+
+
+def getSnapshotDir():
+    """Returns the directory where the snapshots are stored."""
+    if _snapshot_dir:
+        return _snapshot_dir
+    home_dir = pathlib.Path.home()
+    return os.path.join(home_dir, '.cogni_scan', 'snapshots')
+
+
+def setSnapshotDir(dir_path):
+    """Sets the directory where the snapshots are stored."""
+    global _snapshot_dir
+    _snapshot_dir = dir_path
+
+
+def getKey(connection_string):
+    """Returns the key of the snapshot for the passed in database."""
+    return hashlib.sha1(connection_string.encode()).hexdigest()[:16]
+
+
+def save(key, arrays, state):
+    """Saves a snapshot.
+
+    :param str key: The key of the database (see getKey).
+    :param dict arrays: Maps names to numpy arrays (no object arrays).
+    :param dict state: A json serializable dict describing the database
+    state of the snapshot.
+    """
+    path = _getPath(key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    state = dict(state, version=SNAPSHOT_VERSION)
+    buffer = io.BytesIO()
+    np.savez_compressed(
+        buffer, **arrays, **{_STATE: np.array(json.dumps(state))}
+    )
+    # Written to a temporary file first so readers never see a partial file.
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as fout:
+        fout.write(buffer.getvalue())
+    os.replace(tmp_path, path)
+
+
+def load(key):
+    """Loads a snapshot.
+
+    :return: A tuple (arrays, state) as passed to save or None if there is
+    no (valid) snapshot for the database.
+    """
+    path = _getPath(key)
+    try:
+        with np.load(path, allow_pickle=False) as archive:
+            arrays = {
+                name: archive[name] for name in archive.files
+                if name != _STATE
+            }
+            state = json.loads(str(archive[_STATE]))
+    except (FileNotFoundError, KeyError, ValueError, OSError) as ex:
+        if os.path.isfile(path):
+            print(f"Invalid snapshot file {path}: {ex}")
+        return None
+    if state.pop("version", None) != SNAPSHOT_VERSION:
+        return None
+    return arrays, state
+
+
+def discard(key):
+    """Removes the snapshot of the passed in database."""
+    try:
+        os.remove(_getPath(key))
+    except FileNotFoundError:
+        pass
+
+
+def _getPath(key):
+    """Returns the path of the snapshot file for the database."""
+    return os.path.join(getSnapshotDir(), f"{key}.npz")
@@ -1,40 +1,449 @@
-"""Simple wrapper around the psycopg."""
+"""Simple wrapper around the psycopg.
+
+The connections are taken from a process wide pool so opening a SimpleSQL
+is cheap; the pool is created (and the connection string printed) the first
+time a connection is needed and it is recreated if the process forks.
+"""
+
+import contextlib
+import io
+import itertools
+import json
+import os
+import threading
+import time
 
 import psycopg2
-import sys
+import psycopg2.extensions
+import psycopg2.extras
+import psycopg2.pool
 
 import cogni_scan.src.utils as utils
 
+DEFAULT_MIN_CONNECTIONS = 1
+DEFAULT_MAX_CONNECTIONS = 8
+
+# Connections that were idle for more than these seconds are checked (with
+# a "select 1") before they are used.
+HEALTH_CHECK_AFTER = 30.
+
+# The seconds to wait for a free connection before giving up.
+CHECKOUT_TIMEOUT = 60.
+
+# The number of rows fetched in each round trip by the streaming queries.
+DEFAULT_ITERSIZE = 2000
+
+# The number of rows sent in each statement by the bulk writes.
+DEFAULT_PAGE_SIZE = 1000
+
+
+class _ConnectionPool:
+    """A thread safe pool of connections with usage metrics."""
+
+    def __init__(self, dsn, min_connections, max_connections):
+        self.__dsn = dsn
+        self.__pid = os.getpid()
+        self.__pool = psycopg2.pool.ThreadedConnectionPool(
+            min_connections, max_connections, dsn
+        )
+        # Blocks the callers (instead of failing) when all the connections
+        # are in use.
+        self.__available = threading.BoundedSemaphore(max_connections)
+        self.__lock = threading.Lock()
+        self.__last_used = {}
+        self.__max_connections = max_connections
+        self.__checkouts = 0
+        self.__connections_created = 0
+        self.__health_check_failures = 0
+        self.__in_use = 0
+        self.__max_in_use = 0
+        self.__wait_seconds = 0.
+
+    @property
+    def dsn(self):
+        return self.__dsn
+
+    @property
+    def pid(self):
+        return self.__pid
+
+    def getconn(self):
+        """Returns a healthy connection in autocommit mode."""
+        t1 = time.monotonic()
+        if not self.__available.acquire(timeout=CHECKOUT_TIMEOUT):
+            raise psycopg2.pool.PoolError("Timed out waiting for a connection.")
+        try:
+            connection = self.__getHealthyConnection()
+        except BaseException:
+            self.__available.release()
+            raise
+        with self.__lock:
+            self.__checkouts += 1
+            self.__in_use += 1
+            self.__max_in_use = max(self.__max_in_use, self.__in_use)
+            self.__wait_seconds += time.monotonic() - t1
+        return connection
+
+    def putconn(self, connection):
+        """Returns a connection to the pool (closing it if broken)."""
+        close = bool(connection.closed)
+        if not close:
+            try:
+                status = connection.get_transaction_status()
+                if status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    connection.rollback()
+                if not connection.autocommit:
+                    connection.autocommit = True
+            except psycopg2.Error:
+                close = True
+        with self.__lock:
+            self.__in_use -= 1
+            if close:
+                self.__last_used.pop(id(connection), None)
+            else:
+                self.__last_used[id(connection)] = time.monotonic()
+        self.__pool.putconn(connection, close=close)
+        self.__available.release()
+
+    def closeall(self):
+        self.__pool.closeall()
+
+    def getStats(self):
+        """Returns a dict with the usage metrics of the pool."""
+        with self.__lock:
+            return {
+                "max_connections": self.__max_connections,
+                "checkouts": self.__checkouts,
+                "connections_created": self.__connections_created,
+                "health_check_failures": self.__health_check_failures,
+                "in_use": self.__in_use,
+                "max_in_use": self.__max_in_use,
+                "wait_seconds": self.__wait_seconds,
+            }
+
+    def __getHealthyConnection(self):
+        while True:
+            connection = self.__pool.getconn()
+            with self.__lock:
+                last_used = self.__last_used.get(id(connection))
+                if last_used is None:
+                    self.__connections_created += 1
+            if last_used is None:
+                connection.autocommit = True
+                return connection
+            if not connection.closed and \
+                    time.monotonic() - last_used < HEALTH_CHECK_AFTER:
+                return connection
+            try:
+                with connection.cursor() as cursor:
+                    cursor.execute("select 1")
+                return connection
+            except psycopg2.Error:
+                with self.__lock:
+                    self.__health_check_failures += 1
+                    self.__last_used.pop(id(connection), None)
+                self.__pool.putconn(connection, close=True)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+_min_connections = DEFAULT_MIN_CONNECTIONS
+_max_connections = DEFAULT_MAX_CONNECTIONS
+
+
+def configurePool(min_connections=DEFAULT_MIN_CONNECTIONS,
+                  max_connections=DEFAULT_MAX_CONNECTIONS):
+    """Sets the size of the connection pool.
+
+    Takes effect the next time the pool is created (the current pool, if
+    any, is closed).
+    """
+    assert 0 <= min_connections <= max_connections
+    global _min_connections, _max_connections
+    with _pool_lock:
+        _min_connections = min_connections
+        _max_connections = max_connections
+        _closePool()
+
+
+def closePool():
+    """Closes all the connections of the pool."""
+    with _pool_lock:
+        _closePool()
+
+
+def getPoolStats():
+    """Returns the usage metrics of the connection pool."""
+    with _pool_lock:
+        if _pool is None or _pool.pid != os.getpid():
+            return {}
+        return _pool.getStats()
+
+
+def _closePool():
+    global _pool
+    if _pool is not None and _pool.pid == os.getpid():
+        _pool.closeall()
+    _pool = None
+
+
+def _getPool():
+    """Returns the pool for the current connection string and process."""
+    global _pool
+    dsn = SimpleSQL.getConnectionString()
+    with _pool_lock:
+        if _pool is not None and _pool.pid != os.getpid():
+            # Forked; the connections belong to the parent so they must not
+            # be used (or closed) here.
+            _pool = None
+        if _pool is not None and _pool.dsn != dsn:
+            _closePool()
+        if _pool is None:
+            print(f"Using Connection String: {dsn}")
+            _pool = _ConnectionPool(dsn, _min_connections, _max_connections)
+        return _pool
+
+
+_COPY_ESCAPES = str.maketrans({
+    "\\": "\\\\",
+    "\t": "\\t",
+    "\n": "\\n",
+    "\r": "\\r",
+})
+
+
+def _toCopyText(value):
+    """Converts a value to a field of the COPY text format."""
+    if value is None:
+        return "\\N"
+    if isinstance(value, psycopg2.extensions.Binary):
+        value = value.adapted
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        # The bytea hex format; its backslash is escaped for COPY.
+        return "\\\\x" + bytes(value).hex()
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    if isinstance(value, (dict, list)):
+        value = json.dumps(value)
+    return str(value).translate(_COPY_ESCAPES)
+
+
+def _closeCursor(cursor):
+    """Closes a server side cursor ignoring the errors of broken connections.
+
+    (A failed transaction already released the cursor in the server.)
+    """
+    try:
+        cursor.close()
+    except psycopg2.Error as ex:
+        print(f"Failed to close cursor {cursor.name}: {ex}")
+
 
 class SimpleSQL:
+    _in_transaction = False
+    _database_name = None
 
-    def __enter__(self):
+    @classmethod
+    def setDatabaseName(cls, database_name):
+        """Overrides the database of the connection string."""
+        cls._database_name = database_name
+
+    @classmethod
+    def getDatabaseName(cls):
+        """Returns the database set with setDatabaseName (if any)."""
+        return cls._database_name
+
+    @classmethod
+    def getConnectionString(cls):
+        """Returns the connection string to use."""
         conn_str = utils.getPsqlConnectionString()
-        print(f"Using Connection String: {conn_str}")
-        self._connection = psycopg2.connect(conn_str)
+        if cls._database_name:
+            conn_str = psycopg2.extensions.make_dsn(
+                conn_str, dbname=cls._database_name
+            )
+        return conn_str
+
+    # Used to give unique names to the server side cursors.
+    _cursor_ids = itertools.count()
+
+    def __enter__(self):
+        self._pool = _getPool()
+        self._connection = self._pool.getconn()
+        self._cursors = []
+        # True while the streaming queries run in a transaction of their own.
+        self._streaming_transaction = False
         return self
 
     def __exit__(self, exc_type, exc_value, trace):
         assert self._connection
-        self._connection.close()
+        # Close the server side cursors of any unfinished streaming queries
+        # before the connection is reused.
+        for cursor in self._cursors:
+            _closeCursor(cursor)
+        self._cursors = []
+        # The pool rolls back any open transaction.
+        self._streaming_transaction = False
+        self._pool.putconn(self._connection)
         self._connection = None
 
-    def execute_query(self, sql):
+    def execute_query(self, sql, params=None):
         assert self._connection
         with self._connection.cursor() as cursor:
-            cursor.execute(sql)
+            cursor.execute(sql, params)
             records = cursor.fetchall()
             for row in records:
                 yield row
 
-    def execute_non_query(self, sql):
+    def execute_streaming_query(self, sql, params=None,
+                                itersize=DEFAULT_ITERSIZE):
+        """Yields the rows of a select statement as they are fetched.
+
+        Uses a server side (named) cursor so only itersize rows are held in
+        memory at any time; the rows must be consumed before the SimpleSQL
+        exits (unfinished queries are closed then).
+
+        A server side cursor lives in a transaction; outside transaction()
+        the query runs in a (read) transaction that ends, and autocommit is
+        restored, when the last streaming query is consumed or closed.
+        Until then the writes and transaction() raise
+        psycopg2.ProgrammingError.  Within transaction() the queries run in
+        its transaction and writes are allowed.  (A "with hold" cursor would
+        outlive an autocommit declaration but the server computes all its
+        rows when the declaration commits.)
+
+        :param sql: the sql to execute
+        :param params: the values for the %s placeholders of the sql (if any)
+        :param int itersize: the number of rows fetched in each round trip
+        """
+        assert self._connection
+        name = f"simple_sql_{os.getpid()}_{next(self._cursor_ids)}"
+        cursor = self._connection.cursor(name)
+        cursor.itersize = itersize
+        return self.__iterate(cursor, sql, params)
+
+    def __iterate(self, cursor, sql, params):
+        if self._connection.autocommit:
+            self._connection.autocommit = False
+            self._streaming_transaction = True
+        self._cursors.append(cursor)
+        try:
+            cursor.execute(sql, params)
+            for row in cursor:
+                yield row
+        finally:
+            # Already closed if the SimpleSQL exited.
+            if cursor in self._cursors:
+                _closeCursor(cursor)
+                self._cursors.remove(cursor)
+                if not self._cursors and self._streaming_transaction:
+                    self.__endStreamingTransaction()
+
+    def __checkNotStreaming(self):
+        """Raises if streaming queries run in a transaction of their own.
+
+        Their (read) transaction is rolled back when they end so writes are
+        not allowed until then.
+        """
+        if self._streaming_transaction:
+            raise psycopg2.ProgrammingError(
+                "Cannot write while streaming queries are open outside a "
+                "transaction; consume or close them first."
+            )
+
+    def __endStreamingTransaction(self):
+        """Ends the transaction of the streaming queries (they only read)."""
+        self._streaming_transaction = False
+        try:
+            self._connection.rollback()
+            self._connection.autocommit = True
+        except psycopg2.Error as ex:
+            # The pool closes the broken connection when it is returned.
+            print(f"Failed to end the streaming transaction: {ex}")
+
+    def execute_non_query(self, sql, params=None):
         """Executes a non select statement.
 
         :param sql: the sql to execute
+        :param params: the values for the %s placeholders of the sql (if any)
 
         :raise:psycopg2.DatabaseError
         """
         assert self._connection
-        self._connection.autocommit = True
+        self.__checkNotStreaming()
+        if not self._in_transaction:
+            self._connection.autocommit = True
+        with self._connection.cursor() as cursor:
+            cursor.execute(sql, params)
+
+    def execute_values(self, sql, rows, template=None,
+                       page_size=DEFAULT_PAGE_SIZE):
+        """Executes a statement with a single VALUES %s for many rows.
+
+        The rows are sent in pages of page_size rows per statement (see
+        psycopg2.extras.execute_values); use within transaction() to write
+        all the pages atomically.
+
+        :param sql: the sql to execute; must contain a single %s where the
+        VALUES list goes (like "insert into t (a, b) values %s")
+        :param rows: a sequence of tuples
+        :param template: the template of each row (like "(%s, %s::int)")
+        :param int page_size: the number of rows per statement
+        """
+        assert self._connection
+        self.__checkNotStreaming()
+        if not self._in_transaction:
+            self._connection.autocommit = True
+        with self._connection.cursor() as cursor:
+            psycopg2.extras.execute_values(
+                cursor, sql, rows, template=template, page_size=page_size
+            )
+
+    def copy_rows(self, table, columns, rows):
+        """Loads many rows to a table using COPY FROM STDIN.
+
+        The fastest way for large loads; the rows are converted to the COPY
+        text format (None becomes NULL and bytes become bytea).
+
+        :param str table: the table to load
+        :param columns: the names of the columns of the rows
+        :param rows: an iterable of tuples
+        """
+        assert self._connection
+        self.__checkNotStreaming()
+        if not self._in_transaction:
+            self._connection.autocommit = True
+        buffer = io.StringIO()
+        for row in rows:
+            buffer.write("\t".join(_toCopyText(v) for v in row))
+            buffer.write("\n")
+        buffer.seek(0)
+        sql = f"COPY {table} ({', '.join(columns)}) FROM STDIN"
         with self._connection.cursor() as cursor:
-            cursor.execute(sql)
+            cursor.copy_expert(sql, buffer)
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """Runs all the statements of the block in a single transaction.
+
+        The transaction is committed when the block exits normally and rolled
+        back if it raises (including KeyboardInterrupt).
+        """
+        assert self._connection
+        assert not self._in_transaction
+        if self._cursors:
+            raise psycopg2.ProgrammingError(
+                "Cannot start a transaction while streaming queries are "
+                "open; consume or close them first."
+            )
+        if self._connection.autocommit:
+            self._connection.autocommit = False
+        self._in_transaction = True
+        try:
+            yield self
+            self._connection.commit()
+        except BaseException:
+            self._connection.rollback()
+            raise
+        finally:
+            self._in_transaction = False
+            self._connection.autocommit = True
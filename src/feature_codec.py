@@ -0,0 +1,39 @@
+"""Converts VGG16 features to and from the format stored in the database.
+
+Each features_sliceXY column of the scan_features table holds the 512 VGG16
+features of one slice packed as little-endian float32 values in a bytea.
+"""
+
+import numpy as np
+import psycopg2
+
+DTYPE = np.dtype('<f4')
+
+# The number of features stored for each slice.
+FEATURES_PER_SLICE = 512
+
+
+def encode(features):
+    """Packs the passed in features to a value for a bytea column.
+
+    :param features: An array-like holding the 512 features of a slice (any
+    shape, it is flattened).
+    :return: A psycopg2.Binary to be used as a query parameter.
+    """
+    a = np.asarray(features, dtype=DTYPE).reshape(-1)
+    assert a.size == FEATURES_PER_SLICE
+    return psycopg2.Binary(a.tobytes())
+
+
+def decode(value):
+    """Unpacks the features of a slice as read from a bytea column.
+
+    :param value: The bytes (or memoryview) returned by psycopg2.
+    :return: A read-only float32 numpy array of 512 features.
+
+    :raises ValueError: If the value is not a packed feature vector.
+    """
+    a = np.frombuffer(value, dtype=DTYPE)
+    if a.size != FEATURES_PER_SLICE:
+        raise ValueError(f"Invalid features size: {a.size}.")
+    return a
@@ -0,0 +1,317 @@
+"""Staged pipeline that calculates and stores the VGG16 features of scans.
+
+The work needed for each scan is split in three stages that run in parallel:
+
+    render: A process pool decompresses the nifti files and renders the nine
+            standard slices of each scan.
+
+    infer:  A single thread groups the rendered slices into large batches and
+            passes them through VGG16.
+
+    write:  A single thread persists the features of each scan.
+
+The stages are connected with bounded queues so a slow stage applies back
+pressure to the previous one instead of accumulating rendered slices in
+memory.  Each stage keeps its own counters so we can tell which one is the
+bottleneck.
+
+A pipeline can run many times (like once per committed chunk of scans); its
+process pool is started on the first run and kept until it is closed.
+"""
+
+import concurrent.futures
+import concurrent.futures.process
+import multiprocessing
+import os
+import queue
+import threading
+import time
+
+import cogni_scan.src.dbutil as dbutil
+import cogni_scan.src.nifti_mri as nifti_mri
+import cogni_scan.src.vgg16 as vgg16
+
+DEFAULT_QUEUE_SIZE = 64
+
+# Marks the end of the items passed through a queue.
+_DONE = object()
+
+
+def _renderScan(scan):
+    """Renders the standard slices of the scan (runs in the process pool)."""
+    t1 = time.monotonic()
+    slices = scan.renderStandardSlices()
+    return slices, time.monotonic() - t1
+
+
+class StageCounter:
+    """Counts the items processed by a stage and the time spent on them."""
+
+    def __init__(self, name):
+        self.__name = name
+        self.__lock = threading.Lock()
+        self.__items = 0
+        self.__failures = 0
+        self.__busy_seconds = 0.
+        self.__started_at = time.monotonic()
+
+    def __repr__(self):
+        stats = self.getStats()
+        return f"{self.__name}: {stats['items']} items, " \
+               f"{stats['failures']} failures, " \
+               f"busy {stats['busy_seconds']:.1f}s, " \
+               f"{stats['items_per_second']:.2f} items/s"
+
+    def add(self, items, busy_seconds):
+        """Records that items were processed in busy_seconds."""
+        with self.__lock:
+            self.__items += items
+            self.__busy_seconds += busy_seconds
+
+    def addFailure(self):
+        """Records an item that could not be processed."""
+        with self.__lock:
+            self.__failures += 1
+
+    def getStats(self):
+        """Returns the counters of the stage as a dict."""
+        with self.__lock:
+            elapsed = time.monotonic() - self.__started_at
+            return {
+                "items": self.__items,
+                "failures": self.__failures,
+                "busy_seconds": self.__busy_seconds,
+                "elapsed_seconds": elapsed,
+                "items_per_second": self.__items / elapsed if elapsed else 0.,
+            }
+
+
+class FeaturePipeline:
+    """Calculates the VGG16 features for a collection of scans.
+
+    The features of each scan are passed to the writer callable as:
+
+        writer(scan, features)
+
+    where features is a numpy array shaped as (9, 512).  The writer is always
+    called from the same (write stage) thread.
+
+    The counters of the stages add up the items of all the runs.  Use as a
+    context manager (or call close) to stop the rendering processes.
+    """
+
+    def __init__(self, writer, workers=None,
+                 batch_size=vgg16.DEFAULT_BATCH_SIZE,
+                 queue_size=DEFAULT_QUEUE_SIZE):
+        """Initializer.
+
+        :param writer: Persists the features of a scan (can be None if a
+        writer is passed to each run).
+        :param int workers: The size of the rendering process pool (defaults
+        to the number of CPUs).
+        :param int batch_size: The minimum number of images per VGG16 call.
+        :param int queue_size: The capacity of the queues between the stages.
+        """
+        self.__writer = writer
+        self.__workers = workers or os.cpu_count() or 1
+        self.__batch_size = batch_size
+        self.__queue_size = queue_size
+        self.__counters = {
+            name: StageCounter(name) for name in ("render", "infer", "write")
+        }
+        self.__pool = None
+        self.__error = None
+        self.__render_error = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, trace):
+        self.close()
+
+    def close(self):
+        """Stops the rendering processes (a new run starts them again)."""
+        if self.__pool is not None:
+            self.__pool.shutdown(cancel_futures=True)
+            self.__pool = None
+
+    def getStats(self):
+        """Returns the counters of all the stages."""
+        return {
+            name: counter.getStats()
+            for name, counter in self.__counters.items()
+        }
+
+    def printStats(self):
+        """Prints the counters of all the stages."""
+        for counter in self.__counters.values():
+            print(counter)
+
+    def run(self, scans, writer=None):
+        """Calculates and writes the features for all the passed in scans.
+
+        Returns when all the scans are written; a scan that can not be
+        rendered is skipped and counted as a failure of the render stage.
+
+        :param writer: Persists the features of the scans of this run
+        (instead of the writer passed to the initializer).
+
+        :raises: Any exception raised by the inference or the write stage or
+        that stopped the render stage (like a BrokenProcessPool when a
+        rendering process dies).
+        """
+        self.__error = None
+        self.__render_error = None
+        rendered = queue.Queue(maxsize=self.__queue_size)
+        inferred = queue.Queue(maxsize=self.__queue_size)
+        stop = threading.Event()
+
+        render_thread = threading.Thread(
+            target=self.__render, args=(scans, rendered, stop), daemon=True
+        )
+        write_thread = threading.Thread(
+            target=self.__write,
+            args=(writer or self.__writer, inferred, stop),
+            daemon=True
+        )
+        render_thread.start()
+        write_thread.start()
+        try:
+            self.__infer(rendered, inferred, stop)
+        except BaseException:
+            stop.set()
+            raise
+        finally:
+            # Unblock the render stage if it waits for space in the queue.
+            while render_thread.is_alive():
+                try:
+                    rendered.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+            render_thread.join()
+            inferred.put(_DONE)
+            write_thread.join()
+
+        if self.__render_error:
+            raise self.__render_error
+        if self.__error:
+            raise self.__error
+
+    def __render(self, scans, rendered, stop):
+        """Renders the scans in a process pool (render stage).
+
+        The end of the scans is always sent to the infer stage (even when the
+        stage fails) so it never waits for ever.
+        """
+        try:
+            self.__renderAll(scans, rendered, stop)
+        except BaseException as ex:
+            self.__render_error = ex
+            stop.set()
+        finally:
+            rendered.put(_DONE)
+
+    def __renderAll(self, scans, rendered, stop):
+        counter = self.__counters["render"]
+        max_pending = self.__workers * 2
+        if self.__pool is None:
+            # Spawn (instead of fork) since tensorflow is running in this
+            # process.
+            context = multiprocessing.get_context("spawn")
+            self.__pool = concurrent.futures.ProcessPoolExecutor(
+                max_workers=self.__workers, mp_context=context
+            )
+        pool = self.__pool
+        scans = iter(scans)
+        pending = {}
+        exhausted = False
+        try:
+            while not stop.is_set():
+                while not exhausted and len(pending) < max_pending:
+                    scan = next(scans, None)
+                    if scan is None:
+                        exhausted = True
+                    else:
+                        pending[pool.submit(_renderScan, scan)] = scan
+                if not pending:
+                    break
+                done, _ = concurrent.futures.wait(
+                    pending, return_when=concurrent.futures.FIRST_COMPLETED
+                )
+                for future in done:
+                    scan = pending.pop(future)
+                    try:
+                        slices, seconds = future.result()
+                    except concurrent.futures.process.BrokenProcessPool:
+                        # A worker died; the pool can not be used anymore.
+                        counter.addFailure()
+                        self.close()
+                        raise
+                    except Exception as ex:
+                        print(f"Failed to render {scan}: {ex}")
+                        counter.addFailure()
+                        continue
+                    counter.add(1, seconds)
+                    rendered.put((scan, slices))
+        finally:
+            # The scans of a stopped run are not rendered.
+            for future in pending:
+                future.cancel()
+
+    def __infer(self, rendered, inferred, stop):
+        """Passes the rendered slices through VGG16 (infer stage)."""
+        counter = self.__counters["infer"]
+
+        def on_features(scan, features):
+            inferred.put((scan, features))
+
+        batcher = vgg16.FeatureBatcher(on_features, self.__batch_size)
+        while not stop.is_set():
+            item = rendered.get()
+            if item is _DONE:
+                break
+            scan, slices = item
+            t1 = time.monotonic()
+            batcher.add(scan, nifti_mri.add_rgb_channels(slices))
+            counter.add(1, time.monotonic() - t1)
+        t1 = time.monotonic()
+        batcher.flush()
+        counter.add(0, time.monotonic() - t1)
+
+    def __write(self, writer, inferred, stop):
+        """Persists the features (write stage)."""
+        counter = self.__counters["write"]
+        while True:
+            item = inferred.get()
+            if item is _DONE:
+                break
+            if self.__error:
+                # Keep draining so the infer stage will never block.
+                continue
+            scan, features = item
+            t1 = time.monotonic()
+            try:
+                writer(scan, features)
+            except Exception as ex:
+                counter.addFailure()
+                self.__error = ex
+                stop.set()
+                continue
+            counter.add(1, time.monotonic() - t1)
+
+
+def saveVGG16Features(scans, workers=None,
+                      batch_size=vgg16.DEFAULT_BATCH_SIZE):
+    """Calculates and saves the VGG16 features for the passed in scans.
+
+    Returns the stats of the pipeline.
+    """
+    with dbutil.SimpleSQL() as db:
+        with nifti_mri.FeatureInserter(db) as inserter:
+            with FeaturePipeline(
+                    inserter.add, workers, batch_size) as pipeline:
+                try:
+                    pipeline.run(scans)
+                finally:
+                    pipeline.printStats()
+        return pipeline.getStats()
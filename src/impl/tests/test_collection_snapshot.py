@@ -0,0 +1,50 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+import cogni_scan.src.collection_snapshot as collection_snapshot
+
+
+class CollectionSnapshotTest(unittest.TestCase):
+    def setUp(self):
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        collection_snapshot.setSnapshotDir(self._tmp_dir.name)
+
+    def tearDown(self):
+        collection_snapshot.setSnapshotDir(None)
+        self._tmp_dir.cleanup()
+
+    def test_save_and_load(self):
+        key = collection_snapshot.getKey("dbname=scans")
+        self.assertIsNone(collection_snapshot.load(key))
+        arrays = {
+            "scan_ids": np.array([1, 2, 3], dtype=np.int64),
+            "fullpaths": np.array(["/a.nii", "/b.nii", "/c.nii"]),
+        }
+        state = {"watermark": "2024-01-01T00:00:00+00:00", "count": 3}
+        collection_snapshot.save(key, arrays, state)
+
+        loaded_arrays, loaded_state = collection_snapshot.load(key)
+        self.assertEqual(loaded_state, state)
+        self.assertEqual(set(loaded_arrays), set(arrays))
+        for name, values in arrays.items():
+            np.testing.assert_array_equal(loaded_arrays[name], values)
+
+        collection_snapshot.discard(key)
+        self.assertIsNone(collection_snapshot.load(key))
+
+    def test_databases_do_not_mix(self):
+        key = collection_snapshot.getKey("dbname=scans")
+        other_key = collection_snapshot.getKey("dbname=dummyscans")
+        self.assertNotEqual(key, other_key)
+        collection_snapshot.save(key, {}, {})
+        self.assertIsNone(collection_snapshot.load(other_key))
+
+    def test_invalid_file(self):
+        key = collection_snapshot.getKey("dbname=scans")
+        path = os.path.join(self._tmp_dir.name, f"{key}.npz")
+        with open(path, "w") as fout:
+            fout.write("garbage")
+        self.assertIsNone(collection_snapshot.load(key))
@@ -0,0 +1,296 @@
+"""Tests the dbutil module (needs the dummyscans database)."""
+
+import threading
+import time
+import unittest
+from unittest import mock
+
+import psycopg2
+import psycopg2.extensions
+import psycopg2.pool
+
+import cogni_scan.src.dbutil as dbutil
+
+_DBNAME = 'dummyscans'
+
+
+class CopyTextTest(unittest.TestCase):
+    def test_null(self):
+        self.assertEqual(dbutil._toCopyText(None), "\\N")
+        # Only None is NULL; the text "\N" is escaped.
+        self.assertEqual(dbutil._toCopyText("\\N"), "\\\\N")
+
+    def test_bytea(self):
+        expected = "\\\\x00ff10"
+        self.assertEqual(dbutil._toCopyText(b"\x00\xff\x10"), expected)
+        self.assertEqual(
+            dbutil._toCopyText(bytearray(b"\x00\xff\x10")), expected
+        )
+        self.assertEqual(
+            dbutil._toCopyText(memoryview(b"\x00\xff\x10")), expected
+        )
+        self.assertEqual(
+            dbutil._toCopyText(psycopg2.Binary(b"\x00\xff\x10")), expected
+        )
+        self.assertEqual(dbutil._toCopyText(b""), "\\\\x")
+
+    def test_special_characters(self):
+        self.assertEqual(
+            dbutil._toCopyText("a\tb\nc\rd\\e"), "a\\tb\\nc\\rd\\\\e"
+        )
+        self.assertEqual(
+            dbutil._toCopyText({"path": "c:\\scans\ta"}),
+            '{"path": "c:\\\\\\\\scans\\\\ta"}'
+        )
+
+    def test_scalars(self):
+        self.assertEqual(dbutil._toCopyText(True), "t")
+        self.assertEqual(dbutil._toCopyText(False), "f")
+        self.assertEqual(dbutil._toCopyText(12), "12")
+        self.assertEqual(dbutil._toCopyText(0.5), "0.5")
+        self.assertEqual(dbutil._toCopyText([1, 2]), "[1, 2]")
+
+
+class ConnectionPoolTest(unittest.TestCase):
+    def setUp(self):
+        dbutil.SimpleSQL.setDatabaseName(_DBNAME)
+        dbutil.configurePool(min_connections=0, max_connections=2)
+
+    def tearDown(self):
+        # Closes the pool of the test and restores the default size.
+        dbutil.configurePool()
+
+    def test_exhausted_pool_times_out(self):
+        with mock.patch.object(dbutil, "CHECKOUT_TIMEOUT", 0.1):
+            with dbutil.SimpleSQL(), dbutil.SimpleSQL():
+                with self.assertRaises(psycopg2.pool.PoolError):
+                    with dbutil.SimpleSQL():
+                        pass
+            # The connections were returned so they can be used again.
+            with dbutil.SimpleSQL() as db:
+                self.assertEqual(list(db.execute_query("select 1")), [(1,)])
+        self.assertEqual(dbutil.getPoolStats()["in_use"], 0)
+
+    def test_exhausted_pool_blocks(self):
+        checked_out = threading.Event()
+
+        def checkout():
+            with dbutil.SimpleSQL():
+                checked_out.set()
+
+        with dbutil.SimpleSQL():
+            with dbutil.SimpleSQL():
+                thread = threading.Thread(target=checkout)
+                thread.start()
+                self.assertFalse(checked_out.wait(0.2))
+            # Gets the connection returned by the inner block.
+            self.assertTrue(checked_out.wait(10))
+            thread.join()
+
+        stats = dbutil.getPoolStats()
+        self.assertEqual(stats["checkouts"], 3)
+        self.assertEqual(stats["max_in_use"], 2)
+        self.assertGreater(stats["wait_seconds"], 0.1)
+
+    def test_failed_transaction_is_rolled_back(self):
+        dbutil.configurePool(min_connections=0, max_connections=1)
+        with dbutil.SimpleSQL() as db:
+            connection = db._connection
+            connection.autocommit = False
+            with connection.cursor() as cursor:
+                with self.assertRaises(psycopg2.Error):
+                    cursor.execute("select 1 / 0")
+            self.assertEqual(
+                connection.get_transaction_status(),
+                psycopg2.extensions.TRANSACTION_STATUS_INERROR
+            )
+
+        with dbutil.SimpleSQL() as db:
+            self.assertIs(db._connection, connection)
+            self.assertTrue(connection.autocommit)
+            self.assertEqual(
+                connection.get_transaction_status(),
+                psycopg2.extensions.TRANSACTION_STATUS_IDLE
+            )
+            self.assertEqual(list(db.execute_query("select 1")), [(1,)])
+
+    def test_close_pool(self):
+        with dbutil.SimpleSQL() as db:
+            connection = db._connection
+        self.assertEqual(dbutil.getPoolStats()["checkouts"], 1)
+
+        dbutil.closePool()
+        self.assertTrue(connection.closed)
+        self.assertEqual(dbutil.getPoolStats(), {})
+
+        # A new pool is created when a connection is needed.
+        with dbutil.SimpleSQL() as db:
+            self.assertIsNot(db._connection, connection)
+            self.assertEqual(list(db.execute_query("select 1")), [(1,)])
+        self.assertEqual(dbutil.getPoolStats()["checkouts"], 1)
+
+
+
+class SimpleSQLTest(unittest.TestCase):
+    def setUp(self):
+        dbutil.SimpleSQL.setDatabaseName(_DBNAME)
+
+    def test_copy_rows(self):
+        rows = [
+            (1, "a\tb\nc\\d", b"\x00\xff\\", True, {"k": "v\\"}),
+            (2, "\\N", b"", False, None),
+            (3, None, None, None, [1, 2]),
+        ]
+        with dbutil.SimpleSQL() as db:
+            db.execute_non_query(
+                "create temp table copy_test "
+                "(id int, t text, b bytea, f boolean, j jsonb)"
+            )
+            try:
+                db.copy_rows("copy_test", ["id", "t", "b", "f", "j"], rows)
+                loaded = list(db.execute_query(
+                    "select id, t, b, f, j from copy_test order by id"
+                ))
+            finally:
+                db.execute_non_query("drop table copy_test")
+        self.assertEqual(
+            [(i, t, b if b is None else bytes(b), f, j)
+             for i, t, b, f, j in loaded],
+            rows
+        )
+
+    def test_streaming_query(self):
+        with dbutil.SimpleSQL() as db:
+            rows = db.execute_streaming_query(
+                "select i from generate_series(1, %s) i order by i", (25,),
+                itersize=10
+            )
+            self.assertEqual(list(rows), [(i,) for i in range(1, 26)])
+            self.assertEqual(list(db.execute_streaming_query(
+                "select i from generate_series(1, 0) i"
+            )), [])
+            self._assertIdle(db)
+
+    def test_streaming_query_is_not_materialized(self):
+        with dbutil.SimpleSQL() as db:
+            rows = db.execute_streaming_query(
+                "select i from generate_series(1, 100) i", itersize=10
+            )
+            self.assertEqual(next(rows), (1,))
+            cursors = list(db.execute_query(
+                "select is_holdable from pg_cursors where name like %s",
+                ("simple_sql_%",)
+            ))
+            # A holdable cursor is computed when the transaction commits.
+            self.assertEqual(cursors, [(False,)])
+            self.assertEqual(len(list(rows)), 99)
+            self._assertIdle(db)
+
+    def test_interleaved_streaming_queries(self):
+        sql = "select i from generate_series(1, 30) i order by i"
+        with dbutil.SimpleSQL() as db:
+            first = db.execute_streaming_query(sql, itersize=5)
+            second = db.execute_streaming_query(sql, itersize=5)
+            pairs = list(zip(first, second))
+            self.assertEqual(pairs, [((i,), (i,)) for i in range(1, 31)])
+            # zip stopped at the end of first; second is still open.
+            self.assertFalse(db._connection.autocommit)
+            self.assertEqual(list(second), [])
+            self._assertIdle(db)
+
+    def test_closed_streaming_query(self):
+        with dbutil.SimpleSQL() as db:
+            rows = db.execute_streaming_query(
+                "select i from generate_series(1, 100) i", itersize=10
+            )
+            self.assertEqual(next(rows), (1,))
+            rows.close()
+            self._assertIdle(db)
+            db.execute_non_query("select 1")
+
+    def test_failed_streaming_query(self):
+        with dbutil.SimpleSQL() as db:
+            with self.assertRaises(psycopg2.Error):
+                list(db.execute_streaming_query("select 1 / 0"))
+            self._assertIdle(db)
+            self.assertEqual(list(db.execute_query("select 1")), [(1,)])
+
+    def test_streaming_query_in_transaction(self):
+        with dbutil.SimpleSQL() as db:
+            with db.transaction():
+                db.execute_non_query(
+                    "create temp table stream_test as "
+                    "select i from generate_series(1, 20) i"
+                )
+                rows = db.execute_streaming_query(
+                    "select i from stream_test order by i", itersize=3
+                )
+                self.assertEqual(len(list(rows)), 20)
+                # The transaction is still open.
+                self.assertFalse(db._connection.autocommit)
+                db.execute_non_query("drop table stream_test")
+            self._assertIdle(db)
+
+    def test_write_while_streaming(self):
+        with dbutil.SimpleSQL() as db:
+            db.execute_non_query("create temp table write_test (i int)")
+            rows = db.execute_streaming_query(
+                "select i from generate_series(1, 100) i", itersize=10
+            )
+            self.assertEqual(next(rows), (1,))
+            with self.assertRaises(psycopg2.ProgrammingError):
+                db.execute_non_query("insert into write_test values (1)")
+            with self.assertRaises(psycopg2.ProgrammingError):
+                db.execute_values(
+                    "insert into write_test (i) values %s", [(1,)]
+                )
+            with self.assertRaises(psycopg2.ProgrammingError):
+                db.copy_rows("write_test", ["i"], [(1,)])
+            # The query is not affected.
+            self.assertEqual(len(list(rows)), 99)
+
+            db.execute_non_query("insert into write_test values (1)")
+            self.assertEqual(
+                list(db.execute_query("select i from write_test")), [(1,)]
+            )
+            db.execute_non_query("drop table write_test")
+            self._assertIdle(db)
+
+    def test_transaction_while_streaming(self):
+        with dbutil.SimpleSQL() as db:
+            rows = db.execute_streaming_query(
+                "select i from generate_series(1, 100) i", itersize=10
+            )
+            self.assertEqual(next(rows), (1,))
+            with self.assertRaises(psycopg2.ProgrammingError):
+                with db.transaction():
+                    pass
+            self.assertFalse(db._connection.autocommit)
+            self.assertEqual(len(list(rows)), 99)
+            self._assertIdle(db)
+            with db.transaction():
+                db.execute_non_query("select 1")
+            self._assertIdle(db)
+
+    def test_unfinished_streaming_query(self):
+        dbutil.configurePool(min_connections=0, max_connections=1)
+        try:
+            with dbutil.SimpleSQL() as db:
+                rows = db.execute_streaming_query(
+                    "select i from generate_series(1, 100) i", itersize=10
+                )
+                self.assertEqual(next(rows), (1,))
+            rows.close()
+            with dbutil.SimpleSQL() as db:
+                self._assertIdle(db)
+                self.assertEqual(list(db.execute_query("select 1")), [(1,)])
+        finally:
+            dbutil.configurePool()
+
+    def _assertIdle(self, db):
+        """Asserts that the connection is in autocommit with no transaction."""
+        self.assertTrue(db._connection.autocommit)
+        self.assertEqual(
+            db._connection.get_transaction_status(),
+            psycopg2.extensions.TRANSACTION_STATUS_IDLE
+        )
@@ -0,0 +1,89 @@
+import concurrent.futures.process
+import contextlib
+import io
+import os
+import re
+import threading
+import unittest
+
+import cogni_scan.src.feature_pipeline as feature_pipeline
+
+
+class _CrashingScan:
+    """A scan whose rendering kills the worker process."""
+
+    def renderStandardSlices(self):
+        os._exit(1)
+
+
+class _FailingScan:
+    """A scan whose rendering raises."""
+
+    def renderStandardSlices(self):
+        raise ValueError("Invalid scan.")
+
+
+class _PidScan:
+    """A scan whose rendering fails with the pid of the worker."""
+
+    def renderStandardSlices(self):
+        raise ValueError(f"pid {os.getpid()}")
+
+
+def _runPipeline(*runs):
+    """Runs the pipeline in a thread; returns its exception (if any).
+
+    Each of the runs is a list of scans passed to the same pipeline.
+    """
+    results = {}
+
+    def run():
+        with feature_pipeline.FeaturePipeline(
+                lambda scan, features: None, workers=1) as pipeline:
+            for scans in runs:
+                try:
+                    pipeline.run(scans)
+                except BaseException as ex:
+                    results["error"] = ex
+            results["stats"] = pipeline.getStats()
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    thread.join(timeout=60)
+    return not thread.is_alive(), results
+
+
+class FeaturePipelineTest(unittest.TestCase):
+    def test_failing_render_is_skipped(self):
+        finished, results = _runPipeline([_FailingScan()])
+        self.assertTrue(finished)
+        self.assertNotIn("error", results)
+        self.assertEqual(results["stats"]["render"]["failures"], 1)
+
+    def test_crashing_worker_stops_the_pipeline(self):
+        finished, results = _runPipeline([_CrashingScan(), _FailingScan()])
+        self.assertTrue(finished, "The pipeline hangs.")
+        self.assertIsInstance(
+            results.get("error"), concurrent.futures.process.BrokenProcessPool
+        )
+
+    def test_runs_reuse_the_workers(self):
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            finished, results = _runPipeline([_PidScan()], [_PidScan()])
+        self.assertTrue(finished)
+        self.assertNotIn("error", results)
+        pids = re.findall(r"pid (\d+)", output.getvalue())
+        self.assertEqual(len(pids), 2)
+        self.assertEqual(pids[0], pids[1])
+        self.assertNotEqual(int(pids[0]), os.getpid())
+        # The counters add up the runs.
+        self.assertEqual(results["stats"]["render"]["failures"], 2)
+
+    def test_crashed_workers_are_replaced(self):
+        finished, results = _runPipeline([_CrashingScan()], [_FailingScan()])
+        self.assertTrue(finished, "The pipeline hangs.")
+        self.assertIsInstance(
+            results.get("error"), concurrent.futures.process.BrokenProcessPool
+        )
+        self.assertEqual(results["stats"]["render"]["failures"], 2)
@@ -0,0 +1,68 @@
+import os
+import subprocess
+import sys
+import unittest
+
+# The modules that must be usable (db access, slice rendering and the
+# models' metadata) without loading tensorflow or sklearn.
+_MODULES = [
+    "cogni_scan.src.dbutil",
+    "cogni_scan.src.utils",
+    "cogni_scan.src.nifti_mri",
+    "cogni_scan.src.remove_unused_scans",
+    "cogni_scan.src.backfill_features",
+    "cogni_scan.src.build_thumbnails",
+    "cogni_scan.src.modeler.model",
+    "cogni_scan.src.modeler.impl.dataset_impl",
+    "cogni_scan.src.modeler.impl.model_impl",
+    "cogni_scan.src.modeler.impl.create_dataset",
+    "cogni_scan.db.sync_model_weights",
+]
+
+# Blocks the heavy packages whether they are installed or not: importing
+# them raises (not an ImportError so it is not mistaken for a missing
+# optional package) and every attempt is recorded.
+_SCRIPT = """
+import importlib
+import importlib.abc
+import sys
+
+_HEAVY = ('tensorflow', 'keras', 'sklearn')
+attempts = []
+
+class _Blocker(importlib.abc.MetaPathFinder):
+    def find_spec(self, fullname, path, target=None):
+        if fullname.split('.')[0] in _HEAVY:
+            attempts.append(fullname)
+            raise RuntimeError(f'{fullname} imported eagerly.')
+        return None
+
+sys.meta_path.insert(0, _Blocker())
+for name in sys.argv[1:]:
+    importlib.import_module(name)
+loaded = [m for m in sys.modules if m.split('.')[0] in _HEAVY]
+assert not attempts and not loaded, (attempts, loaded)
+"""
+
+
+class LazyImportsTest(unittest.TestCase):
+    def _runScript(self, modules):
+        # A new interpreter so the modules imported by other tests do not
+        # affect the result.
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+        return subprocess.run(
+            [sys.executable, "-c", _SCRIPT] + modules,
+            env=env, capture_output=True, text=True
+        )
+
+    def test_heavy_modules_are_not_imported(self):
+        result = self._runScript(_MODULES)
+        self.assertEqual(result.returncode, 0, result.stderr)
+
+    def test_eager_import_fails(self):
+        # Fails even if tensorflow or sklearn are not installed.
+        for module in ("tensorflow", "sklearn.metrics"):
+            result = self._runScript([module])
+            self.assertNotEqual(result.returncode, 0)
+            package = module.split(".")[0]
+            self.assertIn(f"{package} imported eagerly", result.stderr)
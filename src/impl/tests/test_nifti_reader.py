@@ -0,0 +1,66 @@
+import os
+import tempfile
+import unittest
+
+import nibabel as nib
+import numpy as np
+
+import cogni_scan.src.nifti_reader as nifti_reader
+
+_CURRENT_DIR = os.path.dirname(os.path.realpath(__file__))
+_DUMMY_MRI = os.path.join(_CURRENT_DIR, "testing_data", "mri-2.nii.gz")
+
+
+class NiftiReaderTest(unittest.TestCase):
+    def test_invalid_filepath(self):
+        with self.assertRaises(FileNotFoundError):
+            nifti_reader.Volume("junk_path")
+
+    def test_compressed_planes_match_get_fdata(self):
+        expected = nib.load(_DUMMY_MRI).get_fdata()
+        volume = nifti_reader.Volume(_DUMMY_MRI)
+        self.assertEqual(volume.shape, expected.shape[:3])
+        for axis in [0, 1, 2]:
+            for d in [-.5, 0, .5]:
+                plane = volume.getPlaneAtDistance(axis, d)
+                n = nifti_reader.getPlaneIndex(expected.shape, axis, d)
+                self.assertEqual(plane.dtype, np.float32)
+                np.testing.assert_array_equal(
+                    plane, np.take(expected, n, axis=axis)
+                )
+
+    def test_uncompressed_planes_are_read_lazily(self):
+        img = nib.load(_DUMMY_MRI)
+        expected = img.get_fdata()
+        with tempfile.TemporaryDirectory() as dir_path:
+            filepath = os.path.join(dir_path, "mri.nii")
+            nib.save(img, filepath)
+            volume = nifti_reader.Volume(filepath)
+            self.assertEqual(volume.nbytes, 0)
+            for axis in [0, 1, 2]:
+                plane = volume.getPlaneAtDistance(axis, 0)
+                n = nifti_reader.getPlaneIndex(expected.shape, axis, 0)
+                np.testing.assert_array_equal(
+                    plane, np.take(expected, n, axis=axis)
+                )
+            self.assertEqual(volume.nbytes, 0)
+
+    def test_get_planes(self):
+        expected = nib.load(_DUMMY_MRI).get_fdata()
+        volume = nifti_reader.Volume(_DUMMY_MRI)
+        for axis in [0, 1, 2]:
+            indexes = [5, 3, 3, 20]
+            planes = volume.getPlanes(axis, indexes)
+            self.assertEqual(planes.dtype, np.float32)
+            for plane, n in zip(planes, indexes):
+                np.testing.assert_array_equal(
+                    plane, np.take(expected, n, axis=axis)
+                )
+
+    def test_extra_dimensions(self):
+        data = np.arange(4 * 5 * 6, dtype=np.int16).reshape((4, 5, 6, 1))
+        with tempfile.TemporaryDirectory() as dir_path:
+            filepath = os.path.join(dir_path, "mri.nii")
+            nib.save(nib.Nifti1Image(data, np.eye(4)), filepath)
+            plane = nifti_reader.readPlane(filepath, axis=2)
+            np.testing.assert_array_equal(plane, data[:, :, 3, 0])
@@ -0,0 +1,45 @@
+import unittest
+
+import cogni_scan.src.nifti_mri as nifti_mri
+
+
+def _makeScan(scan_id, days, health_status=0, has_features=False):
+    scan = nifti_mri.Scan(
+        f"/a/{scan_id}.nii", scan_id, days, "P1", "OASIS3", health_status
+    )
+    if has_features:
+        scan.setToHasVGGFeatures()
+    return scan
+
+
+class PatientTest(unittest.TestCase):
+    def test_add_scan_keeps_the_scans_sorted(self):
+        patient = nifti_mri.Patient("P1")
+        for scan_id, days in ((1, 300), (2, 0), (3, 300), (4, 100)):
+            patient.addScan(_makeScan(scan_id, days))
+        self.assertEqual(
+            [patient.getScan(i).getScanID() for i in range(4)], [2, 4, 1, 3]
+        )
+        self.assertEqual(patient.numberOfDistinctDays(), 3)
+        self.assertFalse(patient.hasVGGFeatures())
+
+    def test_add_scans(self):
+        patient = nifti_mri.Patient("P1")
+        patient.addScan(_makeScan(1, 200))
+        patient.addScans([
+            _makeScan(2, 0, health_status=2),
+            _makeScan(3, 200, has_features=True),
+        ])
+        patient.addScan(_makeScan(4, 100))
+        self.assertEqual(
+            [patient.getScan(i).getScanID() for i in range(4)], [2, 4, 1, 3]
+        )
+        self.assertEqual(patient.numberOfDistinctDays(), 3)
+        self.assertTrue(patient.hasVGGFeatures())
+        self.assertEqual(patient.getLabel(), "D?")
+
+        patient.keepOnlyHealthyScans()
+        self.assertEqual(patient.numberOfScans(), 3)
+        self.assertEqual(patient.numberOfDistinctDays(), 2)
+        self.assertTrue(patient.hasVGGFeatures())
+        self.assertEqual(patient.getLabel(), "H?")
@@ -0,0 +1,87 @@
+import os
+import unittest
+
+import cv2
+import numpy as np
+
+import cogni_scan.src.nifti_mri as nifti_mri
+import cogni_scan.src.nifti_reader as nifti_reader
+
+_CURRENT_DIR = os.path.dirname(os.path.realpath(__file__))
+_DUMMY_MRI = os.path.join(_CURRENT_DIR, "testing_data", "mri-2.nii.gz")
+
+
+def _referenceSlice(filepath, distance_from_center, axis, bounding_square,
+                    rotations=0):
+    """The per slice rendering used before get_slices (for comparison)."""
+    img = nifti_reader.readPlane(filepath, axis, distance_from_center)
+    for _ in range(rotations):
+        img = cv2.rotate(img, cv2.ROTATE_90_COUNTERCLOCKWISE)
+
+    x, y = img.shape
+    if x > y:
+        ratio = y / x
+        x = bounding_square
+        y = bounding_square * ratio
+    elif x < y:
+        ratio = x / y
+        y = bounding_square
+        x = bounding_square * ratio
+    else:
+        x = y = bounding_square
+
+    x = int(x)
+    y = int(y)
+    l_img = np.full((bounding_square, bounding_square), 0)
+    x_offset = int((bounding_square - y) / 2)
+    y_offset = int((bounding_square - x) / 2)
+    s_img = cv2.resize(img, dsize=(y, x), interpolation=cv2.INTER_CUBIC)
+    l_img[y_offset:y_offset + s_img.shape[0],
+          x_offset:x_offset + s_img.shape[1]] = s_img
+    return l_img
+
+
+class ScanSlicesTest(unittest.TestCase):
+    def test_get_slices(self):
+        scan = nifti_mri.Scan(_DUMMY_MRI)
+        spec = scan.getStandardSlices()
+        images = scan.get_slices(spec, bounding_square=120)
+        self.assertEqual(images.shape, (9, 120, 120))
+        self.assertEqual(images.dtype, np.float32)
+        for image, (axis, d) in zip(images, spec):
+            np.testing.assert_array_equal(
+                image, _referenceSlice(_DUMMY_MRI, d, axis, 120)
+            )
+
+    def test_get_slices_of_rotated_scan(self):
+        scan = nifti_mri.Scan(_DUMMY_MRI)
+        scan.changeOrienation(2)
+        scan.changeOrienation(2)
+        scan.changeOrienation(0)
+        images = scan.get_slices([(2, 0.1), (0, -0.2)], bounding_square=90)
+        np.testing.assert_array_equal(
+            images[0], _referenceSlice(_DUMMY_MRI, 0.1, 2, 90, rotations=2)
+        )
+        np.testing.assert_array_equal(
+            images[1], _referenceSlice(_DUMMY_MRI, -0.2, 0, 90, rotations=1)
+        )
+
+    def test_slices_keep_the_aspect_ratio(self):
+        scan = nifti_mri.Scan(_DUMMY_MRI)
+        # The volume is 256x256x45 so the planes of the first axis (256x45)
+        # are resized to 100x17 and centered horizontally.
+        images = scan.get_slices([(0, 0)], bounding_square=100)
+        self.assertFalse(np.any(images[0][:, :41]))
+        self.assertFalse(np.any(images[0][:, 58:]))
+        self.assertTrue(np.any(images[0][:, 41:58]))
+
+    def test_invalid_axis(self):
+        scan = nifti_mri.Scan(_DUMMY_MRI)
+        with self.assertRaises(ValueError):
+            scan.get_slices([(5, 0)])
+
+    def test_movie_frames(self):
+        scan = nifti_mri.Scan(_DUMMY_MRI)
+        frames = scan.getMovieFrames(axis=1, bounding_square=150)
+        self.assertEqual(frames.shape, (95, 150, 150))
+        self.assertEqual(frames.dtype, np.uint8)
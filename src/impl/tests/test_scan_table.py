@@ -0,0 +1,246 @@
+import datetime
+import tempfile
+import unittest
+
+import numpy as np
+
+import cogni_scan.src.collection_snapshot as collection_snapshot
+import cogni_scan.src.nifti_mri as nifti_mri
+
+_AXIS = {'0': 0, '1': 1, '2': 2}
+_ROTATION = [0, 0, 0]
+
+_ROWS = [
+    (10, "/a/10.nii", 0, "P1", "OASIS3", 0, _AXIS, _ROTATION,
+     0.2, 0.2, 0.2, 1, False, 2),
+    (11, "/a/11.nii", 0, "P1", "OASIS3", 0, _AXIS, [1, 0, 0],
+     0.2, 0.3, 0.2, 1, True, 2),
+    (12, "/a/12.nii", 700, "P1", "OASIS3", 2, _AXIS, _ROTATION,
+     None, None, None, None, False, 2),
+    (5, "/b/5.nii", 30, "P2", "ADNI", 0, {'0': 2, '1': 1, '2': 0},
+     _ROTATION, 0.1, 0.2, 0.3, 2, True, None),
+]
+
+
+class ScanTableTest(unittest.TestCase):
+    def setUp(self):
+        self.table = nifti_mri._ScanTable.fromRows(_ROWS)
+
+    def test_interned_columns(self):
+        self.assertEqual(len(self.table), 4)
+        self.assertEqual(self.table.patient_ids, ["P1", "P2"])
+        self.assertEqual(self.table.origins, ["OASIS3", "ADNI"])
+        self.assertEqual(len(self.table.axes), 2)
+        self.assertEqual(len(self.table.rotations), 2)
+        np.testing.assert_array_equal(
+            self.table.has_features, [False, True, False, True]
+        )
+        np.testing.assert_array_equal(
+            self.table.exit_health_status, [2, 2, 2, -1]
+        )
+
+    def test_patient_bounds(self):
+        codes, starts = self.table.getPatientBounds()
+        np.testing.assert_array_equal(codes, [0, 1])
+        np.testing.assert_array_equal(starts, [0, 3, 4])
+
+    def test_select(self):
+        table = self.table.select(self.table.health_status == 0)
+        self.assertEqual(
+            table.fullpaths, ["/a/10.nii", "/a/11.nii", "/b/5.nii"]
+        )
+        codes, starts = table.getPatientBounds()
+        np.testing.assert_array_equal(starts, [0, 2, 3])
+        empty = table.select(np.zeros(len(table), dtype=bool))
+        codes, starts = empty.getPatientBounds()
+        self.assertEqual(len(codes), 0)
+
+    def test_make_scan(self):
+        row = self.table.findRow(11)
+        self.assertEqual(row, 1)
+        scan = self.table.makeScan(row)
+        self.assertEqual(scan.getScanID(), 11)
+        self.assertEqual(scan.getPatientID(), "P1")
+        self.assertEqual(scan.getSliceDistances(), [0.2, 0.3, 0.2])
+        self.assertEqual(scan.getValidationStatus(), 1)
+        self.assertTrue(scan.hasVGGFeatures())
+        self.assertEqual(scan.getRenderState(), nifti_mri.Scan(*(
+            ("/a/11.nii",) + _ROWS[1][:1] + _ROWS[1][2:12])).getRenderState())
+
+        scan = self.table.makeScan(self.table.findRow(12))
+        self.assertEqual(scan.getSliceDistances(), [None, None, None])
+        self.assertFalse(scan.hasVGGFeatures())
+        self.assertIsNone(self.table.findRow(99))
+
+    def test_rows_not_grouped_by_patient(self):
+        with self.assertRaises(ValueError):
+            nifti_mri._ScanTable.fromRows([_ROWS[0], _ROWS[3], _ROWS[1]])
+
+
+class SelectAllQueryTest(unittest.TestCase):
+    def test_no_filters(self):
+        sql, params = nifti_mri._makeSelectAllQuery()
+        self.assertEqual(params, [])
+        self.assertNotIn("%s", sql)
+
+    def test_filters(self):
+        sql, params = nifti_mri._makeSelectAllQuery(
+            show_labels="HH-HD", show_only_healthy=True, show_status=2
+        )
+        self.assertEqual(params, [2, ["HH", "HD"]])
+        self.assertIn("s.validation_status = %s", sql)
+        self.assertIn("s.health_status = 0", sql)
+        self.assertIn("label = any(%s)", sql)
+
+
+class ScanTableSnapshotTest(unittest.TestCase):
+    def setUp(self):
+        self.table = nifti_mri._ScanTable.fromRows(_ROWS)
+
+    def test_arrays_round_trip(self):
+        table = nifti_mri._ScanTable.fromArrays(self.table.toArrays())
+        self.assertEqual(list(table.rows()), list(self.table.rows()))
+        self.assertEqual(list(table.rows()), _ROWS)
+
+    def test_merge(self):
+        changed = [
+            (12,) + _ROWS[2][1:12] + (True, 2),
+            (3, "/b/3.nii", 10, "P2", "ADNI", 0, _AXIS, _ROTATION,
+             0.2, 0.2, 0.2, 0, False, None),
+        ]
+        table = self.table.merge(changed)
+        self.assertEqual(list(table.scan_ids), [10, 11, 12, 3, 5])
+        self.assertTrue(table.has_features[2])
+        codes, starts = table.getPatientBounds()
+        np.testing.assert_array_equal(starts, [0, 3, 5])
+        self.assertEqual(table.makeScan(3).getFilePath(), "/b/3.nii")
+
+    def test_merge_new_patient_and_values(self):
+        changed = [
+            (7, "/c/7.nii", 5, "P0", "OASIS2", 1, {'0': 1, '1': 0, '2': 2},
+             [0, 0, 2], 0.2, 0.2, 0.2, 2, False, 1),
+        ]
+        table = self.table.merge(changed)
+        # Sorted by patient id as a fresh load.
+        self.assertEqual(list(table.scan_ids), [7, 10, 11, 12, 5])
+        self.assertEqual(list(table.rows()), changed + _ROWS)
+
+    def test_merge_matches_from_rows(self):
+        new_patient = (8, "/c/8.nii", 0, "P3", "ADNI", 0, _AXIS, _ROTATION,
+                       0.2, 0.2, 0.2, 2, False, 0)
+        changed = [
+            new_patient,
+            (7, "/c/7.nii", 5, "P0", "OASIS2", 1, _AXIS, _ROTATION,
+             0.2, 0.2, 0.2, 2, False, 1),
+            (11,) + _ROWS[1][1:2] + (900,) + _ROWS[1][3:],
+            (4, "/b/4.nii", 30, "P2", "ADNI", 0, _AXIS, _ROTATION,
+             0.1, 0.2, 0.3, 2, True, None),
+        ]
+        table = self.table
+        for rows in (changed[:2], changed[2:]):
+            table = table.merge(rows)
+
+        all_rows = {row[0]: row for row in _ROWS}
+        all_rows.update((row[0], row) for row in changed)
+        expected = nifti_mri._ScanTable.fromRows(sorted(
+            all_rows.values(), key=lambda row: (row[3], row[2], row[0])
+        ))
+        self.assertEqual(list(table.rows()), list(expected.rows()))
+        np.testing.assert_array_equal(
+            table.getPatientBounds()[1], expected.getPatientBounds()[1]
+        )
+        # Patients come in the same order as in a fresh load.
+        self.assertEqual(
+            [table.patient_ids[c] for c in table.getPatientBounds()[0]],
+            ["P0", "P1", "P2", "P3"]
+        )
+
+    def test_filter(self):
+        self.assertEqual(len(self.table.filter()), 4)
+        table = self.table.filter(show_status=1)
+        self.assertEqual(list(table.scan_ids), [10, 11])
+        table = self.table.filter(show_labels="H?")
+        self.assertEqual(list(table.scan_ids), [5])
+        table = self.table.filter(show_labels="HD", show_only_healthy=True)
+        self.assertEqual(list(table.scan_ids), [10, 11])
+        self.assertEqual(len(self.table.filter(show_labels="DD")), 0)
+
+
+class _FakeDb:
+    """Answers the queries of the snapshot loader from a list of rows."""
+
+    def __init__(self, rows):
+        self.rows = list(rows)
+        self.changed_rows = []
+        self.watermark = datetime.datetime(
+            2024, 1, 1, tzinfo=datetime.timezone.utc
+        )
+        self.full_loads = 0
+
+    def getConnectionString(self):
+        return "dbname=fake"
+
+    def execute_query(self, sql, params=None):
+        assert sql == nifti_mri._SQL_SELECT_SNAPSHOT_STATE
+        scan_ids = [row[0] for row in self.rows]
+        features = sum(1 for row in self.rows if row[12])
+        yield (self.watermark, features, features, features,
+               nifti_mri._hashScanIds(np.array(scan_ids)))
+
+    def execute_streaming_query(self, sql, params=None):
+        if sql == nifti_mri._SQL_SELECT_SCAN_IDS:
+            return iter([(row[0],) for row in self.rows])
+        if "updated_at >" in sql:
+            return iter(self.changed_rows)
+        self.full_loads += 1
+        return iter(sorted(self.rows, key=lambda r: (r[3], r[2], r[0])))
+
+    def change(self, deleted=(), changed_rows=()):
+        self.rows = [row for row in self.rows if row[0] not in deleted]
+        self.rows += list(changed_rows)
+        self.changed_rows = list(changed_rows)
+        self.watermark += datetime.timedelta(hours=1)
+
+
+class SnapshotLoadTest(unittest.TestCase):
+    def setUp(self):
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        collection_snapshot.setSnapshotDir(self._tmp_dir.name)
+        self.db = _FakeDb(_ROWS)
+        nifti_mri._loadSnapshotTable(self.db)
+        self.assertEqual(self.db.full_loads, 1)
+
+    def tearDown(self):
+        collection_snapshot.setSnapshotDir(None)
+        self._tmp_dir.cleanup()
+
+    def test_unchanged(self):
+        table = nifti_mri._loadSnapshotTable(self.db)
+        self.assertEqual(list(table.rows()), _ROWS)
+        self.assertEqual(self.db.full_loads, 1)
+
+    def test_delete_and_insert(self):
+        # The count of the scans stays the same.
+        new_row = (3, "/b/3.nii", 10, "P2", "ADNI", 0, _AXIS, _ROTATION,
+                   0.2, 0.2, 0.2, 0, False, None)
+        self.db.change(deleted=(12,), changed_rows=[new_row])
+        table = nifti_mri._loadSnapshotTable(self.db)
+        self.assertEqual(list(table.scan_ids), [10, 11, 3, 5])
+        self.assertEqual(self.db.full_loads, 1)
+
+        # The refreshed snapshot was saved.
+        self.db.changed_rows = []
+        table = nifti_mri._loadSnapshotTable(self.db)
+        self.assertEqual(list(table.scan_ids), [10, 11, 3, 5])
+        self.assertEqual(self.db.full_loads, 1)
+
+    def test_missing_scans_reload(self):
+        # A scan the refresh did not return forces a full reload.
+        self.db.change(changed_rows=[])
+        self.db.rows.append(
+            (3, "/b/3.nii", 10, "P2", "ADNI", 0, _AXIS, _ROTATION,
+             0.2, 0.2, 0.2, 0, False, None)
+        )
+        table = nifti_mri._loadSnapshotTable(self.db)
+        self.assertEqual(self.db.full_loads, 2)
+        self.assertEqual(len(table), 5)
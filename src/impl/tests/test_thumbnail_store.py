@@ -0,0 +1,65 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+import cogni_scan.src.nifti_mri as nifti_mri
+import cogni_scan.src.thumbnail_store as thumbnail_store
+
+_CURRENT_DIR = os.path.dirname(os.path.realpath(__file__))
+_DUMMY_MRI = os.path.join(_CURRENT_DIR, "testing_data", "mri-2.nii.gz")
+
+
+class _ReorientedScan(nifti_mri.Scan):
+    """A scan whose orientation changes (and is saved) while rendering."""
+
+    __slots__ = ()
+
+    def renderStandardSlices(self, bounding_square=200):
+        images = super().renderStandardSlices(bounding_square)
+        self.changeOrienation(0)
+        return images
+
+    def isDirty(self):
+        return False
+
+
+class ThumbnailStoreTest(unittest.TestCase):
+    def setUp(self):
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        thumbnail_store.setStoreDir(self._tmp_dir.name)
+
+    def tearDown(self):
+        thumbnail_store.setStoreDir(None)
+        self._tmp_dir.cleanup()
+
+    def test_read_through(self):
+        scan = nifti_mri.Scan(_DUMMY_MRI, scan_id=1)
+        self.assertIsNone(thumbnail_store.load(scan, 200))
+        images = thumbnail_store.getStandardSlices(scan, 200)
+        self.assertEqual(images.shape, (9, 200, 200))
+        self.assertEqual(images.dtype, np.uint8)
+        self.assertTrue(thumbnail_store.hasThumbnails(scan))
+        np.testing.assert_array_equal(thumbnail_store.load(scan, 200), images)
+        self.assertEqual(thumbnail_store.load(scan, 250).shape, (9, 250, 250))
+
+    def test_orientation_changes_the_key(self):
+        scan = nifti_mri.Scan(_DUMMY_MRI, scan_id=1)
+        thumbnail_store.getStandardSlices(scan, 100)
+        scan.setSliceDistance(0, 0.3)
+        self.assertFalse(thumbnail_store.hasThumbnails(scan))
+
+    def test_invalidate(self):
+        scan = nifti_mri.Scan(_DUMMY_MRI, scan_id=1)
+        thumbnail_store.getStandardSlices(scan, 100)
+        thumbnail_store.invalidate(1)
+        self.assertFalse(thumbnail_store.hasThumbnails(scan))
+
+    def test_orientation_changed_while_rendering(self):
+        scan = _ReorientedScan(_DUMMY_MRI, scan_id=1)
+        thumbnail_store.getStandardSlices(scan, 100)
+        # Neither the new state nor the original one has thumbnails.
+        self.assertFalse(thumbnail_store.hasThumbnails(scan))
+        original = nifti_mri.Scan(_DUMMY_MRI, scan_id=1)
+        self.assertFalse(thumbnail_store.hasThumbnails(original))
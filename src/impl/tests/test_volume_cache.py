@@ -0,0 +1,54 @@
+import unittest
+
+import cogni_scan.src.volume_cache as volume_cache
+
+
+class _FakeVolume:
+    def __init__(self, filepath):
+        self.filepath = filepath
+        self.nbytes = 100
+
+
+class VolumeCacheTest(unittest.TestCase):
+    def test_hits_and_misses(self):
+        cache = volume_cache.VolumeCache(loader=_FakeVolume)
+        v1 = cache.get("a")
+        self.assertIs(cache.get("a"), v1)
+        stats = cache.getStats()
+        self.assertEqual(stats["hits"], 1)
+        self.assertEqual(stats["misses"], 1)
+        self.assertEqual(stats["bytes"], 100)
+
+    def test_least_recently_used_is_evicted(self):
+        cache = volume_cache.VolumeCache(max_bytes=250, loader=_FakeVolume)
+        a = cache.get("a")
+        cache.get("b")
+        self.assertIs(cache.get("a"), a)
+        cache.get("c")
+        stats = cache.getStats()
+        self.assertEqual(stats["volumes"], 2)
+        self.assertEqual(stats["bytes"], 200)
+        self.assertEqual(stats["evictions"], 1)
+        self.assertIs(cache.get("a"), a)
+        self.assertEqual(cache.getStats()["misses"], 3)
+
+    def test_max_entries(self):
+        cache = volume_cache.VolumeCache(max_entries=2, loader=_FakeVolume)
+        for filepath in ["a", "b", "c"]:
+            cache.get(filepath)
+        self.assertEqual(cache.getStats()["volumes"], 2)
+
+    def test_discard(self):
+        cache = volume_cache.VolumeCache(loader=_FakeVolume)
+        a = cache.get("a")
+        cache.discard("a")
+        cache.discard("junk")
+        self.assertEqual(cache.getStats()["bytes"], 0)
+        self.assertIsNot(cache.get("a"), a)
+
+    def test_shrinking_the_budget(self):
+        cache = volume_cache.VolumeCache(loader=_FakeVolume)
+        for filepath in ["a", "b", "c"]:
+            cache.get(filepath)
+        cache.setMaxBytes(150)
+        self.assertEqual(cache.getStats()["volumes"], 1)
@@ -6,6 +6,8 @@ import random
 import numpy as np
 
 import cogni_scan.src.dbutil as dbutil
+import cogni_scan.src.feature_codec as feature_codec
+import cogni_scan.src.modeler.impl.feature_cache as feature_cache
 import cogni_scan.src.modeler.interfaces as interfaces
 
 _VALID_SLICES = ["01", "02", "03", "11", "12", "13", "21", "22", "23"]
@@ -16,6 +18,14 @@ Select
 from datasets 
 """
 
+_SQL_SELECT_FEATURES_FOR_SCANS = """
+select scan_id, {columns} from scan_features where scan_id = ANY(%s)
+""".format
+
+# Each row holds up to 18KB of features (9 slices of 512 float32 values) so
+# they are streamed in smaller batches than the default.
+_FEATURES_ITERSIZE = 500
+
 _SQL_LOAD_DATASET_BY_NAME = """
 Select 
     dataset_id, training_scan_ids, validation_scan_ids, testing_scan_ids 
@@ -56,11 +66,90 @@ def _getFeaturesForScan(scan_id, slices, db):
           f" from scan_features where scan_id={scan_id}"
     features = []
     for row in db.execute_query(sql):
-        for i in range(n):
-            features.extend(row[i][0])
+        features = [feature_codec.decode(row[i]) for i in range(n)]
     if not features:
         raise ValueError(f"Could not find features for {scan_id}.")
-    return features
+    return np.concatenate(features)
+
+
+def getFeaturesForScans(scan_ids, slices, db=None):
+    """Returns the features for many scans as a single matrix.
+
+    All the features are loaded using a single query.
+
+    :param scan_ids: The scan ids to load; the rows of the returned matrix
+    follow their order.
+    :param slices: The slices to use (see getFeatures).
+
+    :return: A float32 numpy array shaped as (len(scan_ids), len(slices) * 512).
+
+    :raises ValueError: If a slice is invalid or a scan has no features.
+    """
+    if db is None:
+        with dbutil.SimpleSQL() as db:
+            return _getFeaturesForScans(scan_ids, slices, db)
+    else:
+        return _getFeaturesForScans(scan_ids, slices, db)
+
+
+def _getFeaturesForScans(scan_ids, slices, db):
+    """Returns the features for many scans as a single matrix."""
+    slices = sorted(slices)
+    n = len(slices)
+    assert n > 0
+    for slice in slices:
+        _validateSlice(slice)
+    width = feature_codec.FEATURES_PER_SLICE
+
+    # A scan can appear more than once so map it to all its rows.
+    rows_by_scan_id = {}
+    for index, scan_id in enumerate(scan_ids):
+        rows_by_scan_id.setdefault(scan_id, []).append(index)
+
+    matrix = np.empty((len(scan_ids), n * width), dtype=np.float32)
+    sql = _SQL_SELECT_FEATURES_FOR_SCANS(
+        columns=','.join(f"features_slice{slice}" for slice in slices)
+    )
+    found = set()
+    rows = db.execute_streaming_query(
+        sql, (list(rows_by_scan_id),), itersize=_FEATURES_ITERSIZE
+    )
+    for row in rows:
+        scan_id = row[0]
+        for index in rows_by_scan_id[scan_id]:
+            for i in range(n):
+                matrix[index, i * width:(i + 1) * width] = \
+                    feature_codec.decode(row[i + 1])
+        found.add(scan_id)
+
+    missing = rows_by_scan_id.keys() - found
+    if missing:
+        raise ValueError(f"Could not find features for {sorted(missing)}.")
+    return matrix
+
+
+def selectSlices(features, slices):
+    """Returns the features of a dataset for a subset of its slices.
+
+    :param features: The dict returned by getFeatures for all the nine
+    slices (feature_cache.ALL_SLICES).
+    :param slices: The slices to keep.
+
+    :return: A dict with the same structure as the one returned by getFeatures
+    for the passed in slices; the X values are column views (or copies when
+    the slices are not contiguous) of the passed in X values.
+    """
+    for slice in slices:
+        _validateSlice(slice)
+    columns = feature_cache.getColumns(slices)
+    selected = {}
+    for key, value in features.items():
+        if key.startswith("X_"):
+            selected[key] = value[:, columns]
+        else:
+            # The scans are updated with predictions while training.
+            selected[key] = copy.deepcopy(value)
+    return selected
 
 
 def getDatasets():
@@ -154,26 +243,24 @@ class _Dataset(interfaces.IDataset):
 
             assert is_valid
 
-            X_train = [getFeaturesForScan(d['scan_id'], slices, db) for d
-                       in
-                       train]
-            X_train = np.array(X_train)
-            Y_train = [[0] if d['label'] == 'HH' else [1] for d in train]
-            Y_train = np.array(Y_train)
-            train_scans =  copy.deepcopy(train)
-
-            X_val = [getFeaturesForScan(d['scan_id'], slices, db) for d in
-                     val]
-            X_val = np.array(X_val)
-            Y_val = [[0] if d['label'] == 'HH' else [1] for d in val]
-            Y_val = np.array(Y_val)
+            # Load the features of all the scans from the local cache.
+            scans = train + val + test
+            for slice in slices:
+                _validateSlice(slice)
+            X = feature_cache.getFeaturesForScans(
+                self.__dataset_id, [d['scan_id'] for d in scans], slices, db,
+                getFeaturesForScans
+            )
+            Y = np.array([[0] if d['label'] == 'HH' else [1] for d in scans])
+            i, j = len(train), len(train) + len(val)
+
+            X_train, Y_train = X[:i], Y[:i]
+            train_scans = copy.deepcopy(train)
+
+            X_val, Y_val = X[i:j], Y[i:j]
             val_scans = copy.deepcopy(val)
 
-            X_test = [getFeaturesForScan(d['scan_id'], slices, db) for d in
-                      test]
-            X_test = np.array(X_test)
-            Y_test = [[0] if d['label'] == 'HH' else [1] for d in test]
-            Y_test = np.array(Y_test)
+            X_test, Y_test = X[j:], Y[j:]
             test_scans = copy.deepcopy(test)
 
             return {
@@ -0,0 +1,173 @@
+"""Keeps a local, memory mapped copy of the features of each dataset.
+
+The first time the features of a dataset are requested, the features of all
+its scans for all the nine slices are downloaded and saved as a float32 .npy
+file (along with the scan ids that correspond to its rows) under:
+
+    ~/.cogni_scan/cache/<dataset_id>/
+
+Later requests (for any subset of the slices) memory map this file instead
+of querying the database.
+
+The cache of a dataset is rebuilt when the scan_features rows of its scans
+change; this is detected by comparing the count, the max and the sum of their
+feature ids and their latest updated_at (maintained by a trigger so in place
+updates are detected as well) with the values stored when the cache was
+built.
+"""
+
+import json
+import os
+import pathlib
+
+import numpy as np
+import psycopg2.errors
+
+import cogni_scan.src.feature_codec as feature_codec
+
+# The slices in the order of the columns of the cached matrix.
+ALL_SLICES = ["01", "02", "03", "11", "12", "13", "21", "22", "23"]
+
+_FEATURES_FILE = "features.npy"
+_SCAN_IDS_FILE = "scan_ids.npy"
+_VERSION_FILE = "version.json"
+
+_SQL_SELECT_VERSION = """
+select
+    count(*), coalesce(max(feature_id), 0), coalesce(sum(feature_id), 0),
+    coalesce(max(updated_at)::text, '')
+from scan_features where scan_id = ANY(%s)
+"""
+
+# Used when scan_features has no updated_at (db/add_scan_updated_at.sql was
+# not applied); in place updates of the features are not detected then.
+_SQL_SELECT_VERSION_WITHOUT_UPDATED_AT = """
+select
+    count(*), coalesce(max(feature_id), 0), coalesce(sum(feature_id), 0), ''
+from scan_features where scan_id = ANY(%s)
+"""
+
+_cache_dir = None
+
+
+def getCacheDir():
+    """Returns the directory where the cached features are stored."""
+    if _cache_dir:
+        return _cache_dir
+    home_dir = pathlib.Path.home()
+    return os.path.join(home_dir, '.cogni_scan', 'cache')
+
+
+def setCacheDir(dir_path):
+    """Sets the directory where the cached features are stored."""
+    global _cache_dir
+    _cache_dir = dir_path
+
+
+def getFeaturesForScans(dataset_id, scan_ids, slices, db, loader):
+    """Returns the features for the passed in scans of a dataset.
+
+    :param dataset_id: The dataset the scans belong to.
+    :param scan_ids: The scan ids to return; the rows of the returned matrix
+    follow their order.
+    :param slices: The (already validated) slices to return.
+    :param db: The SimpleSQL instance to use.
+    :param loader: Used to (re)build the cache; called as
+    loader(scan_ids, slices, db) and returns a float32 matrix (like the
+    dataset_impl.getFeaturesForScans).
+
+    :return: A float32 numpy array shaped as (len(scan_ids), len(slices) * 512).
+
+    :raises ValueError: If a scan is not part of the cached dataset.
+    """
+    all_scan_ids = sorted(set(scan_ids))
+    features, cached_scan_ids = _loadOrBuild(
+        str(dataset_id), all_scan_ids, db, loader
+    )
+
+    positions = np.searchsorted(cached_scan_ids, scan_ids)
+    positions = np.minimum(positions, len(cached_scan_ids) - 1)
+    if len(scan_ids) and \
+            not np.array_equal(cached_scan_ids[positions], scan_ids):
+        raise ValueError(f"Scans not cached for dataset {dataset_id}.")
+
+    columns = getColumns(slices)
+    if isinstance(columns, slice):
+        return features[:, columns][positions]
+    return features[np.ix_(positions, columns)]
+
+
+def getColumns(slices):
+    """Returns the columns of the passed in slices in a nine slices matrix.
+
+    The returned value can be used to index the columns of a matrix holding
+    the features of all the slices (ordered as ALL_SLICES); for contiguous
+    slices it is a python slice (so indexing returns a view) otherwise it is
+    an array of column indexes.
+    """
+    width = feature_codec.FEATURES_PER_SLICE
+    indexes = sorted(ALL_SLICES.index(s) for s in slices)
+    if indexes == list(range(indexes[0], indexes[-1] + 1)):
+        # Contiguous slices map to a view of the columns.
+        return slice(indexes[0] * width, (indexes[-1] + 1) * width)
+    return np.concatenate(
+        [np.arange(i * width, (i + 1) * width) for i in indexes]
+    )
+
+
+def _getVersion(scan_ids, db):
+    """Returns the current version of the features of the passed in scans."""
+    try:
+        rows = list(db.execute_query(_SQL_SELECT_VERSION, (list(scan_ids),)))
+    except psycopg2.errors.UndefinedColumn as ex:
+        print(f"Not detecting updated features (run "
+              f"db/add_scan_updated_at.sql): {ex}")
+        rows = db.execute_query(
+            _SQL_SELECT_VERSION_WITHOUT_UPDATED_AT, (list(scan_ids),)
+        )
+    for row in rows:
+        count, max_feature_id, sum_feature_ids, updated_at = row
+        return [
+            int(count), int(max_feature_id), int(sum_feature_ids), updated_at
+        ]
+
+
+def _loadOrBuild(dataset_id, scan_ids, db, loader):
+    """Returns the (memory mapped) features and scan ids of the dataset."""
+    dir_path = os.path.join(getCacheDir(), dataset_id)
+    version_path = os.path.join(dir_path, _VERSION_FILE)
+    features_path = os.path.join(dir_path, _FEATURES_FILE)
+    scan_ids_path = os.path.join(dir_path, _SCAN_IDS_FILE)
+
+    version = _getVersion(scan_ids, db)
+    if os.path.isfile(version_path):
+        with open(version_path) as fin:
+            cached_version = json.load(fin)
+        if cached_version == version:
+            cached_scan_ids = np.load(scan_ids_path)
+            if np.array_equal(cached_scan_ids, scan_ids):
+                return np.load(features_path, mmap_mode='r'), cached_scan_ids
+
+    print(f"Building the features cache for dataset {dataset_id}.")
+    features = loader(scan_ids, ALL_SLICES, db)
+    os.makedirs(dir_path, exist_ok=True)
+    # The version file is written last so a partially written cache is never
+    # considered valid.
+    if os.path.isfile(version_path):
+        os.remove(version_path)
+    # Replace (instead of overwriting) the files since they might still be
+    # memory mapped by previously returned arrays.
+    _saveArray(features_path, features)
+    _saveArray(scan_ids_path, np.array(scan_ids, dtype=np.int64))
+    with open(version_path + ".tmp", "w") as fout:
+        json.dump(version, fout)
+    os.replace(version_path + ".tmp", version_path)
+    return np.load(features_path, mmap_mode='r'), np.load(scan_ids_path)
+
+
+def _saveArray(path, array):
+    """Saves the array to the path replacing any existing file."""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as fout:
+        np.save(fout, array)
+    os.replace(tmp_path, path)
@@ -6,14 +6,7 @@ import os
 import pathlib
 import uuid
 
-from sklearn.metrics import accuracy_score
-from sklearn.metrics import confusion_matrix
-from sklearn.metrics import f1_score
-from sklearn.metrics import roc_auc_score
-from sklearn.metrics import roc_curve
 import numpy as np
-import tensorflow as tf
-from tensorflow.keras.callbacks import EarlyStopping, ReduceLROnPlateau
 
 import cogni_scan.src.dbutil as dbutil
 import cogni_scan.src.utils as utils
@@ -53,6 +46,68 @@ def getModelByID(model_id):
     raise ValueError(f"Could not find model: {model_id}")
 
 
+def getModelsByIDs(model_ids):
+    """Returns the models for the passed in model ids (in the same order)."""
+    model_ids = [str(model_id) for model_id in model_ids]
+    with dbutil.SimpleSQL() as db:
+        sql = "select model_id, dataset_id, slices, descriptive_data " \
+              "from models where model_id = any(%s::uuid[])"
+        models = {
+            str(row[0]): _Model(*row)
+            for row in db.execute_query(sql, (model_ids,))
+        }
+    for model_id in model_ids:
+        if model_id not in models:
+            raise ValueError(f"Could not find model: {model_id}")
+    return [models[model_id] for model_id in model_ids]
+
+
+def trainPowerModels(dataset, slice_sets, max_epochs=120):
+    """Trains and saves one model for each of the passed in slice sets.
+
+    The features of the dataset are loaded once (for all the nine slices)
+    and each model is trained on the columns of its own slices.
+
+    :param dataset: The IDataset to use.
+    :param slice_sets: A list of slice lists (like [["01"], ["01", "12"]]).
+
+    :return: The list of the trained models.
+
+    raises: ValueError
+    """
+    if not isinstance(dataset, interfaces.IDataset):
+        raise ValueError
+    for slices in slice_sets:
+        _validateSlices(slices)
+
+    features = dataset.getFeatures(_VALID_SLICES)
+    models = []
+    for slices in slice_sets:
+        m = _Model()
+        m._trainAndSaveFromFeatures(
+            dataset.getDatasetID(),
+            slices,
+            dataset_impl.selectSlices(features, slices),
+            max_epochs
+        )
+        m.unloadWeights()
+        models.append(m)
+    return models
+
+
+def _validateSlices(slices):
+    """Validates the slices to use for a model.
+
+    raises: ValueError
+    """
+    if not isinstance(slices, list):
+        raise ValueError(f"Slices must be a list.")
+
+    for slice in slices:
+        if slice not in _VALID_SLICES:
+            raise ValueError(f"Slice: {slice} is not supported.")
+
+
 class _Model(interfaces.IModel):
     """Used to train, save and retrieve a NN model."""
 
@@ -255,18 +310,22 @@ class _Model(interfaces.IModel):
         self._clear()
         if not isinstance(dataset, interfaces.IDataset):
             raise ValueError
+        _validateSlices(slices)
+        features = dataset.getFeatures(slices)
+        self._trainAndSaveFromFeatures(
+            dataset.getDatasetID(), slices, features, max_epochs
+        )
 
-        if not isinstance(slices, list):
-            raise ValueError(f"Slices must be a list.")
-
-        for slice in slices:
-            if slice not in _VALID_SLICES:
-                raise ValueError(f"Slice: {slice} is not supported.")
+    def _trainAndSaveFromFeatures(self, dataset_id, slices, features,
+                                  max_epochs=120):
+        """Trains and save the model using already loaded features.
 
+        :param features: The dict returned by the getFeatures of the dataset
+        for the passed in slices.
+        """
+        self._clear()
         self._slices = slices
 
-        features = dataset.getFeatures(self._slices)
-
         X_train = features["X_train"]
         Y_train = features["Y_train"]
 
@@ -277,6 +336,16 @@ class _Model(interfaces.IModel):
         Y_test = features["Y_test"]
         test_scans = features["test_scans"]
 
+        # Imported here so using the models' metadata does not load
+        # tensorflow (or sklearn).
+        import tensorflow as tf
+        from tensorflow.keras.callbacks import EarlyStopping, ReduceLROnPlateau
+        from sklearn.metrics import accuracy_score
+        from sklearn.metrics import confusion_matrix
+        from sklearn.metrics import f1_score
+        from sklearn.metrics import roc_auc_score
+        from sklearn.metrics import roc_curve
+
         input_size = len(self._slices) * 512
         size_1 = input_size * 2
         hidden_size_2 = int(input_size / 2)
@@ -316,7 +385,7 @@ class _Model(interfaces.IModel):
             # callbacks=[early_stoppping,reduce_lr_on_plateau],
             verbose=2
         )
-        self._dataset_id = dataset.getDatasetID()
+        self._dataset_id = dataset_id
 
         self._training_history = history.history
 
@@ -395,6 +464,7 @@ class _Model(interfaces.IModel):
     def _loadWeightsIfNeeded(self):
         """Loads the model's weights from the corresponding file."""
         if not self._model:
+            import tensorflow as tf
             full_path = self.getStorageFullPath()
             self._model = tf.keras.models.load_model(full_path)
 
@@ -414,44 +484,44 @@ class _Model(interfaces.IModel):
         y_pred = self._model.predict(features)
         return y_pred[0][0]
 
-    def predictFromScan(self, scan):
-        """Predicts the label of the passed in scan object."""
-        assert isinstance(scan, nifti_mri.Scan)
+    def predictFromFeatures(self, features):
+        """Predicts the label from the VGG16 features of the scan's slices.
+
+        :param features: A dict mapping slices (like '01') to their 512 VGG16
+        features; must contain (at least) the slices of the model.
+        """
         self._loadWeightsIfNeeded()
         assert self._model
         slices = sorted(self.getSlices())
-        distances = scan.getSliceDistances()
-        features = None
-
-        for slice_desc in slices:
-            # slice_desc can be something like '01', '22' etc.
-            image_axis = int(slice_desc[0])
-            slice_index = int(slice_desc[1])
-            abs_distance = float(distances[image_axis])
-
-            # Based on the slice find the distance from the center slice
-            if slice_index == 1:
-                distance = -1 * abs_distance
-            elif slice_index == 2:
-                distance = 0
-            elif slice_index == 3:
-                distance = abs_distance
-            else:
-                assert 1 <= slice_index <= 3
-
-            # Accumulate VGG16 features.
-            if features is None:
-                features = scan.getVGG16Features(distance, image_axis)
-            else:
-                f1 = scan.getVGG16Features(distance, axis=image_axis)
-                features = np.concatenate((features, f1), axis=0)
-
-        features = features.flatten()
+        features = np.concatenate([features[s] for s in slices])
         features = np.array([features])
         y_pred = self._model.predict(features)
-        print(y_pred[0][0])
         return y_pred[0][0]
 
+    def predictFromScan(self, scan):
+        """Predicts the label of the passed in scan object."""
+        assert isinstance(scan, nifti_mri.Scan)
+        features = scan.getVGG16FeaturesForSlices(self.getSlices())
+        prediction = self.predictFromFeatures(features)
+        print(prediction)
+        return prediction
+
+
+def predictFromScanWithModels(scan, models):
+    """Predicts the label of the passed in scan object using many models.
+
+    The VGG16 features are calculated once for the union of the slices used
+    by the models and shared by all of them.
+
+    Returns the predictions in the order of the passed in models.
+    """
+    assert isinstance(scan, nifti_mri.Scan)
+    slices = set()
+    for m in models:
+        slices.update(m.getSlices())
+    features = scan.getVGG16FeaturesForSlices(sorted(slices))
+    return [m.predictFromFeatures(features) for m in models]
+
 
 def getAllModelsAsJson():
     """Returns all models as JSON (Used from Sibyl UI)."""
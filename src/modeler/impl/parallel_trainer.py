@@ -0,0 +1,114 @@
+"""Trains many slice combination models in parallel.
+
+The models are spread across a pool of processes; each process limits the
+number of threads tensorflow uses (intra and inter op) so the workers do not
+oversubscribe the cpus.
+
+The features of the dataset are written to the local features cache by the
+parent process before the pool starts, so each worker simply memory maps
+them and loads them only once no matter how many models it trains.
+"""
+
+import concurrent.futures
+import multiprocessing
+import os
+
+import cogni_scan.src.dbutil as dbutil
+import cogni_scan.src.modeler.impl.dataset_impl as dataset_impl
+import cogni_scan.src.modeler.impl.feature_cache as feature_cache
+import cogni_scan.src.modeler.impl.model_impl as model_impl
+import cogni_scan.src.modeler.interfaces as interfaces
+
+# The features of the dataset used by a worker process (nine slices).
+_worker_features = {}
+
+
+def _initWorker(intra_op_threads, inter_op_threads, storage_dir, cache_dir,
+                database_name):
+    """Initializes a worker process.
+
+    The spawned workers do not inherit the settings of the parent so its
+    directories and database are passed in.
+    """
+    import tensorflow as tf
+    tf.config.threading.set_intra_op_parallelism_threads(intra_op_threads)
+    tf.config.threading.set_inter_op_parallelism_threads(inter_op_threads)
+    model_impl._Model.setStorageDir(storage_dir)
+    feature_cache.setCacheDir(cache_dir)
+    dbutil.SimpleSQL.setDatabaseName(database_name)
+
+
+def _trainModel(dataset_id, slices, max_epochs):
+    """Trains and saves a model (runs in a worker process).
+
+    Returns the id of the new model.
+    """
+    if dataset_id not in _worker_features:
+        dataset = dataset_impl.getDatasetByID(dataset_id)
+        _worker_features[dataset_id] = dataset.getFeatures(
+            feature_cache.ALL_SLICES
+        )
+    features = dataset_impl.selectSlices(_worker_features[dataset_id], slices)
+    m = model_impl._Model()
+    m._trainAndSaveFromFeatures(dataset_id, slices, features, max_epochs)
+    return m.getModelID()
+
+
+def trainModels(dataset, slice_sets, max_epochs=120, workers=None,
+                intra_op_threads=None, inter_op_threads=1):
+    """Trains and saves one model per slice set using a process pool.
+
+    :param dataset: The IDataset to use.
+    :param slice_sets: A list of slice lists (like [["01"], ["01", "12"]]).
+    :param int workers: The number of processes (defaults to the cpu count).
+    :param int intra_op_threads: The tensorflow intra op threads of each
+    worker (defaults to cpu count / workers).
+    :param int inter_op_threads: The tensorflow inter op threads of each
+    worker.
+
+    :return: The list of the model ids that were trained (in the order of
+    slice_sets); the slice sets that failed are reported and skipped.
+
+    raises: ValueError if the dataset or any of the slices are invalid.
+    """
+    if not isinstance(dataset, interfaces.IDataset):
+        raise ValueError
+    for slices in slice_sets:
+        model_impl._validateSlices(slices)
+
+    cpu_count = os.cpu_count() or 1
+    workers = workers or cpu_count
+    intra_op_threads = intra_op_threads or max(1, cpu_count // workers)
+
+    # Build the features cache once before the workers need it.
+    dataset_id = str(dataset.getDatasetID())
+    dataset.getFeatures(feature_cache.ALL_SLICES)
+
+    # Spawn (instead of fork) since tensorflow is not fork safe.
+    context = multiprocessing.get_context("spawn")
+    initargs = (
+        intra_op_threads,
+        inter_op_threads,
+        model_impl._Model.getStorageDir(),
+        feature_cache.getCacheDir(),
+        dbutil.SimpleSQL.getDatabaseName(),
+    )
+    model_ids = {}
+    with concurrent.futures.ProcessPoolExecutor(
+            max_workers=workers, mp_context=context,
+            initializer=_initWorker, initargs=initargs) as pool:
+        futures = {
+            pool.submit(_trainModel, dataset_id, slices, max_epochs): slices
+            for slices in slice_sets
+        }
+        for index, future in enumerate(
+                concurrent.futures.as_completed(futures)):
+            slices = futures[future]
+            try:
+                model_ids[future] = future.result()
+            except Exception as ex:
+                print(f"Failed to train model for {slices}: {ex}")
+                continue
+            print(f"Trained {index + 1} of {len(futures)} models ({slices}).")
+    # The futures are in the order of the slice sets.
+    return [model_ids[f] for f in futures if f in model_ids]
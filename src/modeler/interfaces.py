@@ -141,6 +141,14 @@ class IModel(abc.ABC):
     def predictFromScan(self, scan):
         """Predicts the label of the passed in scan object."""
 
+    @abc.abstractmethod
+    def predictFromFeatures(self, features):
+        """Predicts the label from the VGG16 features of the scan's slices.
+
+        :param features: A dict mapping slices (like '01') to their VGG16
+        features.
+        """
+
     @abc.abstractmethod
     def unloadWeights(self):
         """Unloads the model weights to keep the memory lean."""
@@ -2,6 +2,7 @@
 
 import cogni_scan.src.modeler.impl.model_impl as model_impl
 import cogni_scan.src.modeler.impl.dataset_impl as dataset_impl
+import cogni_scan.src.modeler.impl.parallel_trainer as parallel_trainer
 
 
 def makeNewModel():
@@ -14,6 +15,29 @@ def makeNewModel():
     return model_impl.makeNewModel()
 
 
+def trainPowerModels(dataset, slice_sets, max_epochs=120, workers=1):
+    """Trains and saves one model for each of the passed in slice sets.
+
+    The features of the dataset are loaded only once and shared by all the
+    models, which makes it much faster than calling trainAndSave for each
+    slice set.
+
+    When workers is 1 the models are trained one after the other in the
+    calling process, otherwise they are spread across a pool of workers
+    processes (None uses one process per cpu).
+
+    returns a list of IModel instances.
+
+    raises: ValueError if the dataset or any of the slices are invalid.
+    """
+    if workers == 1:
+        return model_impl.trainPowerModels(dataset, slice_sets, max_epochs)
+    model_ids = parallel_trainer.trainModels(
+        dataset, slice_sets, max_epochs, workers
+    )
+    return model_impl.getModelsByIDs(model_ids)
+
+
 def getFeaturesForScan(scan_id, slices, db=None):
     """Returns the features for the given scan.
 
@@ -32,6 +56,29 @@ def getFeaturesForScan(scan_id, slices, db=None):
     return dataset_impl.getFeaturesForScan(scan_id, slices, db)
 
 
+def getFeaturesForScans(scan_ids, slices, db=None):
+    """Returns the features for many scans using a single query.
+
+    The returned value is a float32 numpy array shaped as
+    (len(scan_ids), len(slices) * 512) with its rows following the order of
+    the passed in scan ids.
+
+    Raises ValueError.
+    """
+    return dataset_impl.getFeaturesForScans(scan_ids, slices, db)
+
+
+def predictFromScanWithModels(scan, models):
+    """Predicts the label of the passed in scan using all the passed models.
+
+    The VGG16 features of each slice are calculated only once no matter how
+    many models use it.
+
+    Returns a list with the prediction of each model.
+    """
+    return model_impl.predictFromScanWithModels(scan, models)
+
+
 def getModels():
     """Returns a list of all the IModel instances from the database."""
     return model_impl.getModels()
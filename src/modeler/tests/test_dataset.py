@@ -85,3 +85,21 @@ def test_getting_features_for_invalid_scan():
     dbutil.SimpleSQL.setDatabaseName(_DBNAME)
     with pytest.raises(ValueError):
         model.getFeaturesForScan(9999999, ['01'])
+
+
+def test_get_features_for_scans():
+    dbutil.SimpleSQL.setDatabaseName(_DBNAME)
+    dataset_id = getExistingDatasetID()
+    ds = model.getDatasetByID(dataset_id)
+    features = ds.getFeatures(["01", "12"])
+    scan_ids = [d["scan_id"] for d in features["test_scans"]]
+    X = model.getFeaturesForScans(scan_ids, ["12", "01"])
+    assert X.shape == (len(scan_ids), 2 * 512)
+    for row, scan_id in zip(X, scan_ids):
+        assert (row == model.getFeaturesForScan(scan_id, ["01", "12"])).all()
+
+
+def test_getting_features_for_invalid_scans():
+    dbutil.SimpleSQL.setDatabaseName(_DBNAME)
+    with pytest.raises(ValueError):
+        model.getFeaturesForScans([9999999], ['01'])
@@ -0,0 +1,147 @@
+"""Tests the local features cache using a fake database."""
+import numpy as np
+import psycopg2.errors
+import pytest
+
+import cogni_scan.src.dbutil as dbutil
+import cogni_scan.src.feature_codec as feature_codec
+import cogni_scan.src.modeler.impl.feature_cache as feature_cache
+
+_DBNAME = 'dummyscans'
+_WIDTH = feature_codec.FEATURES_PER_SLICE
+
+
+class _FakeDb:
+    def __init__(self):
+        self.version = (3, 30, 60, "2024-01-01 00:00:00+00")
+
+    def execute_query(self, sql, params=None):
+        assert sql == feature_cache._SQL_SELECT_VERSION
+        yield self.version
+
+
+class _DbWithoutUpdatedAt:
+    """A database where scan_features has no updated_at column."""
+
+    def execute_query(self, sql, params=None):
+        if sql == feature_cache._SQL_SELECT_VERSION:
+            raise psycopg2.errors.UndefinedColumn(
+                'column "updated_at" does not exist'
+            )
+        assert sql == feature_cache._SQL_SELECT_VERSION_WITHOUT_UPDATED_AT
+        yield (3, 30, 60, "")
+
+
+class _Loader:
+    """Returns features where each value encodes its scan, slice and offset."""
+
+    def __init__(self):
+        self.calls = 0
+        self.offset = 0.
+
+    def __call__(self, scan_ids, slices, db):
+        self.calls += 1
+        assert slices == feature_cache.ALL_SLICES
+        columns = np.arange(len(slices) * _WIDTH, dtype=np.float32)
+        return np.array(
+            [scan_id * 10000 + columns + self.offset for scan_id in scan_ids],
+            dtype=np.float32
+        )
+
+
+def _expected(scan_ids, slices, offset=0.):
+    columns = np.concatenate([
+        np.arange(i * _WIDTH, (i + 1) * _WIDTH)
+        for i in sorted(feature_cache.ALL_SLICES.index(s) for s in slices)
+    ])
+    return np.array(
+        [scan_id * 10000 + columns + offset for scan_id in scan_ids],
+        dtype=np.float32
+    )
+
+
+@pytest.fixture
+def cache_dir(tmp_path):
+    feature_cache.setCacheDir(str(tmp_path))
+    yield tmp_path
+    feature_cache.setCacheDir(None)
+
+
+def test_get_columns():
+    assert feature_cache.getColumns(["11", "12"]) == slice(3 * _WIDTH,
+                                                           5 * _WIDTH)
+    columns = feature_cache.getColumns(["23", "01"])
+    np.testing.assert_array_equal(
+        columns,
+        np.concatenate([np.arange(_WIDTH), np.arange(8 * _WIDTH, 9 * _WIDTH)])
+    )
+
+
+def test_rows_follow_the_requested_order(cache_dir):
+    db, loader = _FakeDb(), _Loader()
+    scan_ids = [30, 10, 20, 10]
+    for slices in (["12"], ["01", "02", "03"], ["23", "01", "12"]):
+        features = feature_cache.getFeaturesForScans(
+            "d1", scan_ids, slices, db, loader
+        )
+        np.testing.assert_array_equal(features, _expected(scan_ids, slices))
+    # Built once for all the slices.
+    assert loader.calls == 1
+
+
+def test_cache_is_reused_until_the_version_changes(cache_dir):
+    db, loader = _FakeDb(), _Loader()
+    old = feature_cache.getFeaturesForScans("d1", [10, 20], ["01"], db, loader)
+    feature_cache.getFeaturesForScans("d1", [20, 10], ["12"], db, loader)
+    assert loader.calls == 1
+
+    # Features updated in place keep their ids; only updated_at changes.
+    db.version = db.version[:3] + ("2024-01-02 00:00:00+00",)
+    loader.offset = 0.5
+    new = feature_cache.getFeaturesForScans("d1", [10, 20], ["01"], db, loader)
+    assert loader.calls == 2
+    np.testing.assert_array_equal(
+        new, _expected([10, 20], ["01"], offset=0.5)
+    )
+    # The files were replaced so the previously returned arrays are intact.
+    np.testing.assert_array_equal(old, _expected([10, 20], ["01"]))
+
+
+def test_cache_is_rebuilt_for_other_scans(cache_dir):
+    db, loader = _FakeDb(), _Loader()
+    feature_cache.getFeaturesForScans("d1", [10, 20], ["01"], db, loader)
+    features = feature_cache.getFeaturesForScans(
+        "d1", [10, 40], ["01"], db, loader
+    )
+    assert loader.calls == 2
+    np.testing.assert_array_equal(features, _expected([10, 40], ["01"]))
+    assert not list(cache_dir.glob("d1/*.tmp"))
+
+
+def test_cache_without_updated_at(cache_dir):
+    db, loader = _DbWithoutUpdatedAt(), _Loader()
+    features = feature_cache.getFeaturesForScans(
+        "d1", [10, 20], ["01"], db, loader
+    )
+    np.testing.assert_array_equal(features, _expected([10, 20], ["01"]))
+    feature_cache.getFeaturesForScans("d1", [10, 20], ["01"], db, loader)
+    assert loader.calls == 1
+
+
+def test_version_without_updated_at():
+    """Runs the version query on a scan_features without updated_at."""
+    dbutil.SimpleSQL.setDatabaseName(_DBNAME)
+    with dbutil.SimpleSQL() as db:
+        # Hides the scan_features table of the database in this session.
+        db.execute_non_query(
+            "create temp table scan_features "
+            "(feature_id serial, scan_id int not null)"
+        )
+        try:
+            db.execute_non_query(
+                "insert into scan_features (scan_id) values (1), (2), (3)"
+            )
+            version = feature_cache._getVersion([1, 3, 4], db)
+        finally:
+            db.execute_non_query("drop table pg_temp.scan_features")
+    assert version == [2, 3, 4, ""]
@@ -6,6 +6,7 @@ import uuid
 import pytest
 
 import cogni_scan.src.dbutil as dbutil
+import cogni_scan.src.modeler.impl.model_impl as model_impl
 import cogni_scan.src.modeler.model as model
 import cogni_scan.src.nifti_mri as nifti_mri
 import cogni_scan.constants as constants
@@ -179,3 +180,41 @@ def test_predict_from_file():
     prediction = m.predictFromScan(scan)
     assert 0 <= prediction <= 1
     m.reset()
+
+
+def test_train_power_models():
+    dbutil.SimpleSQL.setDatabaseName(_DBNAME)
+    count_before = len(model.getModels())
+    ds = model.getDatasetByID(getExistingDatasetID())
+    model.makeNewModel().setStorageDir(_STORAGE_DIR)
+    slice_sets = [["01"], ["01", "22"], ["12", "13"]]
+    models = model.trainPowerModels(ds, slice_sets, max_epochs=1)
+    assert [m.getSlices() for m in models] == slice_sets
+    assert len(model.getModels()) - count_before == len(slice_sets)
+    for m in models:
+        assert checkModelFileExists(m)
+        m.reset()
+    assert len(model.getModels()) == count_before
+
+
+def test_get_models_by_ids():
+    dbutil.SimpleSQL.setDatabaseName(_DBNAME)
+    ds = model.getDatasetByID(getExistingDatasetID())
+    model.makeNewModel().setStorageDir(_STORAGE_DIR)
+    slice_sets = [["01"], ["12", "13"]]
+    trained = model.trainPowerModels(ds, slice_sets, max_epochs=1)
+    model_ids = [m.getModelID() for m in reversed(trained)]
+    models = model_impl.getModelsByIDs(model_ids)
+    assert [m.getModelID() for m in models] == model_ids
+    assert [m.getSlices() for m in models] == slice_sets[::-1]
+    with pytest.raises(ValueError):
+        model_impl.getModelsByIDs(model_ids + [str(uuid.uuid4())])
+    for m in trained:
+        m.reset()
+
+
+def test_train_power_models_with_invalid_slices():
+    dbutil.SimpleSQL.setDatabaseName(_DBNAME)
+    ds = model.getDatasetByID(getExistingDatasetID())
+    with pytest.raises(ValueError):
+        model.trainPowerModels(ds, [["01"], ["junk"]])
@@ -0,0 +1,109 @@
+"""Tests the parallel trainer using an in process executor."""
+import concurrent.futures
+import sys
+import threading
+import time
+
+import cogni_scan.src.dbutil as dbutil
+import cogni_scan.src.modeler.impl.parallel_trainer as parallel_trainer
+import cogni_scan.src.modeler.interfaces as interfaces
+
+
+class _Dataset(interfaces.IDataset):
+    def getDatasetID(self):
+        return "dataset-1"
+
+    def getDescription(self):
+        return {}
+
+    def getFeatures(self, slices):
+        return {}
+
+
+class _Executor:
+    """Runs the tasks in process and completes them in reverse order."""
+
+    instances = []
+
+    def __init__(self, max_workers, mp_context, initializer, initargs):
+        self.initializer = initializer
+        self.initargs = initargs
+        self.__tasks = []
+        _Executor.instances.append(self)
+
+    def __enter__(self):
+        threading.Thread(target=self.__complete, daemon=True).start()
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def submit(self, fn, *args):
+        future = concurrent.futures.Future()
+        self.__tasks.append((future, fn, args))
+        return future
+
+    def __complete(self):
+        time.sleep(0.1)
+        for future, fn, args in reversed(self.__tasks):
+            try:
+                future.set_result(fn(*args))
+            except Exception as ex:
+                future.set_exception(ex)
+            time.sleep(0.01)
+
+
+def _trainModel(dataset_id, slices, max_epochs):
+    if slices == ["13"]:
+        raise ValueError("Failed.")
+    return f"{dataset_id}:{'-'.join(slices)}"
+
+
+def test_models_are_returned_in_slice_set_order(monkeypatch):
+    monkeypatch.setattr(
+        parallel_trainer.concurrent.futures, "ProcessPoolExecutor", _Executor
+    )
+    monkeypatch.setattr(parallel_trainer, "_trainModel", _trainModel)
+    slice_sets = [["01"], ["01", "12"], ["13"], ["22"], ["23"]]
+    model_ids = parallel_trainer.trainModels(_Dataset(), slice_sets)
+    assert model_ids == [
+        "dataset-1:01", "dataset-1:01-12", "dataset-1:22", "dataset-1:23"
+    ]
+
+
+def test_workers_use_the_selected_database(monkeypatch):
+    monkeypatch.setattr(
+        parallel_trainer.concurrent.futures, "ProcessPoolExecutor", _Executor
+    )
+    monkeypatch.setattr(parallel_trainer, "_trainModel", _trainModel)
+    monkeypatch.setattr(dbutil.SimpleSQL, "_database_name", "dummyscans")
+    parallel_trainer.trainModels(_Dataset(), [["01"]])
+
+    executor = _Executor.instances[-1]
+    assert executor.initializer is parallel_trainer._initWorker
+    database_name = executor.initargs[-1]
+    assert database_name == "dummyscans"
+
+    # Apply the settings of a worker (without tensorflow).
+    monkeypatch.setattr(dbutil.SimpleSQL, "_database_name", None)
+    monkeypatch.setattr(
+        parallel_trainer.model_impl._Model, "_STORAGE_PATH", None
+    )
+    monkeypatch.setattr(parallel_trainer.feature_cache, "_cache_dir", None)
+    monkeypatch.setitem(sys.modules, "tensorflow", _FakeTensorflow())
+    parallel_trainer._initWorker(*executor.initargs)
+    assert dbutil.SimpleSQL.getDatabaseName() == "dummyscans"
+
+
+class _FakeTensorflow:
+    """Accepts the threading settings of _initWorker."""
+
+    class config:
+        class threading:
+            @staticmethod
+            def set_intra_op_parallelism_threads(n):
+                pass
+
+            @staticmethod
+            def set_inter_op_parallelism_threads(n):
+                pass
@@ -0,0 +1,120 @@
+"""Tests the filters of PatientCollection.loadFromDb against the database.
+
+The expected scans are computed as loadFromDb used to: the whole scan table
+is read and the filters are applied in python.
+"""
+
+import itertools
+
+import pytest
+
+import cogni_scan.src.collection_snapshot as collection_snapshot
+import cogni_scan.src.dbutil as dbutil
+import cogni_scan.src.nifti_mri as nifti_mri
+import cogni_scan.constants as constants
+
+_DBNAME = 'dummyscans'
+
+_SQL_SELECT_SCANS = """
+select scan_id, patient_id, days, health_status, validation_status
+from scan
+order by patient_id, days, scan_id
+"""
+
+_SQL_SELECT_SCANS_WITH_FEATURES = "select scan_id from scan_features"
+
+_SQL_SELECT_EXIT_HEALTH_STATUS = """
+select a.patient_id, a.health_status from diagnosis a,
+(Select patient_id, max(days) as days from diagnosis group by patient_id) b
+where a.patient_id = b.patient_id and a.days = b.days;
+"""
+
+_FILTERS = list(itertools.product(
+    ["ALL", "HH", "HD", "HH-HD", "HU-?D"],
+    [False, True],
+    [constants.ALL_SCANS, constants.UNDEFINED_SCAN, constants.INVALID_SCAN,
+     constants.VALID_SCAN]
+))
+
+
+def _loadExpected(show_labels, show_only_healthy, show_status):
+    """Returns the {patient_id: (label, [(scan_id, has_features)])} to show.
+
+    Applies the filters in python (as loadFromDb did before they were
+    moved to its query).
+    """
+    with dbutil.SimpleSQL() as db:
+        with_features = {
+            row[0] for row in db.execute_query(_SQL_SELECT_SCANS_WITH_FEATURES)
+        }
+        exit_health_status = dict(
+            db.execute_query(_SQL_SELECT_EXIT_HEALTH_STATUS)
+        )
+        rows = list(db.execute_query(_SQL_SELECT_SCANS))
+
+    patients = {}
+    for scan_id, patient_id, days, health_status, validation_status in rows:
+        if show_status != constants.ALL_SCANS and \
+                validation_status != show_status:
+            continue
+        if show_only_healthy and health_status != 0:
+            continue
+        patients.setdefault(patient_id, []).append(
+            (scan_id, health_status)
+        )
+
+    expected = {}
+    for patient_id, scans in patients.items():
+        label = nifti_mri._makeLabel(
+            scans[0][1], exit_health_status.get(patient_id)
+        )
+        if show_labels != "ALL" and label not in show_labels.split("-"):
+            continue
+        expected[patient_id] = (
+            label,
+            [(scan_id, scan_id in with_features) for scan_id, _ in scans]
+        )
+    return expected
+
+
+def _getLoaded(collection):
+    """Returns the loaded scans in the format of _loadExpected."""
+    loaded = {}
+    for patient_id, title in collection.getPatientIDs():
+        loaded[patient_id] = (
+            title.split()[-1],
+            [
+                (scan.getScanID(), scan.hasVGGFeatures())
+                for scan in collection.getMrisByPatient(patient_id)
+            ]
+        )
+    return loaded
+
+
+@pytest.mark.parametrize(
+    "show_labels, show_only_healthy, show_status", _FILTERS
+)
+def test_load_from_db(show_labels, show_only_healthy, show_status):
+    dbutil.SimpleSQL.setDatabaseName(_DBNAME)
+    collection = nifti_mri.PatientCollection()
+    collection.loadFromDb(show_labels, show_only_healthy, show_status)
+    expected = _loadExpected(show_labels, show_only_healthy, show_status)
+    assert _getLoaded(collection) == expected
+
+
+@pytest.mark.parametrize(
+    "show_labels, show_only_healthy, show_status", _FILTERS
+)
+def test_load_from_snapshot(tmp_path, show_labels, show_only_healthy,
+                            show_status):
+    dbutil.SimpleSQL.setDatabaseName(_DBNAME)
+    collection_snapshot.setSnapshotDir(str(tmp_path))
+    try:
+        collection = nifti_mri.PatientCollection()
+        collection.loadFromDb(
+            show_labels, show_only_healthy, show_status, use_snapshot=True
+        )
+    finally:
+        collection_snapshot.setSnapshotDir(None)
+    expected = _loadExpected(show_labels, show_only_healthy, show_status)
+    assert _getLoaded(collection) == expected
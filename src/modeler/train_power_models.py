@@ -0,0 +1,70 @@
+"""Trains the models for all the combinations of the passed in slices.
+
+Example (trains the 511 models of all the nine slices using 8 processes with
+2 tensorflow threads each):
+
+    python -m cogni_scan.src.modeler.train_power_models \
+        --dataset-id <dataset_id> --workers 8 --intra-op-threads 2
+"""
+
+import argparse
+import itertools
+import sys
+
+import cogni_scan.src.modeler.impl.feature_cache as feature_cache
+import cogni_scan.src.modeler.impl.parallel_trainer as parallel_trainer
+import cogni_scan.src.modeler.model as model
+
+
+def getSliceSets(slices):
+    """Returns all the non empty combinations of the passed in slices."""
+    slices = sorted(slices)
+    return [
+        list(c)
+        for i in range(1, len(slices) + 1)
+        for c in itertools.combinations(slices, i)
+    ]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Trains a model for each combination of slices."
+    )
+    parser.add_argument("--dataset-id", required=True)
+    parser.add_argument(
+        "--slices", nargs="+", default=feature_cache.ALL_SLICES,
+        help="The slices to combine (default: all nine)."
+    )
+    parser.add_argument(
+        "--workers", type=int, default=None,
+        help="Number of training processes (default: cpu count)."
+    )
+    parser.add_argument(
+        "--intra-op-threads", type=int, default=None,
+        help="Tensorflow intra op threads per process "
+             "(default: cpu count / workers)."
+    )
+    parser.add_argument(
+        "--inter-op-threads", type=int, default=1,
+        help="Tensorflow inter op threads per process."
+    )
+    parser.add_argument("--max-epochs", type=int, default=120)
+    args = parser.parse_args(argv)
+
+    dataset = model.getDatasetByID(args.dataset_id)
+    slice_sets = getSliceSets(args.slices)
+    print(f"Training {len(slice_sets)} models.")
+    model_ids = parallel_trainer.trainModels(
+        dataset,
+        slice_sets,
+        max_epochs=args.max_epochs,
+        workers=args.workers,
+        intra_op_threads=args.intra_op_threads,
+        inter_op_threads=args.inter_op_threads,
+    )
+    print(f"Done; trained {len(model_ids)} of {len(slice_sets)} models.")
+    return 0 if len(model_ids) == len(slice_sets) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,45 +1,30 @@
 """Exposes the MRIs as a collection of objects."""
 
+import bisect
+import collections
 import copy
+import datetime
+import hashlib
 import json
-import os.path
-import pickle
 
 import cv2
-import nibabel as nib
 import numpy as np
+import psycopg2.errors
 
+import cogni_scan.src.collection_snapshot as collection_snapshot
 import cogni_scan.src.dbutil as dbutil
+import cogni_scan.src.feature_codec as feature_codec
+import cogni_scan.src.nifti_reader as nifti_reader
+import cogni_scan.src.thumbnail_store as thumbnail_store
+import cogni_scan.src.vgg16 as vgg16
+import cogni_scan.src.volume_cache as volume_cache
 import cogni_scan.constants as constants
 
-import numpy as np
-import tensorflow as tf
-from tensorflow.keras.applications.vgg16 import VGG16
-from tensorflow import keras
-
 UNDEFINED_SCAN = constants.UNDEFINED_SCAN
 INVALID_SCAN = constants.INVALID_SCAN
 VALID_SCAN = constants.VALID_SCAN
 
 
-class _FeatureExtractor:
-    _ready = False
-
-    def __call__(self, image):
-        if not self._ready:
-            self.__model_1 = VGG16(
-                weights='imagenet', include_top=False, input_shape=(200, 200, 3)
-            )
-            self._ready = True
-
-        features = self.__model_1.predict(np.array([image]))
-        gavg = keras.layers.GlobalAveragePooling2D()(features)
-        return keras.layers.Flatten()(gavg)
-
-
-_feature_extractor = _FeatureExtractor()
-
-
 def add_rgb_channels(imgs):
     """Adds the RGB channels to a collection of gray scale images.
 
@@ -53,51 +38,116 @@ def add_rgb_channels(imgs):
     return rgb.reshape(imgs.shape + (3,))
 
 
+# Returns the letter (H, U, D or ?) for a health status column.
+_SQL_HEALTH_LETTER = """
+case {column} when 0 then 'H' when 1 then 'U' when 2 then 'D' else '?' end
+""".strip().format
+
+# Selects the scans to show along with their has-features flag and the exit
+# (last diagnosed) health status of their patient.  The label of a patient
+# uses the health status of its first selected scan so it is computed after
+# the scan filters (the {scan_filters} placeholder) and filtered by the
+# outer {label_filter}.
 _SQL_SELECT_ALL = """
+with exit_status as (
+    select patient_id, health_status
+    from (
+        select
+            patient_id, health_status,
+            row_number() over (
+                partition by patient_id order by days desc
+            ) as position
+        from diagnosis
+    ) d
+    where position = 1
+),
+selected as (
+    select
+        s.scan_id, s.fullpath, s.days, s.patient_id, s.origin,
+        s.health_status, s.axis, s.rotation, s.sd0, s.sd1, s.sd2,
+        s.validation_status, f.scan_id is not null as has_features,
+        e.health_status as exit_health_status
+    from
+        scan s
+        left join scan_features f on f.scan_id = s.scan_id
+        left join exit_status e on e.patient_id = s.patient_id
+    where true {scan_filters}
+),
+labeled as (
+    select
+        *,
+        {enter_letter} || {exit_letter} as label
+    from (
+        select
+            *,
+            first_value(health_status) over (
+                partition by patient_id order by days, scan_id
+            ) as enter_health_status
+        from selected
+    ) a
+)
 select
-    scan_id, fullpath, days, patient_id, origin, health_status, 
-    axis, rotation, sd0, sd1, sd2, validation_status
+    scan_id, fullpath, days, patient_id, origin, health_status,
+    axis, rotation, sd0, sd1, sd2, validation_status, has_features,
+    exit_health_status
 from
-    scan
+    labeled
+where true {label_filter}
 order by patient_id, days, scan_id
-"""
+""".format
 
-_SQL_SELECT_EXIT_HEALTH_STATUS = """
-select a.patient_id, a.health_status from diagnosis a, 
-(Select patient_id, max(days) as days from diagnosis group by patient_id) b  
-where a.patient_id = b.patient_id and a.days = b.days;
+# The state of the database stored with the snapshots of the collection.
+_SQL_SELECT_SNAPSHOT_STATE = """
+select
+    (select max(updated_at) from scan),
+    (select coalesce(max(feature_id), 0) from scan_features),
+    (select count(*) from scan_features),
+    (select count(*) from scan_features where feature_id <= %s),
+    (select md5(string_agg(scan_id::text, ',' order by scan_id)) from scan)
 """
 
+_SQL_SELECT_SCAN_IDS = """select scan_id from scan"""
+
+# Selects (in _SQL_SELECT_ALL) the scans that changed after a snapshot.
+_SQL_CHANGED_SCANS_FILTER = "and (s.updated_at > %s or f.feature_id > %s)"
+
+# Scans updated this much before the watermark of a snapshot are fetched
+# again since their transactions might have committed after it was taken.
+_SNAPSHOT_OVERLAP = datetime.timedelta(minutes=5)
+
 _SQL_SELECT_ONE = """
 select
-    scan_id, fullpath, days, patient_id, origin, health_status, 
+    fullpath, scan_id, days, patient_id, origin, health_status,
     axis, rotation, sd0, sd1, sd2, validation_status
 from
     scan
 where scan_id={scan_id}
 """.format
 
-_SQL_INSERT_FEATURES = """
-INSERT INTO scan_features (
-    scan_id,
-    distance_0,
-    distance_1,
-    distance_2,
-    features_slice01,
-    features_slice02,
-    features_slice03,
-    features_slice11,
-    features_slice12,
-    features_slice13,
-    features_slice21,
-    features_slice22,
-    features_slice23
-)
-VALUES (
-   {}, {}, {}, {}, '{}','{}','{}','{}','{}','{}','{}','{}','{}'
-)
+# The columns of the scan_features rows inserted by the application.
+_FEATURE_COLUMNS = [
+    "scan_id",
+    "distance_0",
+    "distance_1",
+    "distance_2",
+    "features_slice01",
+    "features_slice02",
+    "features_slice03",
+    "features_slice11",
+    "features_slice12",
+    "features_slice13",
+    "features_slice21",
+    "features_slice22",
+    "features_slice23",
+]
+
+_SQL_INSERT_PATIENT_LABELS = """
+INSERT INTO patient (patient_id, label) VALUES %s
 """
 
+# The number of scans whose features are inserted with one statement.
+DEFAULT_INSERT_BATCH_SIZE = 64
+
 _SQL_UPDATE_ONE = """
     Update
         Scan set axis='{axis}', rotation='{rotation}',
@@ -107,17 +157,18 @@ _SQL_UPDATE_ONE = """
         fullpath='{fullpath}'
 """.format
 
-_SQL_SELECT_SCANS_WITH_FEATURES = """select scan_id from scan_features"""
-
 _SQL_UPDATE_PATIENT_ID_IN_SCAN_FEATURES = """
 update scan_features a set patient_id=b.patient_id 
-from scan b where a.scan_id=b.scan_id;
-"""
+from scan b where a.scan_id=b.scan_id {condition};
+""".format
 
 _SQL_UPDATE_LABEL_IN_SCAN_FEATURES = """
 update scan_features a set label=b.label from 
-patient b where a.patient_id=b.patient_id;
-"""
+patient b where a.patient_id=b.patient_id {condition};
+""".format
+
+# Limits the label updates to some of the scans.
+_SQL_SCAN_IDS_CONDITION = "and a.scan_id = any(%s)"
 
 
 def int2HealthStatus(value):
@@ -131,198 +182,756 @@ def int2HealthStatus(value):
         return "?"
 
 
+def updateFeatureLabels(db, scan_ids=None):
+    """Copies the patient id and label of each scan to its features row.
+
+    :param scan_ids: Updates only the features rows of these scans (all the
+    rows if None).
+    """
+    if scan_ids is None:
+        condition, params = "", None
+    else:
+        condition, params = _SQL_SCAN_IDS_CONDITION, (list(scan_ids),)
+    db.execute_non_query(
+        _SQL_UPDATE_PATIENT_ID_IN_SCAN_FEATURES(condition=condition), params
+    )
+    db.execute_non_query(
+        _SQL_UPDATE_LABEL_IN_SCAN_FEATURES(condition=condition), params
+    )
+
+
+def insertVGG16Features(db, items):
+    """Inserts the features of many scans to the db with a single COPY.
+
+    :param db: The SimpleSQL instance to use.
+    :param items: A list of (scan, features) pairs where features is a numpy
+    array shaped as (9, 512).
+    """
+    if not items:
+        return
+    rows = [scan.getFeaturesRow(features) for scan, features in items]
+    print(f"Inserting the features of {len(rows)} scans to the database.")
+    db.copy_rows("scan_features", _FEATURE_COLUMNS, rows)
+
+
+class FeatureInserter:
+    """Buffers the features of many scans and inserts them in bulk.
+
+    Can be used as a context manager, in which case the pending features are
+    inserted when leaving the context.
+    """
+
+    def __init__(self, db, batch_size=DEFAULT_INSERT_BATCH_SIZE):
+        """Initializer.
+
+        :param db: The SimpleSQL instance to use.
+        :param int batch_size: The number of scans inserted together.
+        """
+        assert batch_size > 0
+        self.__db = db
+        self.__batch_size = batch_size
+        self.__pending = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, trace):
+        if exc_type is None:
+            self.flush()
+
+    def add(self, scan, features):
+        """Adds the features (shaped as (9, 512)) of a scan."""
+        self.__pending.append((scan, features))
+        if len(self.__pending) >= self.__batch_size:
+            self.flush()
+
+    def flush(self):
+        """Inserts all the pending features."""
+        pending, self.__pending = self.__pending, []
+        insertVGG16Features(self.__db, pending)
+
+
+def _fitToSquare(img, out):
+    """Resizes an image to fit in a square keeping its aspect ratio.
+
+    The image is centered in the square; the rest of the square is left as
+    it is.
+
+    :param img: A (rows, columns) image or a (rows, columns, n) stack of
+    images.
+    :param out: The square (or the (n, side, side) squares) to draw to.
+    """
+    bounding_square = out.shape[-1]
+    x, y = img.shape[:2]
+    if x > y:
+        y = int(bounding_square * (y / x))
+        x = bounding_square
+    elif x < y:
+        x = int(bounding_square * (x / y))
+        y = bounding_square
+    else:
+        x = y = bounding_square
+
+    x_offset = int((bounding_square - y) / 2)
+    y_offset = int((bounding_square - x) / 2)
+    img = np.ascontiguousarray(img)
+    s_img = cv2.resize(img, dsize=(y, x), interpolation=cv2.INTER_CUBIC)
+    if img.ndim == 3:
+        # Stacks are resized as multi channel images; cv2 drops the channel
+        # axis of single channel results.
+        s_img = np.moveaxis(s_img.reshape((x, y, -1)), 2, 0)
+    # Truncated (like the integer images we used to render) so the stored
+    # features remain comparable.
+    np.trunc(
+        s_img, out=out[..., y_offset:y_offset + x, x_offset:x_offset + y]
+    )
+
+
+# Stored in the status columns of the scan table for NULL values.
+_NULL_STATUS = -1
+
+
+def _makeSelectAllQuery(show_labels="ALL", show_only_healthy=False,
+                        show_status=constants.ALL_SCANS):
+    """Returns the sql and the params selecting the scans to show.
+
+    :param str show_labels: The labels to show separated by dashes (like
+    HH-HD) or ALL.
+    :param bool show_only_healthy: If True only the healthy scans are shown.
+    :param int show_status: The validation status to show or ALL_SCANS.
+    """
+    scan_filters = []
+    params = []
+    if show_status != constants.ALL_SCANS:
+        scan_filters.append("and s.validation_status = %s")
+        params.append(show_status)
+    if show_only_healthy:
+        scan_filters.append("and s.health_status = 0")
+    label_filter = ""
+    if show_labels != "ALL":
+        label_filter = "and label = any(%s)"
+        params.append(show_labels.split("-"))
+    sql = _SQL_SELECT_ALL(
+        scan_filters=" ".join(scan_filters),
+        enter_letter=_SQL_HEALTH_LETTER(column="enter_health_status"),
+        exit_letter=_SQL_HEALTH_LETTER(column="exit_health_status"),
+        label_filter=label_filter
+    )
+    return sql, params
+
+
+def _makeLabel(enter_health_status, exit_health_status):
+    """Returns the label (like HH or HD) for the passed in statuses."""
+    return f'{int2HealthStatus(enter_health_status)}' \
+           f'{int2HealthStatus(exit_health_status)}'
+
+
+def _loadSnapshotTable(db):
+    """Returns the table of all the scans using the local snapshot.
+
+    Only the scans that changed after the snapshot are fetched (the triggers
+    of the db touch the scans of a patient when its diagnosis changes).  The
+    deleted scans are found by comparing the hash of the scan ids with the
+    one of the db; the snapshot is rebuilt when features were deleted.
+    """
+    key = collection_snapshot.getKey(db.getConnectionString())
+    snapshot = collection_snapshot.load(key)
+    old_state = snapshot[1] if snapshot else {}
+    old_max_feature_id = old_state.get("max_feature_id", 0)
+
+    for row in db.execute_query(
+            _SQL_SELECT_SNAPSHOT_STATE, (old_max_feature_id,)):
+        (watermark, max_feature_id, feature_count, old_feature_count,
+         scan_ids_hash) = row
+    state = {
+        "watermark": watermark.isoformat() if watermark else None,
+        "max_feature_id": max_feature_id,
+        "feature_count": feature_count,
+        "scan_ids_hash": scan_ids_hash,
+    }
+
+    table = None
+    if old_state.get("watermark") and \
+            old_state["feature_count"] == old_feature_count:
+        table = _ScanTable.fromArrays(snapshot[0])
+        if state == old_state:
+            return table
+        since = datetime.datetime.fromisoformat(old_state["watermark"])
+        sql = _SQL_SELECT_ALL(
+            scan_filters=_SQL_CHANGED_SCANS_FILTER,
+            enter_letter=_SQL_HEALTH_LETTER(column="enter_health_status"),
+            exit_letter=_SQL_HEALTH_LETTER(column="exit_health_status"),
+            label_filter=""
+        )
+        rows = list(db.execute_streaming_query(
+            sql, (since - _SNAPSHOT_OVERLAP, old_max_feature_id)
+        ))
+        table = table.merge(rows)
+        print(f"Refreshed {len(rows)} scans of the snapshot.")
+        if _hashScanIds(table.scan_ids) != scan_ids_hash:
+            table = _dropDeletedScans(db, table)
+    elif snapshot:
+        print("Features were deleted; reloading the snapshot.")
+
+    if table is None:
+        sql, params = _makeSelectAllQuery()
+        table = _ScanTable.fromRows(db.execute_streaming_query(sql, params))
+    collection_snapshot.save(key, table.toArrays(), state)
+    return table
+
+
+def _dropDeletedScans(db, table):
+    """Removes the scans that are not in the db anymore from the table.
+
+    :return: The new table or None if the db has scans missing from it (so
+    the table has to be reloaded).
+    """
+    scan_ids = np.fromiter(
+        (row[0] for row in db.execute_streaming_query(_SQL_SELECT_SCAN_IDS)),
+        dtype=np.int64
+    )
+    keep = np.isin(table.scan_ids, scan_ids)
+    print(f"Dropped {len(table) - keep.sum()} deleted scans of the snapshot.")
+    table = table.select(keep)
+    if len(table) != len(scan_ids):
+        print("Scans are missing from the snapshot; reloading it.")
+        return None
+    return table
+
+
+def _internKey(value):
+    """Returns the key used to intern the values of the scan table."""
+    return json.dumps(value, sort_keys=True)
+
+
+def _hashScanIds(scan_ids):
+    """Returns the hash of a set of scan ids (as _SQL_SELECT_SNAPSHOT_STATE).
+
+    :return: The md5 (hex) of the sorted ids joined with commas or None if
+    there are no ids.
+    """
+    if not len(scan_ids):
+        return None
+    text = ",".join(str(i) for i in np.sort(scan_ids))
+    return hashlib.md5(text.encode()).hexdigest()
+
+
+class _ScanTable:
+    """Holds the scans of the collection as columns.
+
+    The numeric columns are numpy arrays while the patient ids, origins,
+    axis mappings and rotations (which repeat a lot) are interned and stored
+    as codes into their lists of distinct values.  The rows must be grouped by
+    patient id so the scans of each patient are a contiguous range.
+
+    Scan objects are only created (by makeScan) when they are needed.
+    """
+
+    # The columns held as numpy arrays (one element per row).
+    _ARRAYS = (
+        "scan_ids", "days", "health_status", "slice_distances",
+        "validation_status", "has_features", "exit_health_status",
+        "patient_codes", "origin_codes", "axis_codes", "rotation_codes",
+    )
+
+    __slots__ = _ARRAYS + (
+        "fullpaths", "patient_ids", "origins", "axes", "rotations",
+        "__order", "__sorted_ids",
+    )
+
+    def __init__(self):
+        """Initializes an empty table."""
+        self.scan_ids = np.zeros(0, dtype=np.int64)
+        self.days = np.zeros(0, dtype=np.int32)
+        self.health_status = np.zeros(0, dtype=np.int8)
+        self.slice_distances = np.zeros((0, 3), dtype=np.float64)
+        self.validation_status = np.zeros(0, dtype=np.int8)
+        self.has_features = np.zeros(0, dtype=bool)
+        self.exit_health_status = np.zeros(0, dtype=np.int8)
+        self.fullpaths = []
+        self.patient_codes = np.zeros(0, dtype=np.int32)
+        self.patient_ids = []
+        self.origin_codes = np.zeros(0, dtype=np.int16)
+        self.origins = []
+        self.axis_codes = np.zeros(0, dtype=np.int16)
+        self.axes = []
+        self.rotation_codes = np.zeros(0, dtype=np.int16)
+        self.rotations = []
+        self.__order = None
+        self.__sorted_ids = None
+
+    @classmethod
+    def fromRows(cls, rows):
+        """Builds a table from rows in the order of _SQL_SELECT_ALL.
+
+        :param rows: An iterable of the (scan_id, fullpath, days, patient_id,
+        origin, health_status, axis, rotation, sd0, sd1, sd2,
+        validation_status, has_features, exit_health_status) rows grouped
+        (sorted) by patient id.
+        """
+        interned = {
+            "patient_ids": {}, "origins": {}, "axes": {}, "rotations": {}
+        }
+        table = cls()
+
+        def intern(name, value):
+            key = _internKey(value)
+            codes = interned[name]
+            if key not in codes:
+                codes[key] = len(codes)
+                getattr(table, name).append(value)
+            return codes[key]
+
+        scan_ids, days, health_status, slice_distances = [], [], [], []
+        validation_status, has_features, exit_health_status = [], [], []
+        patient_codes, origin_codes = [], []
+        axis_codes, rotation_codes = [], []
+        for row in rows:
+            (scan_id, fullpath, day, patient_id, origin, status, axis,
+             rotation, sd0, sd1, sd2, v_status, has_f, exit_status) = row
+            scan_ids.append(scan_id)
+            table.fullpaths.append(fullpath)
+            days.append(day)
+            patient_codes.append(intern("patient_ids", patient_id))
+            origin_codes.append(intern("origins", origin))
+            health_status.append(status)
+            axis_codes.append(intern("axes", axis))
+            rotation_codes.append(intern("rotations", rotation))
+            slice_distances.append((sd0, sd1, sd2))
+            validation_status.append(
+                _NULL_STATUS if v_status is None else v_status
+            )
+            has_features.append(has_f)
+            exit_health_status.append(
+                _NULL_STATUS if exit_status is None else exit_status
+            )
+
+        count = len(scan_ids)
+        table.scan_ids = np.array(scan_ids, dtype=np.int64)
+        table.days = np.array(days, dtype=np.int32)
+        table.health_status = np.array(health_status, dtype=np.int8)
+        # NULL slice distances become nan.
+        table.slice_distances = np.array(
+            slice_distances, dtype=np.float64).reshape(count, 3)
+        table.validation_status = np.array(validation_status, dtype=np.int8)
+        table.has_features = np.array(has_features, dtype=bool)
+        table.exit_health_status = np.array(exit_health_status, dtype=np.int8)
+        table.patient_codes = np.array(patient_codes, dtype=np.int32)
+        table.origin_codes = np.array(origin_codes, dtype=np.int16)
+        table.axis_codes = np.array(axis_codes, dtype=np.int16)
+        table.rotation_codes = np.array(rotation_codes, dtype=np.int16)
+        # The codes are given in order of appearance so they only decrease
+        # when the scans of a patient are not contiguous.
+        if np.any(np.diff(table.patient_codes) < 0):
+            raise ValueError("The rows must be grouped by patient id.")
+        return table
+
+    def __len__(self):
+        return len(self.scan_ids)
+
+    def select(self, mask):
+        """Returns a new table holding only the selected rows.
+
+        :param mask: A boolean array (True for the rows to keep) or an array
+        with the indexes of the rows to keep (in their new order).
+        """
+        mask = np.asarray(mask)
+        rows = np.flatnonzero(mask) if mask.dtype == bool else mask
+        table = _ScanTable()
+        for name in self._ARRAYS:
+            setattr(table, name, getattr(self, name)[rows])
+        table.fullpaths = [self.fullpaths[row] for row in rows]
+        # The interned values are shared (unused ones are harmless).
+        table.patient_ids = self.patient_ids
+        table.origins = self.origins
+        table.axes = self.axes
+        table.rotations = self.rotations
+        return table
+
+    def filter(self, show_labels="ALL", show_only_healthy=False,
+               show_status=constants.ALL_SCANS):
+        """Returns a new table holding only the scans to show.
+
+        Applies the filters of _makeSelectAllQuery to the table; the labels
+        use the health status of the first selected scan of each patient.
+        """
+        table = self
+        if show_status != constants.ALL_SCANS:
+            table = table.select(table.validation_status == show_status)
+        if show_only_healthy:
+            table = table.select(table.health_status == 0)
+        if show_labels != "ALL":
+            labels = show_labels.split("-")
+            _, starts = table.getPatientBounds()
+            keep = np.array([
+                _makeLabel(
+                    table.health_status[start],
+                    table.exit_health_status[start]
+                ) in labels
+                for start in starts[:-1]
+            ], dtype=bool)
+            table = table.select(np.repeat(keep, np.diff(starts)))
+        return table
+
+    def rows(self):
+        """Yields the rows of the table (as passed to fromRows)."""
+        for row in range(len(self)):
+            validation_status = int(self.validation_status[row])
+            exit_health_status = int(self.exit_health_status[row])
+            sd0, sd1, sd2 = (
+                None if np.isnan(d) else float(d)
+                for d in self.slice_distances[row]
+            )
+            yield (
+                int(self.scan_ids[row]),
+                self.fullpaths[row],
+                int(self.days[row]),
+                self.patient_ids[self.patient_codes[row]],
+                self.origins[self.origin_codes[row]],
+                int(self.health_status[row]),
+                self.axes[self.axis_codes[row]],
+                self.rotations[self.rotation_codes[row]],
+                sd0, sd1, sd2,
+                None if validation_status == _NULL_STATUS
+                else validation_status,
+                bool(self.has_features[row]),
+                None if exit_health_status == _NULL_STATUS
+                else exit_health_status,
+            )
+
+    def merge(self, rows):
+        """Returns a new table with the passed in rows added or replaced.
+
+        Only the passed in rows are converted; the rows of the table are
+        copied as arrays.  The rows are sorted as _SQL_SELECT_ALL sorts them
+        so the result is the same as fromRows of all the rows.
+
+        :param rows: Rows (as passed to fromRows) in any order; they replace
+        the rows of the same scan ids.
+        """
+        changed = _ScanTable.fromRows(
+            sorted(rows, key=lambda row: (row[3], row[2], row[0]))
+        )
+        table = self.select(~np.isin(self.scan_ids, changed.scan_ids))
+
+        # Re-code the interned columns of the changed rows.
+        for name, codes_name in (("patient_ids", "patient_codes"),
+                                 ("origins", "origin_codes"),
+                                 ("axes", "axis_codes"),
+                                 ("rotations", "rotation_codes")):
+            values = list(getattr(table, name))
+            codes = {_internKey(value): i for i, value in enumerate(values)}
+            new_codes = []
+            for value in getattr(changed, name):
+                key = _internKey(value)
+                if key not in codes:
+                    codes[key] = len(values)
+                    values.append(value)
+                new_codes.append(codes[key])
+            dtype = getattr(table, codes_name).dtype
+            new_codes = np.array(new_codes, dtype=dtype)
+            setattr(table, name, values)
+            setattr(table, codes_name, np.concatenate((
+                getattr(table, codes_name),
+                new_codes[getattr(changed, codes_name)]
+            )))
+
+        for name in self._ARRAYS:
+            if not name.endswith("_codes"):
+                setattr(table, name, np.concatenate(
+                    (getattr(table, name), getattr(changed, name))
+                ))
+        table.fullpaths = table.fullpaths + changed.fullpaths
+
+        # Groups the rows by patient (and sorts them as _SQL_SELECT_ALL); the
+        # codes of new patients follow the existing ones so the patients are
+        # sorted by the rank of their ids.
+        patient_ranks = np.argsort(np.argsort(table.patient_ids))
+        order = np.lexsort((
+            table.scan_ids, table.days, patient_ranks[table.patient_codes]
+        ))
+        return table.select(order)
+
+    def toArrays(self):
+        """Returns the table as a dict of numpy arrays (see fromArrays)."""
+        arrays = {name: getattr(self, name) for name in self._ARRAYS}
+        arrays["fullpaths"] = np.array(self.fullpaths, dtype=str)
+        arrays["patient_ids"] = np.array(self.patient_ids, dtype=str)
+        arrays["origins"] = np.array(self.origins, dtype=str)
+        arrays["axes"] = np.array(
+            [json.dumps(axis) for axis in self.axes], dtype=str
+        )
+        arrays["rotations"] = np.array(
+            [json.dumps(rotation) for rotation in self.rotations], dtype=str
+        )
+        return arrays
+
+    @classmethod
+    def fromArrays(cls, arrays):
+        """Builds a table from the arrays returned by toArrays."""
+        table = cls()
+        for name in cls._ARRAYS:
+            setattr(table, name, arrays[name])
+        table.fullpaths = arrays["fullpaths"].tolist()
+        table.patient_ids = arrays["patient_ids"].tolist()
+        table.origins = arrays["origins"].tolist()
+        table.axes = [json.loads(axis) for axis in arrays["axes"]]
+        table.rotations = [
+            json.loads(rotation) for rotation in arrays["rotations"]
+        ]
+        return table
+
+    def getPatientBounds(self):
+        """Returns the patients and the offsets of their ranges of rows.
+
+        :return: A tuple (codes, starts) where codes holds the patient code of
+        each patient in the table and the rows of the i-th patient are
+        starts[i]:starts[i + 1].
+        """
+        starts = np.flatnonzero(np.diff(self.patient_codes)) + 1
+        starts = np.concatenate(([0], starts, [len(self)])).astype(np.intp)
+        if not len(self):
+            starts = starts[1:]
+        return self.patient_codes[starts[:-1]], starts
+
+    def findRow(self, scan_id):
+        """Returns the row of the passed in scan id (None if missing)."""
+        if self.__order is None:
+            self.__order = np.argsort(self.scan_ids, kind="stable")
+            self.__sorted_ids = self.scan_ids[self.__order]
+        sorted_ids = self.__sorted_ids
+        i = np.searchsorted(sorted_ids, scan_id)
+        if i < len(sorted_ids) and sorted_ids[i] == scan_id:
+            return int(self.__order[i])
+        return None
+
+    def makeScan(self, row):
+        """Creates a Scan object for the passed in row."""
+        sd0, sd1, sd2 = (
+            None if np.isnan(d) else float(d)
+            for d in self.slice_distances[row]
+        )
+        validation_status = int(self.validation_status[row])
+        if validation_status == _NULL_STATUS:
+            validation_status = None
+        scan = Scan(
+            self.fullpaths[row],
+            int(self.scan_ids[row]),
+            int(self.days[row]),
+            self.patient_ids[self.patient_codes[row]],
+            self.origins[self.origin_codes[row]],
+            int(self.health_status[row]),
+            copy.deepcopy(self.axes[self.axis_codes[row]]),
+            copy.deepcopy(self.rotations[self.rotation_codes[row]]),
+            sd0, sd1, sd2,
+            validation_status
+        )
+        if self.has_features[row]:
+            scan.setToHasVGGFeatures()
+        return scan
+
+
 class PatientCollection:
     """Holds all the available MRI objects.
 
+    The scans are kept in a columnar _ScanTable (sorted by patient) instead
+    of a Scan object per row; the Scan and Patient objects are created the
+    first time they are asked for and then reused so their changes persist.
+
     Attributes
 
-    __patients: Maps patient IDs to Patient objects.
-    __mri_id_to_mri: Maps scan IDs to corresponding Scan objects.
+    __table: The _ScanTable holding the scans of the selected patients.
+    __patient_ids: The ids of the selected patients (in table order).
+    __starts: The rows of the i-th patient are __starts[i]:__starts[i + 1].
+    __patient_index: Maps patient IDs to their position in __patient_ids.
+    __patients: Maps patient IDs to the Patient objects created so far.
+    __scans: Maps scan IDs to the Scan objects created so far.
     __was_loaded: a flag indicating whether the data was successfully loaded.
     """
 
     def __init__(self):
         """Initialize the object with default values."""
-        self.__patients = {}
-        self.__mri_id_to_mri = {}
+        self.__setTable(_ScanTable())
         self.__was_loaded = False
 
+    def __setTable(self, table):
+        codes, starts = table.getPatientBounds()
+        self.__table = table
+        self.__patient_ids = [table.patient_ids[c] for c in codes]
+        self.__starts = starts
+        self.__patient_index = {
+            patient_id: i for i, patient_id in enumerate(self.__patient_ids)
+        }
+        self.__patients = {}
+        self.__scans = {}
+
     def loadFromDb(self, show_labels="ALL",
-                   show_only_healthy=False, show_status=None):
+                   show_only_healthy=False, show_status=None,
+                   use_snapshot=False):
         """Load data from the database and populate the patient collection.
 
-        Each row from the database is processed to create a new Scan object,
-        which is then associated with the corresponding Patient. Additionally,
-        a mapping from Scan ID to Scan object is created for faster searches.
+        The filters are applied by the database so only the scans to show
+        are fetched; they are stored in a columnar scan table.
+
+        :param bool use_snapshot: If True all the scans are read from the
+        local snapshot (fetching only the ones that changed since it was
+        saved) and filtered in memory.
         """
-        self.__patients = {}
-        self.__mri_id_to_mri = {}
+        self.__setTable(_ScanTable())
         self.__was_loaded = False
 
+        if show_status is None:
+            show_status = constants.ALL_SCANS
         with dbutil.SimpleSQL() as db:
-            if show_status is None:
-                show_status = constants.ALL_SCANS
-
-            # Load the scan ids that have VGG features in the database.
-            having_vgg_features = set()
-            for row in db.execute_query(_SQL_SELECT_SCANS_WITH_FEATURES):
-                scan_id = row[0]
-                having_vgg_features.add(scan_id)
-
-            for row in db.execute_query(_SQL_SELECT_ALL):
-                (scan_id, fullpath, days, patient_id, origin,
-                 health_status, axis, rotation, sd0, sd1, sd2,
-                 status) = row
-
-                if show_status != constants.ALL_SCANS and status != show_status:
-                    continue
-
-                if patient_id not in self.__patients:
-                    self.__patients[patient_id] = Patient(patient_id)
-
-                scan = Scan(fullpath, scan_id, days, patient_id, origin,
-                            health_status, axis, rotation, sd0, sd1, sd2,
-                            status)
-
-                # Set the has VGG features if needed.
-                if scan.getScanID() in having_vgg_features:
-                    scan.setToHasVGGFeatures()
-
-                self.__patients[patient_id].addScan(scan)
-                self.__mri_id_to_mri[scan.getScanID()] = scan
-
-            # Assign the exit health status to all the patients.
-            for row in db.execute_query(_SQL_SELECT_EXIT_HEALTH_STATUS):
-                patient_id, health_status = row
-                if patient_id in self.__patients:
-                    self.__patients[patient_id].setExitHealthStatus(
-                        health_status)
-
-            if show_only_healthy:
-                for _, v in self.__patients.items():
-                    v.keepOnlyHealthyScans()
-
-            # Filter by selected label (like HH or HD for example).
-            if show_labels != "ALL":
-                labels = show_labels.split("-")
-                temp = {}
-                for k, v in self.__patients.items():
-                    l = v.getLabel()
-                    if v.getLabel() in labels:
-                        temp[k] = v
-                self.__patients = temp
-
-            # Remove all patients with no scans.
-            temp = {}
-            for k, v in self.__patients.items():
-                if v.numberOfScans() > 0:
-                    temp[k] = v
-            self.__patients = temp
-
-            self.__was_loaded = True
+            table = None
+            if use_snapshot:
+                try:
+                    table = _loadSnapshotTable(db).filter(
+                        show_labels, show_only_healthy, show_status
+                    )
+                except psycopg2.errors.UndefinedColumn as ex:
+                    print(f"Not using the snapshot (run "
+                          f"db/add_scan_updated_at.sql): {ex}")
+            if table is None:
+                sql, params = _makeSelectAllQuery(
+                    show_labels, show_only_healthy, show_status
+                )
+                table = _ScanTable.fromRows(
+                    db.execute_streaming_query(sql, params)
+                )
+
+        # Patients with no (selected) scans are not in the table.
+        self.__setTable(table)
+        self.__was_loaded = True
 
     def saveLabelsToDb(self):
         """Stores the labels (like HH or HD) to the database."""
+        rows = [
+            (patient_id, self.__getLabel(i))
+            for i, patient_id in enumerate(self.__patient_ids)
+        ]
         with dbutil.SimpleSQL() as db:
-            db.execute_non_query("delete from patient")
-            for patient_id, patient in self.__patients.items():
-                label = patient.getLabel()
-                sql = f"INSERT INTO " \
-                      f"patient (patient_id,label) values" \
-                      f"('{patient_id}', '{label}')"
-                print(sql)
-                db.execute_non_query(sql)
+            with db.transaction():
+                db.execute_non_query("delete from patient")
+                db.execute_values(_SQL_INSERT_PATIENT_LABELS, rows)
+        print(f"Saved the labels of {len(rows)} patients.")
 
     def getPatient(self, patient_id):
         """Returns a patient object for the passed in patient id."""
         if not self.__was_loaded:
             self.loadFromDb()
         assert self.__was_loaded
-        if patient_id in self.__patients:
-            return self.__patients[patient_id]
-        else:
+        if patient_id not in self.__patient_index:
             raise ValueError
+        if patient_id not in self.__patients:
+            patient = Patient(patient_id)
+            start = self.__starts[self.__patient_index[patient_id]]
+            exit_health_status = self.__table.exit_health_status[start]
+            if exit_health_status != _NULL_STATUS:
+                patient.setExitHealthStatus(int(exit_health_status))
+            patient.addScans(self.getMrisByPatient(patient_id))
+            self.__patients[patient_id] = patient
+        return self.__patients[patient_id]
 
     def getPatientIDs(self):
         """Yields patient IDs from the patient collection."""
         if not self.__was_loaded:
             self.loadFromDb()
         assert self.__was_loaded
-        for patient_id, patient in self.__patients.items():
-            yield patient_id, patient.getTitle()
+        for i, patient_id in enumerate(self.__patient_ids):
+            yield patient_id, f'{patient_id} {self.__getLabel(i)}'
 
     def getMrisByPatient(self, patient_id):
         """Yields the MRIS for the passed in patient."""
         if not self.__was_loaded:
             self.loadFromDb()
         assert self.__was_loaded
-        assert patient_id in self.__patients
-        patient = self.__patients[patient_id]
-        count = patient.numberOfScans()
-        for i in range(count):
-            yield patient.getScan(i)
+        assert patient_id in self.__patient_index
+        i = self.__patient_index[patient_id]
+        for row in range(self.__starts[i], self.__starts[i + 1]):
+            yield self.__getScan(row)
 
     def getDesctiptiveData(self):
         """Returns the descriptive data to use in the UI."""
-        hh_count = 0
-        hd_count = 0
-        total_scans = 0
-        patients_with_vgg_features = 0
-
-        for patient in self.__patients.values():
-            if patient.getLabel() == "HH":
-                hh_count += 1
-            elif patient.getLabel() == "HD":
-                hd_count += 1
-            total_scans += patient.numberOfScans()
-
-            if patient.hasVGGFeatures():
-                patients_with_vgg_features += 1
+        labels = [self.__getLabel(i) for i in range(len(self.__patient_ids))]
+        if len(self.__table):
+            with_vgg_features = np.logical_or.reduceat(
+                self.__table.has_features, self.__starts[:-1]
+            )
+        else:
+            with_vgg_features = np.zeros(0, dtype=bool)
 
         return {
-            "Number of Patients .........": len(self.__patients),
-            "Number of HH Patients.......": hh_count,
-            "Number of HD Patients.......": hd_count,
-            "Total Number of Scans.......": total_scans,
+            "Number of Patients .........": len(self.__patient_ids),
+            "Number of HH Patients.......": labels.count("HH"),
+            "Number of HD Patients.......": labels.count("HD"),
+            "Total Number of Scans.......": len(self.__table),
             "Distinct Days ..............": self.numberOfDistinctDays(),
-            "Patients with VGG features...": patients_with_vgg_features
+            "Patients with VGG features...": int(with_vgg_features.sum())
         }
 
     def getMriByMriID(self, mri_id):
         """Returns the MRI object for the passed in mri id."""
-        assert mri_id in self.__mri_id_to_mri
-        return self.__mri_id_to_mri[mri_id]
+        row = self.__table.findRow(int(mri_id))
+        assert row is not None
+        return self.__getScan(row)
 
     def getDesctiptiveDataForPatient(self, patient_id):
         """Returns the descriptive data for the passed in patient id."""
         if not self.__was_loaded:
             self.loadFromDb()
         assert self.__was_loaded
-        assert patient_id in self.__patients
-        patient = self.__patients[patient_id]
-        return patient.getDescriptiveData()
+        assert patient_id in self.__patient_index
+        return self.getPatient(patient_id).getDescriptiveData()
 
     def numberOfDistinctDays(self):
         """Returns the number of days having scans."""
-        count = 0
-        for _, v in self.__patients.items():
-            count += v.numberOfDistinctDays()
-        return count
+        pairs = np.stack(
+            (self.__table.patient_codes, self.__table.days), axis=1
+        )
+        return len(np.unique(pairs, axis=0))
 
-    def saveVGG16Features(self):
+    def saveVGG16Features(self, batch_size=vgg16.DEFAULT_BATCH_SIZE):
         """Saves the VGG16 features for the selected set of patients.
 
-        Will save the VGG16 features for all the patients that are
-        marked as Valid, the already are selected from the front end thus
-        are existing on the self.__patients map and also do not have
-        pre-calculated their VGG16 features and stored them in the
-        database.
+        Will save the VGG16 features for all the scans of the loaded
+        patients that are marked as Valid and do not have pre-calculated
+        their VGG16 features and stored them in the database.
+
+        The slices of many scans are grouped together so each call to VGG16
+        processes (at least) batch_size images.
         """
+        table = self.__table
+        rows = np.flatnonzero(
+            ~table.has_features
+            & (table.validation_status == constants.VALID_SCAN)
+        )
         with dbutil.SimpleSQL() as db:
-            for k, v in self.__patients.items():
-                v.saveVGG16Features(db)
-            db.execute_non_query(_SQL_UPDATE_PATIENT_ID_IN_SCAN_FEATURES)
-            db.execute_non_query(_SQL_UPDATE_LABEL_IN_SCAN_FEATURES)
+            with FeatureInserter(db) as inserter:
+                with vgg16.FeatureBatcher(inserter.add, batch_size) as batcher:
+                    for row in rows:
+                        scan = self.__getScan(row)
+                        if scan.hasVGGFeatures():
+                            continue
+                        batcher.add(scan, scan.renderVGG16Input())
+                        # Keep the memory low while the batch is built.
+                        scan.unloadImage()
+            updateFeatureLabels(db)
+
+    def __getLabel(self, i):
+        """Returns the label of the i-th patient."""
+        start = self.__starts[i]
+        return _makeLabel(
+            self.__table.health_status[start],
+            self.__table.exit_health_status[start]
+        )
+
+    def __getScan(self, row):
+        """Returns the (reused) Scan object for a row of the table."""
+        scan_id = int(self.__table.scan_ids[row])
+        if scan_id not in self.__scans:
+            self.__scans[scan_id] = self.__table.makeScan(row)
+        return self.__scans[scan_id]
 
 
 class Patient:
@@ -345,13 +954,17 @@ class Patient:
     def __init__(self, patient_id):
         """Initializes a new Patient."""
         self.__patient_id = patient_id
+        # The scans sorted by days along with their days (for bisect).
         self.__scans = []
+        self.__days = []
+        # Maps each day having scans to the number of its scans.
+        self.__scans_per_day = collections.Counter()
+        self.__scans_with_vgg_features = 0
         self.__exit_health_status = '?'
-        self.__has_scans_with_vgg_features = False
 
     def hasVGGFeatures(self):
         """Returns true if the patinent has precalculated VGG features."""
-        return self.__has_scans_with_vgg_features
+        return self.__scans_with_vgg_features > 0
 
     def getDescriptiveData(self):
         """Returns the descriptive data for the patient (used from the UI.)"""
@@ -364,15 +977,47 @@ class Patient:
 
     def keepOnlyHealthyScans(self):
         """Removes the non healthy scans from the patient Scan collection."""
-        self.__scans = [
-            scan for scan in self.__scans if scan.getHealthStatus() == 0]
+        scans = [scan for scan in self.__scans if scan.getHealthStatus() == 0]
+        self.__clearScans()
+        self.addScans(scans)
 
     def addScan(self, scan):
-        """Adds the passed-in scan to the collection of the scans."""
-        self.__scans.append(scan)
+        """Adds the passed-in scan to the collection of the scans.
+
+        The scan is inserted after the scans of the same or earlier days.
+        """
+        days = scan.getDays()
+        index = bisect.bisect_right(self.__days, days)
+        self.__days.insert(index, days)
+        self.__scans.insert(index, scan)
+        self.__countScan(scan)
+
+    def addScans(self, scans):
+        """Adds many scans sorting the collection only once.
+
+        Cheap when the scans are already sorted by days (like the scans of
+        the database queries).
+        """
+        scans = list(scans)
+        if not scans:
+            return
+        self.__scans.extend(scans)
+        # The sort is stable so scans of the same day keep their order.
         self.__scans.sort(key=lambda x: x.getDays())
+        self.__days = [scan.getDays() for scan in self.__scans]
+        for scan in scans:
+            self.__countScan(scan)
+
+    def __countScan(self, scan):
+        self.__scans_per_day[scan.getDays()] += 1
         if scan.hasVGGFeatures():
-            self.__has_scans_with_vgg_features = True
+            self.__scans_with_vgg_features += 1
+
+    def __clearScans(self):
+        self.__scans = []
+        self.__days = []
+        self.__scans_per_day = collections.Counter()
+        self.__scans_with_vgg_features = 0
 
     def getTitle(self):
         """Returns the title to use for the UI."""
@@ -389,14 +1034,11 @@ class Patient:
 
     def getLabel(self):
         """Gets the label (like HH or HD) to use for model training."""
-        exit_status = int2HealthStatus(self.__exit_health_status)
-        try:
-            enter_status = int2HealthStatus(self.__scans[0].getHealthStatus())
-        except Exception as ex:
-            enter_status = '?'
-        label = f'{enter_status}' \
-                f'{exit_status}'
-        return label
+        if self.__scans:
+            enter_health_status = self.__scans[0].getHealthStatus()
+        else:
+            enter_health_status = None
+        return _makeLabel(enter_health_status, self.__exit_health_status)
 
     def numberOfScans(self):
         """The number of scans for the patient."""
@@ -404,24 +1046,28 @@ class Patient:
 
     def numberOfDistinctDays(self):
         """The number of days that the patient has scans for."""
-        days = set()
-        for scan in self.__scans:
-            days.add(scan.getDays())
-        return len(days)
+        return len(self.__scans_per_day)
 
     def getScan(self, index):
         """Returns the scan object based on the index that is passed in."""
         assert 0 <= index < len(self.__scans)
         return self.__scans[index]
 
+    def getScansMissingVGG16Features(self):
+        """Returns the valid scans that do not have VGG16 features yet."""
+        return [
+            scan for scan in self.__scans
+            if not scan.hasVGGFeatures()
+            and scan.getValidationStatus() == constants.VALID_SCAN
+        ]
+
     def saveVGG16Features(self, db):
         """Saves the VGG16 features for all the scans of the patient."""
-        for scan in self.__scans:
-            if scan.hasVGGFeatures():
-                continue
-            if scan.getValidationStatus() != constants.VALID_SCAN:
-                continue
-            scan.saveVGG16Features(db)
+        items = []
+        for scan in self.getScansMissingVGG16Features():
+            items.append((scan, scan.getAllVGG16Features()))
+            scan.unloadImage()
+        insertVGG16Features(db, items)
 
 
 class Scan:
@@ -430,6 +1076,13 @@ class Scan:
     _DEFAULT_AXIS = {'0': 0, '1': 1, '2': 2}
     _DEFAULT_ROTATION = [0, 0, 0]
 
+    __slots__ = (
+        "__scan_id", "__filepath", "__days", "__patient_id", "__origin",
+        "__health_status", "__axis_mapping", "__rotation",
+        "__slice_distances", "__validation_status", "__is_dirty",
+        "__has_VGG_features", "__vgg16_features", "__vgg16_features_state",
+    )
+
     def __init__(self, fullpath, scan_id=None, days=None, patient_id=None,
                  origin=None, health_status=None, axis=None, rotation=None,
                  sd0=0.2, sd1=0.2, sd2=0.2,
@@ -442,7 +1095,6 @@ class Scan:
             rotation = copy.deepcopy(self._DEFAULT_ROTATION)
 
         self.__scan_id = scan_id
-        self.__img = None
         self.__filepath = fullpath
         self.__days = days
         self.__patient_id = patient_id
@@ -450,11 +1102,12 @@ class Scan:
         self.__health_status = health_status
         self.__axis_mapping = {int(k): v for k, v in axis.items()}
         self.__rotation = rotation
-        self.__img = None
         self.__slice_distances = [sd0, sd1, sd2]
         self.__validation_status = validation_status
         self.__is_dirty = False
         self.__has_VGG_features = False
+        self.__vgg16_features = {}
+        self.__vgg16_features_state = None
 
     def hasVGGFeatures(self):
         """Returns True if the VGG features for the scan are in the db."""
@@ -471,13 +1124,16 @@ class Scan:
     def restoreOriginalState(self):
         """Called when the state changes need to be restored.
 
-        Re-Loads the details of the MRI from the database.
+        Re-Loads the details of the MRI from the database; the volume stays
+        in the volume cache so the scan can be redrawn without reloading it.
         """
         sql = _SQL_SELECT_ONE(scan_id=self.__scan_id)
 
+        has_vgg_features = self.__has_VGG_features
         with dbutil.SimpleSQL() as db:
             for row in db.execute_query(sql):
                 self.__init__(*row)
+        self.__has_VGG_features = has_vgg_features
 
     def saveToDb(self):
         sd0, sd1, sd2 = self.__slice_distances
@@ -495,6 +1151,7 @@ class Scan:
         with dbutil.SimpleSQL() as db:
             db.execute_non_query(sql)
         self.__is_dirty = False
+        thumbnail_store.invalidate(self.__scan_id)
 
     def getScanID(self):
         return self.__scan_id
@@ -595,52 +1252,176 @@ class Scan:
         return self.__axis_mapping.copy()
 
     def unloadImage(self):
-        """Manually unloads the nifti image (used to avoid memory leaks)."""
-        self.__img = None
+        """Removes the nifti image from the volume cache.
+
+        Used when the scan is not going to be needed again (like when
+        calculating the features of many scans) so it does not push more
+        useful volumes out of the cache.
+        """
+        volume_cache.discard(self.__filepath)
 
     def get_slice(self, distance_from_center=0, axis=2, bounding_square=300):
-        if self.__img is None:
-            self.__img = nib.load(self.__filepath).get_fdata()
+        """Renders a single slice (see get_slices)."""
+        return self.get_slices(
+            [(axis, distance_from_center)], bounding_square
+        )[0]
+
+    def get_slices(self, spec, bounding_square=300):
+        """Renders many slices of the scan in a single buffer.
+
+        Each slice is rotated, resized to fit in the bounding square keeping
+        its aspect ratio and centered on a black background.
+
+        :param spec: A list of (axis, distance_from_center) pairs.
+        :param int bounding_square: The side of the rendered images.
+
+        :return: A float32 numpy array shaped as
+        (len(spec), bounding_square, bounding_square).
+
+        :raises ValueError: If an axis is invalid.
+        """
+        volume = volume_cache.getVolume(self.__filepath)
+        images = np.zeros(
+            (len(spec), bounding_square, bounding_square), dtype=np.float32
+        )
+        for image, (axis, distance_from_center) in zip(images, spec):
+            axis = self.__axis_mapping.get(axis)
+            assert -1. <= distance_from_center <= 1.
+            if axis not in (0, 1, 2):
+                raise ValueError(f"Invalid axis: {axis}.")
+            img = volume.getPlaneAtDistance(axis, distance_from_center)
+            img = np.rot90(img, self.__rotation[axis])
+            _fitToSquare(img, image)
+        return images
+
+    def getMovieFrames(self, axis=1, bounding_square=200, start=-0.9,
+                       step=0.02):
+        """Renders the slices of a sweep along an axis as movie frames.
+
+        All the planes are read from the volume in one pass and resized
+        together.
+
+        :param int axis: The axis of the sweep.
+        :param int bounding_square: The side of the frames.
+        :param float start: The distance from the center of the first frame.
+        :param float step: The distance between two frames.
+
+        :return: A uint8 array shaped as (n, bounding_square, bounding_square).
+        """
+        volume = volume_cache.getVolume(self.__filepath)
         axis = self.__axis_mapping.get(axis)
-        assert self.__img is not None
-        assert -1. <= distance_from_center <= 1.
-        n = int(int(self.__img.shape[axis] / 2) * (1 + distance_from_center))
-        if axis == 0:
-            img = self.__img[n, :, :]
-        elif axis == 1:
-            img = self.__img[:, n, :]
-        elif axis == 2:
-            img = self.__img[:, :, n]
-        else:
-            return ValueError
+        if axis not in (0, 1, 2):
+            raise ValueError(f"Invalid axis: {axis}.")
+        distances = []
+        distance = start
+        while distance < 1.0:
+            distances.append(distance)
+            distance += step
+        indexes = [
+            nifti_reader.getPlaneIndex(volume.shape, axis, d)
+            for d in distances
+        ]
+        planes = volume.getPlanes(axis, indexes)
+        planes = np.rot90(planes, self.__rotation[axis], axes=(1, 2))
+        frames = np.zeros(
+            (len(planes), bounding_square, bounding_square), dtype=np.float32
+        )
+        # Resized as multi channel images (one channel per frame); cv2
+        # supports up to 512 channels.
+        for i in range(0, len(planes), 512):
+            _fitToSquare(
+                np.moveaxis(planes[i:i + 512], 0, 2), frames[i:i + 512]
+            )
+        return thumbnail_store.toUint8(frames)
 
-        for _ in range(self.__rotation[axis]):
-            img = cv2.rotate(img, cv2.ROTATE_90_COUNTERCLOCKWISE)
+    def getStandardSlices(self):
+        """Returns the (axis, distance) pairs for the nine standard slices.
 
-        x, y = img.shape
+        The order matches the features_slice columns of the scan_features
+        table: 01, 02, 03, 11, 12, 13, 21, 22, 23.
+        """
+        slices = []
+        for axis in [0, 1, 2]:
+            dist = self.__slice_distances[axis]
+            for d in [-dist, 0, dist]:
+                slices.append((axis, d))
+        return slices
 
-        if x > y:
-            ratio = y / x
-            x = bounding_square
-            y = bounding_square * ratio
-        elif x < y:
-            ratio = x / y
-            y = bounding_square
-            x = bounding_square * ratio
-        else:
-            x = y = bounding_square
+    def getRenderState(self):
+        """Returns the state that affects the rendered slices.
 
-        # See also: https://stackoverflow.com/questions/14063070/overlay-a-smaller-image-on-a-larger-image-python-opencv
+        :return: A list holding the axis mapping, the rotation and the slice
+        distances of the scan (json serializable).
+        """
+        return [
+            sorted(self.__axis_mapping.items()),
+            list(self.__rotation),
+            list(self.__slice_distances),
+        ]
+
+    def getSliceLocation(self, slice_desc):
+        """Returns the (axis, distance) pair for a slice description.
+
+        :param str slice_desc: A two digit string like '01' or '22'; the first
+        digit is the axis and the second the slice (1, 2, 3 with 2 been the
+        center slice).
+        """
+        axis = int(slice_desc[0])
+        slice_index = int(slice_desc[1])
+        assert 0 <= axis <= 2
+        assert 1 <= slice_index <= 3
+        return self.getStandardSlices()[axis * 3 + slice_index - 1]
+
+    def getVGG16FeaturesForSlices(self, slices):
+        """Returns the VGG16 features for the passed in slices.
+
+        The slices that were not calculated before are rendered and passed
+        to VGG16 as a single batch; the features are kept for as long as the
+        orientation and the slice distances of the scan do not change so
+        calls from many models reuse them.
+
+        :param slices: A list of slice descriptions (like '01', '22').
+        :return: A dict mapping each slice to its 512 features.
+        """
+        state = self.getRenderState()
+        if state != self.__vgg16_features_state:
+            self.__vgg16_features = {}
+            self.__vgg16_features_state = state
+
+        missing = sorted(set(slices) - self.__vgg16_features.keys())
+        if missing:
+            images = self.get_slices(
+                [self.getSliceLocation(s) for s in missing],
+                bounding_square=200
+            )
+            features = vgg16.extractFeatures(add_rgb_channels(images))
+            for slice_desc, f in zip(missing, features):
+                self.__vgg16_features[slice_desc] = f
+        return {s: self.__vgg16_features[s] for s in slices}
+
+    def renderStandardSlices(self, bounding_square=200):
+        """Renders the nine standard slices as gray scale images.
+
+        :return: A numpy array shaped as (9, bounding_square, bounding_square).
+        """
+        return self.get_slices(self.getStandardSlices(), bounding_square)
 
-        x = int(x)
-        y = int(y)
-        l_img = np.full((bounding_square, bounding_square), 0)
-        x_offset = int((bounding_square - y) / 2)
-        y_offset = int((bounding_square - x) / 2)
-        s_img = cv2.resize(img, dsize=(y, x), interpolation=cv2.INTER_CUBIC)
-        l_img[y_offset:y_offset + s_img.shape[0],
-        x_offset:x_offset + s_img.shape[1]] = s_img
-        return l_img
+    def renderVGG16Input(self):
+        """Renders the nine standard slices as VGG16 input images.
+
+        :return: A numpy array shaped as (9, 200, 200, 3).
+        """
+        return add_rgb_channels(self.renderStandardSlices())
+
+    def getAllVGG16Features(self):
+        """Returns the VGG16 features for the nine standard slices.
+
+        All the slices are rendered first and then passed to VGG16 as a
+        single (9, 200, 200, 3) batch.
+
+        :return: A numpy array shaped as (9, 512).
+        """
+        return vgg16.extractFeatures(self.renderVGG16Input())
 
     def getVGG16Features(self, dist_from_center,axis):
         slice = self.get_slice(
@@ -649,34 +1430,31 @@ class Scan:
             bounding_square=200
         )
         img = add_rgb_channels(slice)
-        return np.array(_feature_extractor(img))
+        return vgg16.extractFeatures(np.array([img]))
 
-    def saveVGG16Features(self, db):
-        print(self.__scan_id)
-        scan_id = self.__scan_id
+    def insertVGG16Features(self, db, features):
+        """Inserts the passed in features of the nine slices to the db.
+
+        :param db: The SimpleSQL instance to use.
+        :param features: A numpy array shaped as (9, 512).
+        """
+        insertVGG16Features(db, [(self, features)])
+
+    def getFeaturesRow(self, features):
+        """Returns the scan_features row for the passed in features.
+
+        :param features: A numpy array shaped as (9, 512).
+        """
         d0, d1, d2 = self.__slice_distances
-        features = []
-        for axis in [0, 1, 2]:
-            dist = self.__slice_distances[axis]
-            for d in [-dist, 0, dist]:
-                # Todo: Substitute this with a call to getVGG16Features.
-                slice = self.get_slice(
-                    distance_from_center=d, axis=axis, bounding_square=200
-                )
-                img = add_rgb_channels(slice)
-                a = np.array(_feature_extractor(img))
-                jsn = json.dumps(a.tolist())
-                features.append(jsn)
+        features = [feature_codec.encode(a) for a in features]
+        return (self.__scan_id, d0, d1, d2, *features)
 
-        sql = _SQL_INSERT_FEATURES.format(
-            scan_id, d0, d1, d2, *features
-        )
-        print("Inserting to the database: ", self.__scan_id)
-        db.execute_non_query(sql)
+    def saveVGG16Features(self, db):
+        print(self.__scan_id)
+        self.insertVGG16Features(db, self.getAllVGG16Features())
         # Keep the state of the instance low to avoid memory overloading.
         self.unloadImage()
 
-
 if __name__ == '__main__':
     JUNK_PATH = "/home/john/ADNI/ADNI/003_S_1074/Total_Intracranial_Volume_Brain_Mask/2006-12-04_12_29_02.0/I345144/ADNI_003_S_1074_MR_Total_Intracranial_Volume_Brain_Mask_Br_20121107220305810_S23534_I345144.nii"
 
@@ -0,0 +1,115 @@
+"""Reads 2D planes from nifti volumes without decoding the whole volume.
+
+For uncompressed files (.nii, .img/.hdr) the planes are read through the
+nibabel array proxy, which memory maps the file and reads only the bytes of
+the requested plane.
+
+Compressed files (.nii.gz) can not be read partially so their data are
+decoded once and kept as float32 (instead of the float64 that get_fdata
+returns by default).
+"""
+
+import nibabel as nib
+import numpy as np
+
+_COMPRESSED_SUFFIXES = (".gz", ".bz2", ".zst")
+
+
+class Volume:
+    """A nifti volume that returns its planes as float32 arrays."""
+
+    def __init__(self, filepath):
+        """Initializer.
+
+        :param str filepath: The path to the nifti file.
+
+        :raises FileNotFoundError: If the file does not exist.
+        """
+        self.__img = nib.load(filepath)
+        self.__data = None
+        if filepath.lower().endswith(_COMPRESSED_SUFFIXES):
+            self.__data = self.__img.get_fdata(dtype=np.float32)
+
+    @property
+    def shape(self):
+        """The shape of the three spatial dimensions."""
+        return tuple(self.__img.shape[:3])
+
+    @property
+    def nbytes(self):
+        """The number of bytes held in memory for the volume data."""
+        return 0 if self.__data is None else self.__data.nbytes
+
+    def getPlane(self, axis, n):
+        """Returns a plane of the volume as a float32 2D array.
+
+        :param int axis: The axis (0, 1 or 2) that is perpendicular to the
+        plane.
+        :param int n: The index of the plane along the axis.
+        """
+        if axis not in (0, 1, 2):
+            raise ValueError(f"Invalid axis: {axis}.")
+        index = [slice(None)] * 3
+        index[axis] = n
+        # Any extra (like time) dimensions are indexed at their first element.
+        index += [0] * (len(self.__img.shape) - 3)
+        index = tuple(index)
+        if self.__data is not None:
+            plane = self.__data[index]
+        else:
+            plane = self.__img.dataobj[index]
+        return np.asarray(plane, dtype=np.float32)
+
+    def getPlanes(self, axis, indexes):
+        """Returns many planes of the volume as a float32 3D array.
+
+        The planes are read in a single pass; for uncompressed files only the
+        slab between the first and the last plane is read.
+
+        :param int axis: The axis (0, 1 or 2) that is perpendicular to the
+        planes.
+        :param indexes: The indexes of the planes along the axis.
+
+        :return: An array shaped as (len(indexes), rows, columns).
+        """
+        if axis not in (0, 1, 2):
+            raise ValueError(f"Invalid axis: {axis}.")
+        indexes = np.asarray(indexes, dtype=np.intp)
+        if not indexes.size:
+            shape = [s for i, s in enumerate(self.shape) if i != axis]
+            return np.zeros([0] + shape, dtype=np.float32)
+        first, last = int(indexes.min()), int(indexes.max())
+        index = [slice(None)] * 3
+        index[axis] = slice(first, last + 1)
+        index += [0] * (len(self.__img.shape) - 3)
+        index = tuple(index)
+        if self.__data is not None:
+            slab = self.__data[index]
+        else:
+            slab = self.__img.dataobj[index]
+        planes = np.take(slab, indexes - first, axis=axis)
+        return np.moveaxis(planes, axis, 0).astype(np.float32, copy=False)
+
+    def getPlaneAtDistance(self, axis, distance_from_center=0):
+        """Returns the plane at a relative distance from the center.
+
+        :param int axis: The axis (0, 1 or 2) that is perpendicular to the
+        plane.
+        :param float distance_from_center: From -1 (first plane) to 1 (last
+        plane) with 0 been the center plane.
+        """
+        return self.getPlane(
+            axis, getPlaneIndex(self.shape, axis, distance_from_center)
+        )
+
+
+def getPlaneIndex(shape, axis, distance_from_center):
+    """Returns the index of the plane at a relative distance from the center."""
+    assert -1. <= distance_from_center <= 1.
+    n = int(int(shape[axis] / 2) * (1 + distance_from_center))
+    return min(n, shape[axis] - 1)
+
+
+def readPlane(filepath, axis, distance_from_center=0):
+    """Reads a single plane from a nifti file as a float32 2D array."""
+    return Volume(filepath).getPlaneAtDistance(axis, distance_from_center)
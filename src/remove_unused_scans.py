@@ -5,10 +5,10 @@ import os
 import cogni_scan.src.dbutil as dbutil
 
 _SQL_SELECT_ALL = """
-Select scan_id, fullpath from scan 10;
+Select scan_id, fullpath from scan;
 """
 
-_SQL_DELETE_SCAN = "DELETE from scan where scan_id = {}"
+_SQL_DELETE_SCANS = "DELETE from scan where scan_id = ANY(%s)"
 
 
 def loadFromDb():
@@ -20,11 +20,9 @@ def loadFromDb():
             if not os.path.exists(path):
                 not_existing_ids.append(scan_id)
 
-    for row_id in not_existing_ids:
-        with dbutil.SimpleSQL() as db:
-            sql = _SQL_DELETE_SCAN.format(row_id)
-            print(sql)
-            db.execute_non_query(sql)
+        if not_existing_ids:
+            print(f"Deleting {len(not_existing_ids)} scans: {not_existing_ids}")
+            db.execute_non_query(_SQL_DELETE_SCANS, (not_existing_ids,))
 
 
 if __name__ == '__main__':
@@ -0,0 +1,166 @@
+"""Stores pre-rendered thumbnails of the standard slices of the scans.
+
+The nine standard slices of a scan are rendered at a few sizes and saved
+(as uint8 images) in a compressed archive under:
+
+    ~/.cogni_scan/thumbnails/<scan_id>/<state_key>.npz
+
+The state key is a hash of the orientation of the scan (axis mapping,
+rotation and slice distances) so changing the orientation never returns
+stale thumbnails; Scan.saveToDb invalidates the thumbnails of the scan as
+well to reclaim their space.
+"""
+
+import hashlib
+import io
+import json
+import os
+import pathlib
+import shutil
+
+import cv2
+import numpy as np
+
+# The sizes (sides of the bounding squares) of the stored thumbnails.
+THUMBNAIL_SIZES = (100, 200, 300, 400, 500)
+
+_store_dir = None
+
+
+def getStoreDir():
+    """Returns the directory where the thumbnails are stored."""
+    if _store_dir:
+        return _store_dir
+    home_dir = pathlib.Path.home()
+    return os.path.join(home_dir, '.cogni_scan', 'thumbnails')
+
+
+def setStoreDir(dir_path):
+    """Sets the directory where the thumbnails are stored."""
+    global _store_dir
+    _store_dir = dir_path
+
+
+def toUint8(images):
+    """Converts rendered slices to uint8 images.
+
+    Values are rounded and clipped to 0..255 (like cv2.imwrite does when
+    saving float images).
+    """
+    return np.clip(np.rint(images), 0, 255).astype(np.uint8)
+
+
+def getStateKey(scan):
+    """Returns the key for the current orientation of the scan."""
+    state = json.dumps(scan.getRenderState())
+    return hashlib.sha1(state.encode()).hexdigest()[:16]
+
+
+def renderThumbnails(scan, sizes=THUMBNAIL_SIZES):
+    """Renders the standard slices of the scan at the passed in sizes.
+
+    :return: A dict mapping each size to a uint8 array shaped as
+    (9, size, size).
+    """
+    return {
+        size: toUint8(scan.renderStandardSlices(bounding_square=size))
+        for size in sizes
+    }
+
+
+def save(scan, thumbnails, path=None):
+    """Saves the thumbnails (as returned by renderThumbnails) of the scan.
+
+    :param path: The path for the state the thumbnails were rendered for
+    (see getStandardSlices); defaults to the path of the current state.
+    """
+    if path is None:
+        path = _getPath(scan)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    buffer = io.BytesIO()
+    np.savez_compressed(
+        buffer, **{f"s{size}": images for size, images in thumbnails.items()}
+    )
+    # Written to a temporary file first so readers never see a partial file.
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as fout:
+        fout.write(buffer.getvalue())
+    os.replace(tmp_path, path)
+
+
+def hasThumbnails(scan):
+    """Returns True if the thumbnails for the current state are stored."""
+    return os.path.isfile(_getPath(scan))
+
+
+def load(scan, size):
+    """Returns the stored standard slices of the scan at the passed in size.
+
+    When the exact size is not stored the closest larger size (or the
+    largest one) is scaled to it.
+
+    :return: A uint8 array shaped as (9, size, size) or None if the
+    thumbnails of the scan are not stored.
+    """
+    return _load(_getPath(scan), size)
+
+
+def _load(path, size):
+    try:
+        with np.load(path) as archive:
+            stored = sorted(int(name[1:]) for name in archive.files)
+            larger = [s for s in stored if s >= size]
+            stored_size = larger[0] if larger else stored[-1]
+            images = archive[f"s{stored_size}"]
+    except (FileNotFoundError, ValueError, OSError) as ex:
+        if os.path.isfile(path):
+            print(f"Invalid thumbnails file {path}: {ex}")
+        return None
+    if stored_size == size:
+        return images
+    interpolation = cv2.INTER_AREA if stored_size > size else cv2.INTER_CUBIC
+    return np.array([
+        cv2.resize(image, dsize=(size, size), interpolation=interpolation)
+        for image in images
+    ])
+
+
+def getStandardSlices(scan, size):
+    """Returns the standard slices of the scan, rendering them if needed.
+
+    Reads the thumbnail store first; on a miss the thumbnails of all the
+    sizes are rendered and saved (unless the scan has unsaved changes).
+
+    The path is taken before rendering: when the orientation of the scan
+    changes while rendering (from another thread) the thumbnails are not
+    saved since they might not match any of the states.
+
+    :return: A uint8 array shaped as (9, size, size).
+    """
+    path = _getPath(scan)
+    images = _load(path, size)
+    if images is not None:
+        return images
+    if scan.isDirty():
+        return toUint8(scan.renderStandardSlices(bounding_square=size))
+    thumbnails = renderThumbnails(scan, sorted(set(THUMBNAIL_SIZES) | {size}))
+    images = thumbnails.pop(size)
+    if size in THUMBNAIL_SIZES:
+        thumbnails[size] = images
+    if not scan.isDirty() and _getPath(scan) == path:
+        save(scan, thumbnails, path)
+    return images
+
+
+def invalidate(scan_id):
+    """Removes all the stored thumbnails of the passed in scan."""
+    shutil.rmtree(
+        os.path.join(getStoreDir(), str(scan_id)), ignore_errors=True
+    )
+
+
+def _getPath(scan):
+    """Returns the path of the thumbnails file for the scan's state."""
+    return os.path.join(
+        getStoreDir(), str(scan.getScanID()), f"{getStateKey(scan)}.npz"
+    )
@@ -4,8 +4,6 @@ import functools
 import pathlib
 import json
 
-import nibabel as nib
-import cogni_scan.src.nifti_mri as nm
 import cogni_scan.src.impl.name_creator as name_creator
 
 AXES = [
@@ -33,11 +31,16 @@ def getPsqlConnectionString():
     conn_str = os.environ.get("CONN_STR")
     if conn_str:
         return conn_str
+    return _loadSettings()["CONN_STR"]
+
+
+@functools.lru_cache(maxsize=None)
+def _loadSettings():
+    """Reads the settings file (once per process)."""
     home_dir = pathlib.Path.home()
     filename = os.path.join(home_dir, '.cogni_scan', 'settings.json')
     with open(filename) as fin:
-        settings = json.load(fin)
-        return settings["CONN_STR"]
+        return json.load(fin)
 
 
 def getAxesOrientation():
@@ -48,6 +51,8 @@ def getAxesOrientation():
 
 
 def loadMRI(filepath):
+    # Imported here since nifti_mri depends on this module (through dbutil).
+    import cogni_scan.src.nifti_mri as nm
     return nm.NiftiMri(filepath)
 
 
@@ -0,0 +1,114 @@
+"""Extracts the VGG16 features that are used as the input of the models.
+
+Tensorflow is imported the first time features are extracted so the modules
+that only render or store slices do not pay for loading it.
+"""
+
+import numpy as np
+
+# The shape of the images that are passed to VGG16.
+INPUT_SHAPE = (200, 200, 3)
+
+# The number of features that VGG16 returns for each image.
+FEATURES_PER_IMAGE = 512
+
+DEFAULT_BATCH_SIZE = 128
+
+
+class _FeatureExtractor:
+    _ready = False
+
+    def __call__(self, images):
+        """Returns the VGG16 features for a batch of RGB images.
+
+        :param images: A numpy array shaped as (n, 200, 200, 3).
+        :return: A numpy array shaped as (n, 512).
+        """
+        from tensorflow import keras
+        if not self._ready:
+            from tensorflow.keras.applications.vgg16 import VGG16
+            self.__model_1 = VGG16(
+                weights='imagenet', include_top=False, input_shape=INPUT_SHAPE
+            )
+            self._ready = True
+
+        features = self.__model_1.predict(images, batch_size=len(images))
+        gavg = keras.layers.GlobalAveragePooling2D()(features)
+        return np.array(keras.layers.Flatten()(gavg))
+
+
+_feature_extractor = _FeatureExtractor()
+
+
+def extractFeatures(images):
+    """Returns the VGG16 features for a batch of RGB images.
+
+    :param images: A numpy array shaped as (n, 200, 200, 3).
+    :return: A numpy array shaped as (n, 512).
+    """
+    return _feature_extractor(images)
+
+
+class FeatureBatcher:
+    """Groups the images of many items into large VGG16 batches.
+
+    Each item (usually a scan) contributes a few images (usually its nine
+    standard slices). The images are accumulated until there are at least
+    batch_size of them, then they are passed to VGG16 in a single call and
+    the resulting features are split back to their items.
+
+    Batches are always made of whole items so the actual size of a batch can
+    exceed the batch_size by up to the number of images of one item.
+
+    For each processed item the callback is called as:
+
+        on_features(key, features)
+
+    where features is a numpy array shaped as (number of images, 512).
+
+    Can be used as a context manager, in which case the pending images are
+    processed when leaving the context.
+    """
+
+    def __init__(self, on_features, batch_size=DEFAULT_BATCH_SIZE):
+        """Initializer.
+
+        :param on_features: Called with the features of each processed item.
+        :param int batch_size: The minimum number of images per VGG16 call.
+        """
+        assert batch_size > 0
+        self.__on_features = on_features
+        self.__batch_size = batch_size
+        self.__images = []
+        self.__pending = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, trace):
+        if exc_type is None:
+            self.flush()
+
+    def add(self, key, images):
+        """Adds the images of an item to the current batch.
+
+        :param key: Identifies the item; passed back to the callback.
+        :param images: A numpy array shaped as (n, 200, 200, 3).
+        """
+        assert len(images) > 0
+        self.__images.extend(images)
+        self.__pending.append((key, len(images)))
+        if len(self.__images) >= self.__batch_size:
+            self.flush()
+
+    def flush(self):
+        """Processes all the pending images."""
+        if not self.__pending:
+            return
+        images, self.__images = self.__images, []
+        pending, self.__pending = self.__pending, []
+        features = extractFeatures(np.array(images))
+        start = 0
+        for key, count in pending:
+            self.__on_features(key, features[start:start + count])
+            start += count
@@ -0,0 +1,131 @@
+"""A process wide, size bounded cache of the loaded nifti volumes.
+
+All the Scan objects get their volumes from this cache so the memory used by
+the decoded volumes never exceeds its byte budget no matter how many scans
+are browsed; the least recently used volumes are evicted first.
+"""
+
+import collections
+import threading
+
+import cogni_scan.src.nifti_reader as nifti_reader
+
+# The default byte budget for the decoded volumes.
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024
+
+# Uncompressed volumes are memory mapped and hold almost no memory; the
+# number of the cached volumes is bounded as well so they do not pile up.
+DEFAULT_MAX_ENTRIES = 256
+
+
+class VolumeCache:
+    """A thread safe LRU cache of nifti_reader.Volume objects by file path."""
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES,
+                 max_entries=DEFAULT_MAX_ENTRIES, loader=nifti_reader.Volume):
+        """Initializer.
+
+        :param int max_bytes: The maximum bytes held by the cached volumes.
+        :param int max_entries: The maximum number of cached volumes.
+        :param loader: Called with the file path to load a missing volume.
+        """
+        self.__max_bytes = max_bytes
+        self.__max_entries = max_entries
+        self.__loader = loader
+        self.__volumes = collections.OrderedDict()
+        self.__bytes = 0
+        self.__hits = 0
+        self.__misses = 0
+        self.__evictions = 0
+        self.__lock = threading.Lock()
+
+    def get(self, filepath):
+        """Returns the volume for the passed in file, loading it if needed."""
+        with self.__lock:
+            volume = self.__volumes.get(filepath)
+            if volume is not None:
+                self.__volumes.move_to_end(filepath)
+                self.__hits += 1
+                return volume
+            self.__misses += 1
+
+        # Load outside the lock so other threads are not blocked while the
+        # file is decoded.
+        volume = self.__loader(filepath)
+
+        with self.__lock:
+            if filepath in self.__volumes:
+                # Loaded by another thread in the meantime.
+                self.__volumes.move_to_end(filepath)
+                return self.__volumes[filepath]
+            self.__volumes[filepath] = volume
+            self.__bytes += volume.nbytes
+            self.__evict()
+        return volume
+
+    def discard(self, filepath):
+        """Removes the volume of the passed in file (if cached)."""
+        with self.__lock:
+            volume = self.__volumes.pop(filepath, None)
+            if volume is not None:
+                self.__bytes -= volume.nbytes
+
+    def clear(self):
+        """Removes all the cached volumes."""
+        with self.__lock:
+            self.__volumes.clear()
+            self.__bytes = 0
+
+    def setMaxBytes(self, max_bytes):
+        """Changes the byte budget evicting volumes if needed."""
+        with self.__lock:
+            self.__max_bytes = max_bytes
+            self.__evict()
+
+    def getStats(self):
+        """Returns a dict with the counters of the cache."""
+        with self.__lock:
+            return {
+                "volumes": len(self.__volumes),
+                "bytes": self.__bytes,
+                "max_bytes": self.__max_bytes,
+                "hits": self.__hits,
+                "misses": self.__misses,
+                "evictions": self.__evictions,
+            }
+
+    def __evict(self):
+        """Evicts the least recently used volumes (lock must be held).
+
+        The most recently used volume is always kept even if it is larger
+        than the budget since its caller is about to use it.
+        """
+        while len(self.__volumes) > 1 and (
+                self.__bytes > self.__max_bytes or
+                len(self.__volumes) > self.__max_entries):
+            _, volume = self.__volumes.popitem(last=False)
+            self.__bytes -= volume.nbytes
+            self.__evictions += 1
+
+
+_cache = VolumeCache()
+
+
+def getVolume(filepath):
+    """Returns the volume of the passed in file from the shared cache."""
+    return _cache.get(filepath)
+
+
+def discard(filepath):
+    """Removes the volume of the passed in file from the shared cache."""
+    _cache.discard(filepath)
+
+
+def setMaxBytes(max_bytes):
+    """Changes the byte budget of the shared cache."""
+    _cache.setMaxBytes(max_bytes)
+
+
+def getStats():
+    """Returns the counters of the shared cache."""
+    return _cache.getStats()